@@ -1,31 +1,78 @@
-from flask import Flask, render_template, jsonify, request, redirect, url_for, session
+from flask import Flask, jsonify, request, redirect, url_for, session
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 import os
-from datetime import datetime
+import json
+import threading
+from datetime import datetime, timedelta, timezone
 from dotenv import load_dotenv
-from database import init_db_pool, close_db_pool, Todo, GroceryItem, ActivityLog
+from database import (
+    init_db_pool,
+    is_sqlite_url,
+    close_db_pool,
+    check_db_health,
+    get_pool_stats,
+    init_activity_log_writer,
+    db_session,
+    get_activity_log_writer,
+    Todo,
+    GroceryItem,
+    ActivityLog,
+    Job,
+    Dashboard,
+    ChangeVersions
+)
 from gmail_service import (
     get_gmail_auth_url, 
     handle_oauth_callback, 
-    sync_gmail_messages,
-    get_cached_emails,
-    is_authenticated
+    get_cached_email_page,
+    search_cached_emails,
+    is_authenticated,
+    gmail_sync_key
 )
+from calendar_service import get_today_events, get_upcoming_events
+from blog_service import get_post_page
+from cache import init_read_cache, close_read_cache, read_cache
+from events import init_event_broker, get_event_broker, close_change_listener
+import profiling
+from assets import get_dashboard_assets
+from compression import choose_encoding, compress, should_compress, weaken_etag
 
 # Load environment variables
 load_dotenv()
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """jsonify through orjson, which encodes UUIDs and datetimes natively"""
+    
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default).decode()
+    
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 app = Flask(__name__)
+if orjson is not None:
+    app.json = OrjsonProvider(app)
 
-# Enable CORS for API access
+# Enable CORS for API access (asgi.py applies the same policy to its routes)
+CORS_ORIGINS = [
+    "http://localhost:8080",  # Flask dev server
+    os.environ.get('FRONTEND_URL', 'https://yourdomain.com')  # Production
+]
+CORS_METHODS = ["GET", "POST", "PUT", "DELETE", "PATCH"]
+CORS_HEADERS = ["Content-Type", "Authorization"]
 CORS(app, resources={
     r"/api/*": {
-        "origins": [
-            "http://localhost:8080",  # Flask dev server
-            os.environ.get('FRONTEND_URL', 'https://yourdomain.com')  # Production
-        ],
-        "methods": ["GET", "POST", "PUT", "DELETE", "PATCH"],
-        "allow_headers": ["Content-Type", "Authorization"]
+        "origins": CORS_ORIGINS,
+        "methods": CORS_METHODS,
+        "allow_headers": CORS_HEADERS
     }
 })
 
@@ -34,8 +81,107 @@ app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-i
 DATABASE_URL = os.environ.get('DATABASE_URL', 'postgresql://matt@localhost:5432/daily_discover')
 GMAIL_REDIRECT_URI = os.environ.get('GMAIL_REDIRECT_URI', 'http://localhost:8080/oauth2callback')
 
-# Initialize database connection pool
-init_db_pool(DATABASE_URL)
+_services_pid = None
+_services_lock = threading.Lock()
+
+def init_services():
+    """
+    Open this process's connection pool, change listener and background writer
+    Runs once per process, after any fork, never at import: a pool or
+    listener socket inherited across fork would be shared with the parent,
+    which is what made `gunicorn --preload` (and the dev reloader) unsafe
+    """
+    global _services_pid
+    if _services_pid == os.getpid():
+        return
+    with _services_lock:
+        if _services_pid == os.getpid():
+            return
+        
+        # Initialize database connection pool
+        init_db_pool(DATABASE_URL)
+        
+        # The services below LISTEN or COPY, so need PostgreSQL; the embedded
+        # SQLite backend reads in-process and writes each entry inline
+        postgres = not is_sqlite_url(DATABASE_URL)
+        
+        # Cache list reads per user, invalidated through Postgres NOTIFY
+        if postgres and os.environ.get('READ_CACHE', 'true').lower() == 'true':
+            init_read_cache(DATABASE_URL, ttl=float(os.environ.get('READ_CACHE_TTL', 300)))
+        
+        # Push todo/grocery/email changes to open dashboards over /api/events
+        if postgres and os.environ.get('LIVE_EVENTS', 'true').lower() == 'true':
+            init_event_broker(
+                DATABASE_URL,
+                ChangeVersions.get,
+                heartbeat=float(os.environ.get('LIVE_EVENTS_HEARTBEAT', 15)),
+                max_clients=int(os.environ.get('LIVE_EVENTS_MAX_CLIENTS', 4))
+            )
+        
+        # Write activity log entries in batches off the request path
+        if postgres and os.environ.get('ACTIVITY_LOG_ASYNC', 'true').lower() == 'true':
+            init_activity_log_writer(
+                max_buffer=int(os.environ.get('ACTIVITY_LOG_BUFFER', 10000)),
+                batch_size=int(os.environ.get('ACTIVITY_LOG_BATCH_SIZE', 200)),
+                flush_interval=float(os.environ.get('ACTIVITY_LOG_FLUSH_INTERVAL', 1.0))
+            )
+        
+        _services_pid = os.getpid()
+
+def close_services():
+    """Flush the activity log and close the listener and pool (worker shutdown)"""
+    global _services_pid
+    close_read_cache()
+    close_change_listener()
+    close_db_pool()
+    _services_pid = None
+
+def create_app():
+    """App factory: the Flask app with this process's services started"""
+    init_services()
+    return app
+
+@app.before_request
+def ensure_services():
+    # For servers that never call create_app() (flask run, plain gunicorn app:app)
+    init_services()
+
+# Time each request's pool waits, SQL and Google calls (Server-Timing, /api/metrics)
+PROFILING = os.environ.get('PROFILING', 'true').lower() == 'true'
+
+@app.before_request
+def start_profile():
+    if PROFILING:
+        profiling.start_request(request.method, request.url_rule.rule if request.url_rule else 'unmatched')
+
+@app.after_request
+def finish_profile(response):
+    profile = profiling.finish_request(response.status_code)
+    if profile is not None:
+        response.headers['Server-Timing'] = profile.server_timing()
+    return response
+
+@app.after_request
+def compress_response(response):
+    """gzip/brotli JSON and other text bodies when the client accepts it"""
+    if (response.direct_passthrough or response.is_streamed or 'Content-Encoding' in response.headers
+            or not should_compress(response.mimetype, response.content_length or 0)):
+        return response
+    encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+    if encoding is None:
+        return response
+    response.set_data(compress(response.get_data(), encoding))
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    if 'ETag' in response.headers:
+        response.headers['ETag'] = weaken_etag(response.headers['ETag'])
+    return response
+
+@app.teardown_request
+def abandon_profile(exc):
+    # after_request doesn't run when a view raises
+    if profiling.current_profile() is not None:
+        profiling.finish_request(500)
 
 # For demo purposes, use a default user ID (in production, this would come from authentication)
 DEFAULT_USER_ID = '00000000-0000-0000-0000-000000000001'
@@ -61,27 +207,188 @@ def index():
     </html>
     """
 
+def _asset_response(asset, cache_control):
+    """A prebuilt asset in the best encoding the client accepts, or 304 if its copy is current"""
+    encoding = choose_encoding(request.headers.get('Accept-Encoding'), asset.encoded)
+    # Each encoding is its own representation, so each gets its own strong ETag
+    etag = f'{asset.etag}-{encoding}' if encoding else asset.etag
+    if request.if_none_match.contains(etag):
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(asset.variant(encoding), content_type=asset.content_type)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    response.vary.add('Accept-Encoding')
+    return response
+
 @app.route('/dashboard')
 def dashboard():
     """Protected dashboard page - secure via Cloudflare"""
-    return render_template('index.html')
+    # The shell names the current hashed assets, so it is always revalidated
+    return _asset_response(get_dashboard_assets().shell, 'no-cache')
+
+@app.route('/assets/<name>')
+def dashboard_asset(name):
+    """Content-hashed dashboard CSS/JS; a new build gets new names, so these never change"""
+    asset = get_dashboard_assets().files.get(name)
+    if asset is None:
+        return jsonify({'success': False, 'message': 'Not found'}), 404
+    return _asset_response(asset, 'public, max-age=31536000, immutable')
 
 @app.route('/api/health')
 def health_check():
-    """Health check endpoint"""
+    """Health check endpoint; probes the database and reports pool statistics"""
+    db = check_db_health()
+    log_writer = get_activity_log_writer()
+    healthy = db['status'] == 'connected'
     return jsonify({
-        'status': 'ok',
+        'status': 'ok' if healthy else 'degraded',
         'timestamp': datetime.now().isoformat(),
         'message': 'Daily Discover server is running',
-        'database': 'connected'
+        'database': db['status'],
+        'database_latency_ms': db['latency_ms'],
+        'database_check': db,
+        'pool': get_pool_stats(),
+        'activity_log': log_writer.stats() if log_writer else None,
+        'live_events': get_event_broker().stats() if get_event_broker() else None
+    }), 200 if healthy else 503
+
+def _grocery_entry(entry):
+    """Normalize a grocery entry from a request body (a name or an object)"""
+    if isinstance(entry, str):
+        return {'item_name': entry, 'quantity': 1, 'notes': None}
+    return {
+        'item_name': entry.get('item_name') or entry.get('text') or entry.get('item'),
+        'quantity': entry.get('quantity', 1),
+        'notes': entry.get('notes')
+    }
+
+def _todo_entry(entry):
+    """Normalize a TODO entry from a request body (text or an object)"""
+    if isinstance(entry, str):
+        return {'text': entry, 'priority': 0}
+    return {'text': entry.get('text'), 'priority': entry.get('priority', 0)}
+
+def _list_payload(data):
+    """Entries of an array POST body (a bare list or {"items": [...]}), else None"""
+    if isinstance(data, list):
+        return data
+    if isinstance(data, dict) and isinstance(data.get('items'), list):
+        return data['items']
+    return None
+
+def _json_page_body(items_key, page, **fields):
+    """
+    Body for a page fetched with as_json; the item array Postgres rendered
+    is spliced in as text rather than decoded and re-encoded
+    """
+    head = json.dumps({'success': True, **fields, 'next_cursor': page['next_cursor']})
+    return f'{head[:-1]}, "{items_key}": {page["items_json"]}}}'
+
+def _json_page_response(items_key, page, **fields):
+    return app.response_class(_json_page_body(items_key, page, **fields), mimetype='application/json')
+
+@app.route('/api/dashboard')
+def dashboard_snapshot():
+    """
+    Todos, groceries, unread emails and Gmail status in one response
+    Revalidate with If-None-Match; unchanged data answers 304 without a body
+    """
+    try:
+        snapshot = Dashboard.snapshot(DEFAULT_USER_ID, if_none_match=list(request.if_none_match.as_set(include_weak=True)))
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+    
+    body = snapshot['snapshot_json']
+    if body is None:
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(f'{{"success": true, "dashboard": {body}}}', mimetype='application/json')
+    response.set_etag(snapshot['etag'])
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+@app.route('/api/events')
+def live_events():
+    """
+    Server-Sent Events stream of changes to the user's todos, groceries and
+    emails; EventSource resends Last-Event-ID on reconnect to catch up
+    """
+    broker = get_event_broker()
+    if broker is None:
+        return jsonify({'success': False, 'message': 'Live updates are disabled'}), 503
+    
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        stream = broker.stream(DEFAULT_USER_ID, last_event_id)
+    except OverflowError as e:
+        return jsonify({'success': False, 'message': str(e)}), 503
+    
+    return app.response_class(stream, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
     })
 
+@app.route('/api/cache/stats')
+def cache_stats():
+    """Read cache hit/miss counters for this worker process"""
+    return jsonify({
+        'success': True,
+        'pid': os.getpid(),
+        'cache': read_cache.stats()
+    })
+
+@app.route('/api/metrics')
+def metrics():
+    """Per-route latency histograms and pool/cache/stream counters for this worker, in Prometheus text format"""
+    pool = get_pool_stats()
+    cache = read_cache.stats()
+    broker = get_event_broker()
+    body = profiling.metrics.render({
+        'daily_discover_pool_connections_in_use': ('gauge', 'Pooled connections checked out', pool['in_use']),
+        'daily_discover_pool_connections_idle': ('gauge', 'Pooled connections idle', pool.get('idle', 0)),
+        'daily_discover_pool_requests_waiting': ('gauge', 'Requests waiting for a connection', pool.get('requests_waiting', 0)),
+        'daily_discover_pool_timeouts_total': ('counter', 'Connection checkouts that timed out', pool['timeouts']),
+        'daily_discover_read_cache_hits_total': ('counter', 'Read cache hits', cache['hits']),
+        'daily_discover_read_cache_misses_total': ('counter', 'Read cache misses', cache['misses']),
+        'daily_discover_live_event_clients': ('gauge', 'Open /api/events streams', broker.client_count() if broker else 0),
+    })
+    return app.response_class(body, mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/groceries', methods=['GET', 'POST'])
 def groceries():
     """Handle grocery list operations"""
     try:
         if request.method == 'POST':
             data = request.json
+            entries = _list_payload(data)
+            if entries is not None:
+                # Several items in one transaction
+                new_items = [_grocery_entry(entry) for entry in entries]
+                if not new_items or not all(item['item_name'] for item in new_items):
+                    return jsonify({'success': False, 'message': 'Item name is required'}), 400
+                
+                with db_session() as db:
+                    items = GroceryItem.create_many(DEFAULT_USER_ID, new_items, session=db)
+                    ActivityLog.log(
+                        DEFAULT_USER_ID,
+                        'groceries_added',
+                        'grocery',
+                        None,
+                        {'count': len(items), 'item_names': [item['item_name'] for item in items]},
+                        request.remote_addr,
+                        request.headers.get('User-Agent'),
+                        session=db
+                    )
+                
+                return jsonify({
+                    'success': True,
+                    'message': f'{len(items)} grocery items added',
+                    'data': items
+                }), 201
+            
             item_name = data.get('item_name') or data.get('text') or data.get('item')
             quantity = data.get('quantity', 1)
             notes = data.get('notes')
@@ -90,18 +397,20 @@ def groceries():
                 return jsonify({'success': False, 'message': 'Item name is required'}), 400
             
             # Create grocery item
-            item = GroceryItem.create(DEFAULT_USER_ID, item_name, quantity, notes)
-            
-            # Log the activity
-            ActivityLog.log(
-                DEFAULT_USER_ID,
-                'grocery_added',
-                'grocery',
-                str(item['id']),
-                {'item_name': item_name, 'quantity': quantity},
-                request.remote_addr,
-                request.headers.get('User-Agent')
-            )
+            with db_session() as db:
+                item = GroceryItem.create(DEFAULT_USER_ID, item_name, quantity, notes, session=db)
+
+                # Log the activity
+                ActivityLog.log(
+                    DEFAULT_USER_ID,
+                    'grocery_added',
+                    'grocery',
+                    str(item['id']),
+                    {'item_name': item_name, 'quantity': quantity},
+                    request.remote_addr,
+                    request.headers.get('User-Agent'),
+                    session=db
+                )
             
             return jsonify({
                 'success': True,
@@ -109,12 +418,57 @@ def groceries():
                 'data': item
             }), 201
         else:
-            # Get all active grocery items
-            items = GroceryItem.get_active(DEFAULT_USER_ID)
-            return jsonify({
-                'success': True,
-                'items': items
-            })
+            # Get a page of active grocery items
+            page = GroceryItem.get_active_page(
+                DEFAULT_USER_ID,
+                limit=request.args.get('limit', type=int),
+                cursor=request.args.get('cursor'),
+                as_json=True
+            )
+            return _json_page_response('items', page)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/api/groceries/checkout', methods=['POST'])
+def groceries_checkout():
+    """Archive the whole active grocery list as one shopping trip"""
+    data = request.get_json(silent=True) or {}
+    
+    try:
+        with db_session() as db:
+            trip = GroceryItem.checkout(DEFAULT_USER_ID, data.get('notes'), session=db)
+            if trip:
+                ActivityLog.log(
+                    DEFAULT_USER_ID,
+                    'groceries_checked_out',
+                    'shopping_event',
+                    trip['event_id'],
+                    {'archived': trip['archived']},
+                    request.remote_addr,
+                    request.headers.get('User-Agent'),
+                    session=db
+                )
+        if not trip:
+            return jsonify({'success': False, 'message': 'Grocery list is empty'}), 400
+        return jsonify({
+            'success': True,
+            'message': f"Archived {trip['archived']} items",
+            'data': trip
+        }), 201
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@app.route('/api/groceries/suggestions')
+def grocery_suggestions():
+    """Items that are probably needed soon, from past shopping trips"""
+    within_days = request.args.get('within_days', 3, type=int)
+    limit = min(request.args.get('limit', 20, type=int), 100)
+    
+    try:
+        items = GroceryItem.get_due_soon(DEFAULT_USER_ID, within_days, limit)
+        return jsonify({'success': True, 'items': items})
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
@@ -124,6 +478,32 @@ def todos():
     try:
         if request.method == 'POST':
             data = request.json
+            entries = _list_payload(data)
+            if entries is not None:
+                # Several TODOs in one transaction
+                new_todos = [_todo_entry(entry) for entry in entries]
+                if not new_todos or not all(todo['text'] for todo in new_todos):
+                    return jsonify({'success': False, 'message': 'Text is required'}), 400
+                
+                with db_session() as db:
+                    created = Todo.create_many(DEFAULT_USER_ID, new_todos, session=db)
+                    ActivityLog.log(
+                        DEFAULT_USER_ID,
+                        'todos_added',
+                        'todo',
+                        None,
+                        {'count': len(created)},
+                        request.remote_addr,
+                        request.headers.get('User-Agent'),
+                        session=db
+                    )
+                
+                return jsonify({
+                    'success': True,
+                    'message': f'{len(created)} TODO items added',
+                    'data': created
+                }), 201
+            
             text = data.get('text')
             priority = data.get('priority', 0)
             
@@ -131,18 +511,20 @@ def todos():
                 return jsonify({'success': False, 'message': 'Text is required'}), 400
             
             # Create TODO item
-            todo = Todo.create(DEFAULT_USER_ID, text, priority)
-            
-            # Log the activity
-            ActivityLog.log(
-                DEFAULT_USER_ID,
-                'todo_added',
-                'todo',
-                str(todo['id']),
-                {'text': text, 'priority': priority},
-                request.remote_addr,
-                request.headers.get('User-Agent')
-            )
+            with db_session() as db:
+                todo = Todo.create(DEFAULT_USER_ID, text, priority, session=db)
+
+                # Log the activity
+                ActivityLog.log(
+                    DEFAULT_USER_ID,
+                    'todo_added',
+                    'todo',
+                    str(todo['id']),
+                    {'text': text, 'priority': priority},
+                    request.remote_addr,
+                    request.headers.get('User-Agent'),
+                    session=db
+                )
             
             return jsonify({
                 'success': True,
@@ -150,12 +532,17 @@ def todos():
                 'data': todo
             }), 201
         else:
-            # Get all incomplete TODOs
-            items = Todo.get_all(DEFAULT_USER_ID, include_completed=False)
-            return jsonify({
-                'success': True,
-                'items': items
-            })
+            # Get a page of incomplete TODOs
+            page = Todo.get_page(
+                DEFAULT_USER_ID,
+                include_completed=False,
+                limit=request.args.get('limit', type=int),
+                cursor=request.args.get('cursor'),
+                as_json=True
+            )
+            return _json_page_response('items', page)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
@@ -163,23 +550,54 @@ def todos():
 def complete_todo(todo_id):
     """Mark a TODO as completed"""
     try:
-        success = Todo.mark_completed(todo_id, True)
+        with db_session() as db:
+            success = Todo.mark_completed(todo_id, True, session=db)
+            if success:
+                ActivityLog.log(
+                    DEFAULT_USER_ID,
+                    'todo_completed',
+                    'todo',
+                    todo_id,
+                    None,
+                    request.remote_addr,
+                    request.headers.get('User-Agent'),
+                    session=db
+                )
         if success:
-            ActivityLog.log(
-                DEFAULT_USER_ID,
-                'todo_completed',
-                'todo',
-                todo_id,
-                None,
-                request.remote_addr,
-                request.headers.get('User-Agent')
-            )
             return jsonify({'success': True, 'message': 'TODO marked as completed'})
         else:
             return jsonify({'success': False, 'message': 'TODO not found'}), 404
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 500
 
+@app.route('/api/activity/rollups')
+def activity_rollups():
+    """Activity counts per hour or day, by action and entity type"""
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in ('hour', 'day'):
+        return jsonify({'success': False, 'message': "granularity must be 'hour' or 'day'"}), 400
+    
+    try:
+        now = datetime.now(timezone.utc)
+        since = request.args.get('since')
+        until = request.args.get('until')
+        since = datetime.fromisoformat(since) if since else now - timedelta(days=2 if granularity == 'hour' else 30)
+        until = datetime.fromisoformat(until) if until else None
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    try:
+        rollups = ActivityLog.get_rollups(
+            granularity,
+            since,
+            until,
+            action=request.args.get('action'),
+            entity_type=request.args.get('entity_type')
+        )
+        return jsonify({'success': True, 'granularity': granularity, 'rollups': rollups})
+    except Exception as e:
+        return jsonify({'success': False, 'message': str(e)}), 500
+
 @app.route('/api/voice-input', methods=['POST'])
 def voice_input():
     """Handle voice input from iOS Shortcuts"""
@@ -192,16 +610,18 @@ def voice_input():
             item_name = data.get('item')
             quantity = data.get('quantity', 1)
             
-            item = GroceryItem.create(DEFAULT_USER_ID, item_name, quantity)
-            ActivityLog.log(
-                DEFAULT_USER_ID,
-                'grocery_added_voice',
-                'grocery',
-                str(item['id']),
-                {'item_name': item_name, 'source': 'voice'},
-                request.remote_addr,
-                request.headers.get('User-Agent')
-            )
+            with db_session() as db:
+                item = GroceryItem.create(DEFAULT_USER_ID, item_name, quantity, session=db)
+                ActivityLog.log(
+                    DEFAULT_USER_ID,
+                    'grocery_added_voice',
+                    'grocery',
+                    str(item['id']),
+                    {'item_name': item_name, 'source': 'voice'},
+                    request.remote_addr,
+                    request.headers.get('User-Agent'),
+                    session=db
+                )
             
             return jsonify({
                 'success': True,
@@ -211,21 +631,23 @@ def voice_input():
         elif input_type == 'groceries':
             # Handle multiple grocery items
             items = data.get('items', [])
-            added_items = []
-            
-            for item_name in items:
-                item = GroceryItem.create(DEFAULT_USER_ID, item_name, 1)
-                added_items.append(item)
-            
-            ActivityLog.log(
-                DEFAULT_USER_ID,
-                'groceries_added_voice',
-                'grocery',
-                None,
-                {'count': len(items), 'source': 'voice'},
-                request.remote_addr,
-                request.headers.get('User-Agent')
-            )
+            with db_session() as db:
+                added_items = GroceryItem.create_many(
+                    DEFAULT_USER_ID,
+                    [_grocery_entry(item_name) for item_name in items],
+                    session=db
+                )
+
+                ActivityLog.log(
+                    DEFAULT_USER_ID,
+                    'groceries_added_voice',
+                    'grocery',
+                    None,
+                    {'count': len(items), 'source': 'voice'},
+                    request.remote_addr,
+                    request.headers.get('User-Agent'),
+                    session=db
+                )
             
             return jsonify({
                 'success': True,
@@ -238,22 +660,47 @@ def voice_input():
             text = data.get('text')
             priority = data.get('priority', 0)
             
-            todo = Todo.create(DEFAULT_USER_ID, text, priority)
-            ActivityLog.log(
-                DEFAULT_USER_ID,
-                'todo_added_voice',
-                'todo',
-                str(todo['id']),
-                {'text': text, 'source': 'voice'},
-                request.remote_addr,
-                request.headers.get('User-Agent')
-            )
+            with db_session() as db:
+                todo = Todo.create(DEFAULT_USER_ID, text, priority, session=db)
+                ActivityLog.log(
+                    DEFAULT_USER_ID,
+                    'todo_added_voice',
+                    'todo',
+                    str(todo['id']),
+                    {'text': text, 'source': 'voice'},
+                    request.remote_addr,
+                    request.headers.get('User-Agent'),
+                    session=db
+                )
             
             return jsonify({
                 'success': True,
                 'message': f'Added TODO: {text}'
             })
             
+        elif input_type == 'todos':
+            # Handle multiple TODO items from voice
+            texts = data.get('items', [])
+            with db_session() as db:
+                added_todos = Todo.create_many(DEFAULT_USER_ID, [_todo_entry(text) for text in texts], session=db)
+
+                ActivityLog.log(
+                    DEFAULT_USER_ID,
+                    'todos_added_voice',
+                    'todo',
+                    None,
+                    {'count': len(texts), 'source': 'voice'},
+                    request.remote_addr,
+                    request.headers.get('User-Agent'),
+                    session=db
+                )
+            
+            return jsonify({
+                'success': True,
+                'message': f'Added {len(texts)} TODOs',
+                'items': added_todos
+            })
+            
         else:
             return jsonify({
                 'success': False,
@@ -283,11 +730,17 @@ def oauth2callback():
     if code:
         try:
             handle_oauth_callback(code, GMAIL_REDIRECT_URI)
-            # Immediately sync emails after authentication
-            sync_result = sync_gmail_messages(DEFAULT_USER_ID, days_back=20)
+            # Sync emails in the background right after authentication (the
+            # account may have changed, so don't trust the stored watermark)
+            Job.enqueue(
+                'gmail_sync',
+                DEFAULT_USER_ID,
+                {'days_back': 20, 'full': True},
+                dedupe_key=gmail_sync_key(DEFAULT_USER_ID)
+            )
             return f"""
                 <h1>✅ Gmail Connected!</h1>
-                <p>Synced {sync_result.get('synced', 0)} messages ({sync_result.get('new', 0)} new)</p>
+                <p>Syncing your messages in the background...</p>
                 <p><a href="/">Go back to dashboard</a></p>
                 <script>setTimeout(() => window.location.href = '/', 2000);</script>
             """
@@ -307,7 +760,7 @@ def gmail_status():
 
 @app.route('/api/gmail/sync', methods=['POST'])
 def gmail_sync():
-    """Manually sync Gmail messages"""
+    """Queue a Gmail sync; poll /api/jobs/<job_id> for the result"""
     if not is_authenticated():
         return jsonify({
             'success': False,
@@ -315,20 +768,34 @@ def gmail_sync():
         }), 401
     
     days_back = request.json.get('days_back', 20) if request.json else 20
-    result = sync_gmail_messages(DEFAULT_USER_ID, days_back=days_back)
+    full = request.json.get('full', False) if request.json else False
     
-    if result['success']:
-        ActivityLog.log(
+    try:
+        # Coalesces with a sync that is already queued for this mailbox
+        job = Job.enqueue(
+            'gmail_sync',
             DEFAULT_USER_ID,
-            'gmail_synced',
-            'email',
-            None,
-            {'synced': result['synced'], 'new': result['new']},
-            request.remote_addr,
-            request.headers.get('User-Agent')
+            {'days_back': days_back, 'full': full},
+            dedupe_key=gmail_sync_key(DEFAULT_USER_ID)
         )
-    
-    return jsonify(result)
+        return jsonify({
+            'success': True,
+            'job_id': job['id'],
+            'status': job['status']
+        }), 202
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/jobs/<job_id>')
+def job_status(job_id):
+    """Get the status of a background job"""
+    try:
+        job = Job.get(job_id)
+        if not job:
+            return jsonify({'success': False, 'error': 'Job not found'}), 404
+        return jsonify({'success': True, 'job': job})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
 
 @app.route('/api/emails')
 def get_emails():
@@ -337,12 +804,41 @@ def get_emails():
     unread_only = request.args.get('unread_only', 'true').lower() == 'true'
     
     try:
-        emails = get_cached_emails(DEFAULT_USER_ID, days_back=days_back, unread_only=unread_only)
+        page = get_cached_email_page(
+            DEFAULT_USER_ID,
+            days_back=days_back,
+            unread_only=unread_only,
+            limit=request.args.get('limit', type=int),
+            cursor=request.args.get('cursor'),
+            as_json=True
+        )
+        return _json_page_response('emails', page, count=page['count'])
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
         return jsonify({
-            'success': True,
-            'emails': emails,
-            'count': len(emails)
-        })
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/emails/search')
+def search_emails():
+    """
+    Search cached emails, best match first
+    ?q= takes web search syntax; each ?label= must be on the message
+    """
+    try:
+        page = search_cached_emails(
+            DEFAULT_USER_ID,
+            query=request.args.get('q'),
+            labels=request.args.getlist('label'),
+            limit=request.args.get('limit', type=int),
+            cursor=request.args.get('cursor'),
+            as_json=True
+        )
+        return _json_page_response('emails', page, count=page['count'])
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         return jsonify({
             'success': False,
@@ -350,12 +846,64 @@ def get_emails():
         }), 500
 
 
+@app.route('/api/calendar/today')
+def calendar_today():
+    """Events overlapping today, in start order"""
+    try:
+        events = get_today_events(DEFAULT_USER_ID)
+        return jsonify({'success': True, 'events': events, 'count': len(events)})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/calendar/upcoming')
+def calendar_upcoming():
+    """Events in the next few days after today (?days=, default 5)"""
+    try:
+        events = get_upcoming_events(DEFAULT_USER_ID, days=request.args.get('days', 5, type=int))
+        return jsonify({'success': True, 'events': events, 'count': len(events)})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
 # Blog routes
 # ============================================================================
-# BLOG API ENDPOINTS - Removed (Blog is static via Astro, deployed to Cloudflare Pages)
-# Blog content is served directly from / and /blog/* routes above
+# The blog itself is static (Astro, deployed to Cloudflare Pages); these read
+# the post index that the worker keeps in blog_posts (see blog_service.py)
 # ============================================================================
 
+@app.route('/api/blog/recent')
+def recent_posts():
+    """Published posts, newest first"""
+    try:
+        page = get_post_page(
+            DEFAULT_USER_ID,
+            limit=request.args.get('limit', type=int),
+            cursor=request.args.get('cursor'),
+            as_json=True
+        )
+        return _json_page_response('posts', page, count=page['count'])
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/blog/tags/<tag>')
+def posts_by_tag(tag):
+    """Published posts tagged `tag`, newest first"""
+    try:
+        page = get_post_page(
+            DEFAULT_USER_ID,
+            tag=tag,
+            limit=request.args.get('limit', type=int),
+            cursor=request.args.get('cursor'),
+            as_json=True
+        )
+        return _json_page_response('posts', page, tag=tag, count=page['count'])
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 if __name__ == '__main__':
     app.run(
         host='0.0.0.0',
@@ -0,0 +1,427 @@
+"""
+ASGI entry point for Daily Discover
+    gunicorn asgi:application -k uvicorn.workers.UvicornWorker
+Read paths, the live event stream and the Gmail status/sync calls are served
+by async handlers on database_async's pool, so a request waiting on Postgres
+or Google holds no thread. Every other request (including the other methods
+of these paths) falls through to the Flask app, so the REST contract is the
+same either way. With the embedded SQLite backend there is no async pool and
+every request goes to Flask
+"""
+import functools
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from a2wsgi import WSGIMiddleware
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Match, Route
+import database_async as adb
+import profiling
+from compression import choose_encoding, compress, should_compress, weaken_etag
+from database import get_activity_log_writer, is_sqlite_url
+from events import get_event_broker
+from gmail_service import is_authenticated, gmail_sync_key, get_cached_email_page_async, search_cached_emails_async
+from app import (
+    app as flask_app,
+    init_services,
+    close_services,
+    DATABASE_URL,
+    DEFAULT_USER_ID,
+    CORS_ORIGINS,
+    CORS_METHODS,
+    CORS_HEADERS,
+    _json_page_body,
+    PROFILING,
+)
+
+# Threads for requests handed to Flask
+WSGI_THREADS = int(os.environ.get('ASGI_WSGI_THREADS', 10))
+
+# database_async is PostgreSQL-only
+ASYNC_ROUTES = not is_sqlite_url(DATABASE_URL)
+
+
+def profiled(endpoint, path: str):
+    """Profile an async endpoint like app.py's request hooks do Flask views"""
+    
+    @functools.wraps(endpoint)
+    async def wrapper(request: Request):
+        if not PROFILING:
+            return await endpoint(request)
+        profiling.start_request(request.method, path)
+        try:
+            response = await endpoint(request)
+        except BaseException:
+            profiling.finish_request(500)
+            raise
+        profile = profiling.finish_request(response.status_code)
+        response.headers['Server-Timing'] = profile.server_timing()
+        return response
+    
+    return wrapper
+
+
+def compressed(endpoint):
+    """Compress an async endpoint's response like app.py's compress_response"""
+    
+    @functools.wraps(endpoint)
+    async def wrapper(request: Request):
+        response = await endpoint(request)
+        if isinstance(response, StreamingResponse) or 'content-encoding' in response.headers:
+            return response
+        if not should_compress(response.headers.get('content-type'), len(response.body)):
+            return response
+        encoding = choose_encoding(request.headers.get('accept-encoding'))
+        if encoding is None:
+            return response
+        response.body = compress(response.body, encoding)
+        response.headers['content-length'] = str(len(response.body))
+        response.headers['content-encoding'] = encoding
+        response.headers.add_vary_header('Accept-Encoding')
+        if 'etag' in response.headers:
+            response.headers['etag'] = weaken_etag(response.headers['etag'])
+        return response
+    
+    return wrapper
+
+
+class AsyncRoute(Route):
+    """A Route that lets other methods fall through to Flask instead of answering 405"""
+    
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, profiled(compressed(endpoint), path), **kwargs)
+    
+    def matches(self, scope):
+        match, child_scope = super().matches(scope)
+        if match == Match.PARTIAL:
+            return Match.NONE, {}
+        return match, child_scope
+
+
+def json_response(payload, status: int = 200, headers=None) -> Response:
+    """Encode like Flask's jsonify, so both paths return identical bodies"""
+    return Response(flask_app.json.dumps(payload) + '\n', status, headers=headers, media_type='application/json')
+
+def raw_json_response(body: str, status: int = 200) -> Response:
+    return Response(body, status, media_type='application/json')
+
+def int_arg(request: Request, name: str, default=None):
+    """Query parameter as an int, or default if missing or malformed (like Flask's type=int)"""
+    try:
+        return int(request.query_params[name])
+    except (KeyError, ValueError):
+        return default
+
+async def json_body(request: Request):
+    try:
+        return await request.json()
+    except ValueError:
+        return None
+
+
+async def health_check(request: Request):
+    """Health check endpoint; probes the database and reports pool statistics"""
+    db = await adb.check_db_health()
+    log_writer = get_activity_log_writer()
+    healthy = db['status'] == 'connected'
+    return json_response({
+        'status': 'ok' if healthy else 'degraded',
+        'timestamp': datetime.now().isoformat(),
+        'message': 'Daily Discover server is running',
+        'database': db['status'],
+        'database_latency_ms': db['latency_ms'],
+        'database_check': db,
+        'pool': adb.get_pool_stats(),
+        'activity_log': log_writer.stats() if log_writer else None,
+        'live_events': get_event_broker().stats() if get_event_broker() else None
+    }, 200 if healthy else 503)
+
+async def dashboard_snapshot(request: Request):
+    """Todos, groceries, unread emails and Gmail status; 304 when unchanged"""
+    if_none_match = [
+        tag.strip().removeprefix('W/').strip('"')
+        for tag in request.headers.get('if-none-match', '').split(',') if tag.strip()
+    ]
+    try:
+        snapshot = await adb.Dashboard.snapshot(DEFAULT_USER_ID, if_none_match=if_none_match)
+    except Exception as e:
+        return json_response({'success': False, 'message': str(e)}, 500)
+    
+    headers = {'ETag': f'"{snapshot["etag"]}"', 'Cache-Control': 'no-cache'}
+    body = snapshot['snapshot_json']
+    if body is None:
+        return Response(status_code=304, headers=headers)
+    return Response(f'{{"success": true, "dashboard": {body}}}', headers=headers, media_type='application/json')
+
+async def live_events(request: Request):
+    """Server-Sent Events stream of changes (see events.EventBroker)"""
+    broker = get_event_broker()
+    if broker is None:
+        return json_response({'success': False, 'message': 'Live updates are disabled'}, 503)
+    
+    last_event_id = request.headers.get('last-event-id') or request.query_params.get('last_event_id')
+    try:
+        stream = broker.astream(DEFAULT_USER_ID, last_event_id)
+    except OverflowError as e:
+        return json_response({'success': False, 'message': str(e)}, 503)
+    
+    return StreamingResponse(stream, media_type='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+async def list_groceries(request: Request):
+    """Get a page of active grocery items"""
+    try:
+        page = await adb.GroceryItem.get_active_page(
+            DEFAULT_USER_ID,
+            limit=int_arg(request, 'limit'),
+            cursor=request.query_params.get('cursor'),
+            as_json=True
+        )
+        return raw_json_response(_json_page_body('items', page))
+    except ValueError as e:
+        return json_response({'success': False, 'message': str(e)}, 400)
+    except Exception as e:
+        return json_response({'success': False, 'message': str(e)}, 500)
+
+async def groceries_checkout(request: Request):
+    """Archive the whole active grocery list as one shopping trip"""
+    data = await json_body(request) or {}
+    
+    try:
+        async with adb.db_session() as db:
+            trip = await adb.GroceryItem.checkout(DEFAULT_USER_ID, data.get('notes'), session=db)
+            if trip:
+                await adb.ActivityLog.log(
+                    DEFAULT_USER_ID,
+                    'groceries_checked_out',
+                    'shopping_event',
+                    trip['event_id'],
+                    {'archived': trip['archived']},
+                    request.client.host if request.client else None,
+                    request.headers.get('user-agent'),
+                    session=db
+                )
+        if not trip:
+            return json_response({'success': False, 'message': 'Grocery list is empty'}, 400)
+        return json_response({
+            'success': True,
+            'message': f"Archived {trip['archived']} items",
+            'data': trip
+        }, 201)
+    except Exception as e:
+        return json_response({'success': False, 'message': str(e)}, 500)
+
+async def grocery_suggestions(request: Request):
+    """Items that are probably needed soon, from past shopping trips"""
+    within_days = int_arg(request, 'within_days', 3)
+    limit = min(int_arg(request, 'limit', 20), 100)
+    
+    try:
+        items = await adb.GroceryItem.get_due_soon(DEFAULT_USER_ID, within_days, limit)
+        return json_response({'success': True, 'items': items})
+    except Exception as e:
+        return json_response({'success': False, 'message': str(e)}, 500)
+
+async def list_todos(request: Request):
+    """Get a page of incomplete TODOs"""
+    try:
+        page = await adb.Todo.get_page(
+            DEFAULT_USER_ID,
+            include_completed=False,
+            limit=int_arg(request, 'limit'),
+            cursor=request.query_params.get('cursor'),
+            as_json=True
+        )
+        return raw_json_response(_json_page_body('items', page))
+    except ValueError as e:
+        return json_response({'success': False, 'message': str(e)}, 400)
+    except Exception as e:
+        return json_response({'success': False, 'message': str(e)}, 500)
+
+async def complete_todo(request: Request):
+    """Mark a TODO as completed"""
+    todo_id = request.path_params['todo_id']
+    try:
+        async with adb.db_session() as db:
+            success = await adb.Todo.mark_completed(todo_id, True, session=db)
+            if success:
+                await adb.ActivityLog.log(
+                    DEFAULT_USER_ID,
+                    'todo_completed',
+                    'todo',
+                    todo_id,
+                    None,
+                    request.client.host if request.client else None,
+                    request.headers.get('user-agent'),
+                    session=db
+                )
+        if success:
+            return json_response({'success': True, 'message': 'TODO marked as completed'})
+        else:
+            return json_response({'success': False, 'message': 'TODO not found'}, 404)
+    except Exception as e:
+        return json_response({'success': False, 'message': str(e)}, 500)
+
+async def activity_rollups(request: Request):
+    """Activity counts per hour or day, by action and entity type"""
+    granularity = request.query_params.get('granularity', 'day')
+    if granularity not in ('hour', 'day'):
+        return json_response({'success': False, 'message': "granularity must be 'hour' or 'day'"}, 400)
+    
+    try:
+        now = datetime.now(timezone.utc)
+        since = request.query_params.get('since')
+        until = request.query_params.get('until')
+        since = datetime.fromisoformat(since) if since else now - timedelta(days=2 if granularity == 'hour' else 30)
+        until = datetime.fromisoformat(until) if until else None
+    except ValueError as e:
+        return json_response({'success': False, 'message': str(e)}, 400)
+    
+    try:
+        rollups = await adb.ActivityLog.get_rollups(
+            granularity,
+            since,
+            until,
+            action=request.query_params.get('action'),
+            entity_type=request.query_params.get('entity_type')
+        )
+        return json_response({'success': True, 'granularity': granularity, 'rollups': rollups})
+    except Exception as e:
+        return json_response({'success': False, 'message': str(e)}, 500)
+
+async def gmail_status(request: Request):
+    """Check Gmail authentication status (a token refresh runs off the event loop)"""
+    authenticated = await run_in_threadpool(is_authenticated)
+    return json_response({
+        'authenticated': authenticated,
+        'message': 'Gmail is connected' if authenticated else 'Gmail not connected'
+    })
+
+async def gmail_sync(request: Request):
+    """Queue a Gmail sync; poll /api/jobs/<job_id> for the result"""
+    if not await run_in_threadpool(is_authenticated):
+        return json_response({
+            'success': False,
+            'error': 'Not authenticated. Please connect Gmail first.'
+        }, 401)
+    
+    data = await json_body(request) or {}
+    days_back = data.get('days_back', 20)
+    full = data.get('full', False)
+    
+    try:
+        # Coalesces with a sync that is already queued for this mailbox
+        job = await adb.Job.enqueue(
+            'gmail_sync',
+            DEFAULT_USER_ID,
+            {'days_back': days_back, 'full': full},
+            dedupe_key=gmail_sync_key(DEFAULT_USER_ID)
+        )
+        return json_response({
+            'success': True,
+            'job_id': job['id'],
+            'status': job['status']
+        }, 202)
+    except Exception as e:
+        return json_response({'success': False, 'error': str(e)}, 500)
+
+async def job_status(request: Request):
+    """Get the status of a background job"""
+    try:
+        job = await adb.Job.get(request.path_params['job_id'])
+        if not job:
+            return json_response({'success': False, 'error': 'Job not found'}, 404)
+        return json_response({'success': True, 'job': job})
+    except Exception as e:
+        return json_response({'success': False, 'error': str(e)}, 500)
+
+async def get_emails(request: Request):
+    """Get cached email messages"""
+    days_back = int_arg(request, 'days_back', 20)
+    unread_only = request.query_params.get('unread_only', 'true').lower() == 'true'
+    
+    try:
+        page = await get_cached_email_page_async(
+            DEFAULT_USER_ID,
+            days_back=days_back,
+            unread_only=unread_only,
+            limit=int_arg(request, 'limit'),
+            cursor=request.query_params.get('cursor'),
+            as_json=True
+        )
+        return raw_json_response(_json_page_body('emails', page, count=page['count']))
+    except ValueError as e:
+        return json_response({'success': False, 'error': str(e)}, 400)
+    except Exception as e:
+        return json_response({'success': False, 'error': str(e)}, 500)
+
+async def search_emails(request: Request):
+    """Search cached emails, best match first"""
+    try:
+        page = await search_cached_emails_async(
+            DEFAULT_USER_ID,
+            query=request.query_params.get('q'),
+            labels=request.query_params.getlist('label'),
+            limit=int_arg(request, 'limit'),
+            cursor=request.query_params.get('cursor'),
+            as_json=True
+        )
+        return raw_json_response(_json_page_body('emails', page, count=page['count']))
+    except ValueError as e:
+        return json_response({'success': False, 'error': str(e)}, 400)
+    except Exception as e:
+        return json_response({'success': False, 'error': str(e)}, 500)
+
+
+ROUTES = [
+    AsyncRoute('/api/health', health_check, methods=['GET']),
+    AsyncRoute('/api/dashboard', dashboard_snapshot, methods=['GET']),
+    AsyncRoute('/api/events', live_events, methods=['GET']),
+    AsyncRoute('/api/groceries', list_groceries, methods=['GET']),
+    AsyncRoute('/api/groceries/checkout', groceries_checkout, methods=['POST']),
+    AsyncRoute('/api/groceries/suggestions', grocery_suggestions, methods=['GET']),
+    AsyncRoute('/api/todos', list_todos, methods=['GET']),
+    AsyncRoute('/api/todos/{todo_id}/complete', complete_todo, methods=['POST']),
+    AsyncRoute('/api/activity/rollups', activity_rollups, methods=['GET']),
+    AsyncRoute('/api/gmail/status', gmail_status, methods=['GET']),
+    AsyncRoute('/api/gmail/sync', gmail_sync, methods=['POST']),
+    AsyncRoute('/api/jobs/{job_id}', job_status, methods=['GET']),
+    AsyncRoute('/api/emails', get_emails, methods=['GET']),
+    AsyncRoute('/api/emails/search', search_emails, methods=['GET']),
+]
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Per-process services start here, after gunicorn forks the worker
+    await run_in_threadpool(init_services)
+    if ASYNC_ROUTES:
+        await adb.init_db_pool(DATABASE_URL)
+    broker = get_event_broker()
+    if broker is not None:
+        # Streams here cost a coroutine, not a thread
+        broker.max_clients = int(os.environ.get('LIVE_EVENTS_MAX_CLIENTS_ASGI', 100))
+    try:
+        yield
+    finally:
+        await adb.close_db_pool()
+        await run_in_threadpool(close_services)
+
+
+application = Starlette(
+    routes=ROUTES if ASYNC_ROUTES else [],
+    lifespan=lifespan
+)
+application.router.default = WSGIMiddleware(flask_app, workers=WSGI_THREADS)
+application.add_middleware(
+    CORSMiddleware,
+    allow_origins=CORS_ORIGINS,
+    allow_methods=CORS_METHODS,
+    allow_headers=CORS_HEADERS,
+)
@@ -0,0 +1,163 @@
+"""
+Prebuilt dashboard shell for Daily Discover
+    python -m assets            (deploy time; writes static/dist/)
+templates/index.html has no server-side variables, so instead of rendering it
+per request it is split once into the HTML shell plus content-hashed CSS and
+JS files, each with gzip (and brotli, if installed) variants. Hashed files
+never change under their name and are cached as immutable; the shell is
+revalidated by ETag. A build in static/dist/ for the current template is
+loaded as is; otherwise the build runs in memory on first use
+"""
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+from typing import Dict, Optional
+from compression import available_encodings, compress
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TEMPLATE_PATH = os.path.join(BASE_DIR, 'templates', 'index.html')
+DIST_DIR = os.path.join(BASE_DIR, 'static', 'dist')
+
+# URL prefix the hashed assets are served under (see app.py)
+ASSET_PREFIX = '/assets/'
+
+CONTENT_TYPES = {
+    '.html': 'text/html; charset=utf-8',
+    '.css': 'text/css; charset=utf-8',
+    '.js': 'application/javascript; charset=utf-8',
+}
+
+INLINE_STYLE = re.compile(r'[ \t]*<style>(.*?)</style>', re.S)
+INLINE_SCRIPT = re.compile(r'[ \t]*<script>(.*?)</script>', re.S)
+
+
+class Asset:
+    """One built file: its bytes, precompressed variants and validator"""
+
+    def __init__(self, name: str, body: bytes, encoded: Optional[Dict[str, bytes]] = None):
+        self.name = name
+        self.body = body
+        self.content_type = CONTENT_TYPES[os.path.splitext(name)[1]]
+        self.etag = hashlib.sha256(body).hexdigest()[:16]
+        self.encoded = encoded if encoded is not None else {
+            encoding: compress(body, encoding, static=True) for encoding in available_encodings()
+        }
+
+    def variant(self, encoding: Optional[str]) -> bytes:
+        return self.encoded[encoding] if encoding else self.body
+
+
+class DashboardAssets:
+    """The shell (served at /dashboard) and the hashed files it links to"""
+
+    def __init__(self, shell: Asset, files: Dict[str, Asset], source_hash: str):
+        self.shell = shell
+        self.files = files
+        self.source_hash = source_hash
+
+    def manifest(self) -> Dict:
+        return {
+            'source_hash': self.source_hash,
+            'shell': self.shell.name,
+            'files': sorted(self.files),
+            'encodings': list(available_encodings()),
+        }
+
+
+def _hashed_name(stem: str, ext: str, body: bytes) -> str:
+    return f'{stem}.{hashlib.sha256(body).hexdigest()[:12]}{ext}'
+
+def _source_hash(template: bytes) -> str:
+    return hashlib.sha256(template).hexdigest()[:16]
+
+def build(template_path: str = TEMPLATE_PATH) -> DashboardAssets:
+    """Split the template's inline <style> and <script> into hashed files"""
+    with open(template_path, 'rb') as f:
+        template = f.read()
+    html = template.decode('utf-8')
+    files: Dict[str, Asset] = {}
+
+    def extract(pattern, ext: str, tag):
+        nonlocal html
+        match = pattern.search(html)
+        if match is None:
+            return
+        body = match.group(1).strip().encode('utf-8') + b'\n'
+        name = _hashed_name('dashboard', ext, body)
+        files[name] = Asset(name, body)
+        indent = match.group(0)[:len(match.group(0)) - len(match.group(0).lstrip())]
+        # A plain <script src> runs at the same point the inline script did
+        html = html[:match.start()] + indent + tag(ASSET_PREFIX + name) + html[match.end():]
+
+    extract(INLINE_STYLE, '.css', lambda url: f'<link rel="stylesheet" href="{url}">')
+    extract(INLINE_SCRIPT, '.js', lambda url: f'<script src="{url}"></script>')
+    shell = Asset('dashboard.html', html.encode('utf-8'))
+    return DashboardAssets(shell, files, _source_hash(template))
+
+def write(assets: DashboardAssets, dist_dir: str = DIST_DIR):
+    """Write the build (and a manifest tying it to the template) for load()"""
+    os.makedirs(dist_dir, exist_ok=True)
+    for asset in [assets.shell, *assets.files.values()]:
+        with open(os.path.join(dist_dir, asset.name), 'wb') as f:
+            f.write(asset.body)
+        for encoding, body in asset.encoded.items():
+            with open(os.path.join(dist_dir, f'{asset.name}.{_suffix(encoding)}'), 'wb') as f:
+                f.write(body)
+    with open(os.path.join(dist_dir, 'manifest.json'), 'w') as f:
+        json.dump(assets.manifest(), f, indent=2)
+
+def load(dist_dir: str = DIST_DIR, template_path: str = TEMPLATE_PATH) -> Optional[DashboardAssets]:
+    """A build from static/dist/, or None if there is none for the current template"""
+    try:
+        with open(os.path.join(dist_dir, 'manifest.json')) as f:
+            manifest = json.load(f)
+        with open(template_path, 'rb') as f:
+            if manifest['source_hash'] != _source_hash(f.read()):
+                return None
+        if manifest['encodings'] != list(available_encodings()):
+            return None
+
+        def read(name: str) -> Asset:
+            with open(os.path.join(dist_dir, name), 'rb') as f:
+                body = f.read()
+            encoded = {}
+            for encoding in manifest['encodings']:
+                with open(os.path.join(dist_dir, f'{name}.{_suffix(encoding)}'), 'rb') as f:
+                    encoded[encoding] = f.read()
+            return Asset(name, body, encoded)
+
+        return DashboardAssets(
+            read(manifest['shell']),
+            {name: read(name) for name in manifest['files']},
+            manifest['source_hash']
+        )
+    except (OSError, ValueError, KeyError):
+        return None
+
+def _suffix(encoding: str) -> str:
+    return 'gz' if encoding == 'gzip' else encoding
+
+
+_assets: Optional[DashboardAssets] = None
+_assets_lock = threading.Lock()
+
+def get_dashboard_assets() -> DashboardAssets:
+    """This process's dashboard build, loaded or built once"""
+    global _assets
+    if _assets is None:
+        with _assets_lock:
+            if _assets is None:
+                _assets = load() or build()
+    return _assets
+
+
+if __name__ == '__main__':
+    dist_dir = sys.argv[1] if len(sys.argv) > 1 else DIST_DIR
+    built = build()
+    write(built, dist_dir)
+    for asset in [built.shell, *built.files.values()]:
+        sizes = ', '.join(f'{encoding} {len(body)}' for encoding, body in asset.encoded.items())
+        print(f'{asset.name}: {len(asset.body)} bytes ({sizes})')
@@ -0,0 +1,8 @@
+"""
+Benchmark suite for Daily Discover
+    python -m bench.run --database-url postgresql://localhost/daily_discover_bench
+Seeds a scratch database from schema.sql (bench.seed), swaps the Gmail API
+for a deterministic local fake (bench.fake_gmail), drives the app's endpoints
+and sync_gmail_messages at a given concurrency, and writes the numbers to
+bench/results/ as JSON for bench.compare
+"""
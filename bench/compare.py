@@ -0,0 +1,48 @@
+"""
+Compare two bench.run result files
+    python -m bench.compare bench/results/BASE.json bench/results/NEW.json
+Prints per endpoint and concurrency level the change in throughput and p50/p95/p99
+"""
+import argparse
+import json
+from typing import Any, Dict, Optional
+
+
+def change(before: Optional[float], after: Optional[float]) -> str:
+    if not before or after is None:
+        return '      n/a'
+    return f'{(after - before) / before * 100:+8.1f}%'
+
+
+def compare(base: Dict[str, Any], new: Dict[str, Any]):
+    print(f"base {base['meta']['git']['commit'][:8]} {base['meta']['label']}  ->  "
+          f"new {new['meta']['git']['commit'][:8]} {new['meta']['label']}")
+    print(f"{'endpoint':24} {'c':>3} {'req/s':>9} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for name, levels in new['endpoints'].items():
+        for concurrency, after in levels.items():
+            before = base['endpoints'].get(name, {}).get(concurrency)
+            if before is None:
+                continue
+            print(f"{name:24} {concurrency:>3} "
+                  f"{change(before['throughput_rps'], after['throughput_rps'])} "
+                  f"{change(before['p50_ms'], after['p50_ms'])} "
+                  f"{change(before['p95_ms'], after['p95_ms'])} "
+                  f"{change(before['p99_ms'], after['p99_ms'])}")
+    for before, after in zip(base.get('sync', []), new.get('sync', [])):
+        print(f"sync {after['mode']:19} messages/s {change(before['messages_per_second'], after['messages_per_second'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare two benchmark result files')
+    parser.add_argument('base')
+    parser.add_argument('new')
+    args = parser.parse_args()
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    compare(base, new)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+"""
+Deterministic stand-in for the googleapiclient Gmail service
+Implements the calls gmail_service makes (messages.list/get, getProfile,
+history.list and batch requests) over a generated mailbox, sleeping
+`latency` seconds per HTTP round trip the real client would make
+"""
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from typing import Any, Callable, Dict, List, Optional
+import gmail_service
+
+SENDERS = [
+    'Alice Example <alice@example.com>', 'GitHub <noreply@github.com>', 'Bank <alerts@bank.example>',
+    'Newsletter <news@letters.example>', 'Bob <bob@example.org>',
+]
+WORDS = ['invoice', 'meeting', 'update', 'weekly', 'digest', 'reminder', 'order', 'shipped', 'review', 'notes']
+
+
+class FakeGmailError(Exception):
+    """A failed call, with resp.status like googleapiclient's HttpError"""
+    
+    def __init__(self, status: int):
+        super().__init__(f'HTTP {status}')
+        self.resp = type('Response', (), {'status': status})()
+
+
+class _Request:
+    """A prepared call; execute() costs one round trip"""
+    
+    def __init__(self, service: 'FakeGmailService', call: Callable[[], Dict[str, Any]]):
+        self.service = service
+        self.call = call
+    
+    def execute(self) -> Dict[str, Any]:
+        self.service.round_trip()
+        return self.call()
+
+
+class _Batch:
+    """BatchHttpRequest: one round trip for all added calls, results through the callback"""
+    
+    def __init__(self, service: 'FakeGmailService', callback: Callable):
+        self.service = service
+        self.callback = callback
+        self.requests: List[tuple] = []
+    
+    def add(self, request: _Request, request_id: str):
+        self.requests.append((request_id, request))
+    
+    def execute(self):
+        self.service.round_trip()
+        for request_id, request in self.requests:
+            try:
+                self.callback(request_id, request.call(), None)
+            except Exception as e:
+                self.callback(request_id, None, e)
+
+
+class _Resource:
+    """Attribute-style resource tree: service.users().messages().get(...)"""
+    
+    def __init__(self, **methods):
+        self.__dict__.update(methods)
+
+
+class FakeGmailService:
+    """
+    A mailbox of `messages` unread messages spread over the last `days` days
+    add_messages() appends new mail and advances historyId, so incremental
+    syncs have something to replay
+    """
+    
+    def __init__(self, messages: int = 2000, days: int = 20, latency: float = 0.05, random_seed: int = 7):
+        self.latency = latency
+        self.days = days
+        self.round_trips = 0
+        self._rng = random.Random(random_seed)
+        self._lock = threading.Lock()
+        self._messages: Dict[str, Dict[str, Any]] = {}
+        self._order: List[str] = []
+        # (historyId, message id) for each added message
+        self._history: List[tuple] = []
+        self.history_id = 1000
+        self.add_messages(messages, record_history=False)
+    
+    def round_trip(self):
+        with self._lock:
+            self.round_trips += 1
+        if self.latency:
+            time.sleep(self.latency)
+    
+    def add_messages(self, count: int, record_history: bool = True):
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            for _ in range(count):
+                n = len(self._order)
+                message_id = f'fake{n:012x}'
+                received_at = now if record_history else now - timedelta(seconds=self._rng.uniform(0, self.days * 86400))
+                subject = ' '.join(self._rng.sample(WORDS, 3)).capitalize()
+                self._messages[message_id] = {
+                    'id': message_id,
+                    'threadId': f'thread{n // 3:012x}',
+                    'labelIds': ['INBOX', 'UNREAD'],
+                    'snippet': f'{subject} - ' + ' '.join(self._rng.choices(WORDS, k=12)),
+                    'payload': {'headers': [
+                        {'name': 'Subject', 'value': subject},
+                        {'name': 'From', 'value': self._rng.choice(SENDERS)},
+                        {'name': 'To', 'value': 'bench@example.com'},
+                        {'name': 'Date', 'value': format_datetime(received_at)},
+                    ]},
+                }
+                self._order.append(message_id)
+                self.history_id += 1
+                if record_history:
+                    self._history.append((self.history_id, message_id))
+    
+    # googleapiclient surface
+    
+    def users(self):
+        return _Resource(
+            getProfile=lambda userId: _Request(self, lambda: {'historyId': str(self.history_id)}),
+            messages=lambda: _Resource(list=self._list, get=self._get),
+            history=lambda: _Resource(list=self._history_list),
+        )
+    
+    def new_batch_http_request(self, callback: Callable) -> _Batch:
+        return _Batch(self, callback)
+    
+    def _list(self, userId: str, q: str = '', maxResults: int = 100, pageToken: Optional[str] = None) -> _Request:
+        def call():
+            offset = int(pageToken or 0)
+            # Newest first, like Gmail
+            ids = self._order[::-1][offset:offset + maxResults]
+            result = {'messages': [{'id': message_id} for message_id in ids]}
+            if offset + maxResults < len(self._order):
+                result['nextPageToken'] = str(offset + maxResults)
+            return result
+        return _Request(self, call)
+    
+    def _get(self, userId: str, id: str, format: str = 'metadata', metadataHeaders=None) -> _Request:
+        def call():
+            if id not in self._messages:
+                raise FakeGmailError(404)
+            return self._messages[id]
+        return _Request(self, call)
+    
+    def _history_list(self, userId: str, startHistoryId: int, historyTypes=None, pageToken: Optional[str] = None) -> _Request:
+        def call():
+            records = [
+                {'id': str(history_id), 'messagesAdded': [{'message': {
+                    'id': message_id, 'labelIds': self._messages[message_id]['labelIds']
+                }}]}
+                for history_id, message_id in self._history
+                if history_id > int(startHistoryId)
+            ]
+            return {'history': records, 'historyId': str(self.history_id)}
+        return _Request(self, call)
+
+
+class _Credentials:
+    valid = True
+    expired = False
+
+
+def install(service: FakeGmailService) -> Callable[[], None]:
+    """
+    Route gmail_service at the fake (authenticated, no Google libraries on
+    the request path); returns a function that restores the real client
+    """
+    originals = (gmail_service.get_gmail_service, gmail_service.get_credentials)
+    gmail_service.get_gmail_service = lambda: service
+    gmail_service.get_credentials = lambda: _Credentials()
+    
+    def restore():
+        gmail_service.get_gmail_service, gmail_service.get_credentials = originals
+    
+    return restore
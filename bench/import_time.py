@@ -0,0 +1,71 @@
+"""
+Check the app's import time against a budget
+    python -m bench.import_time [--budget-ms 600] [--module asgi]
+Imports the module in a fresh interpreter under -X importtime and fails if
+the total is over budget or if a module that should load lazily (the Google
+client libraries) was imported. Nothing may connect to the database at
+import, so this runs without one
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded on first Gmail use (see gmail_service)
+LAZY_MODULES = ('googleapiclient', 'google_auth_oauthlib', 'google_auth_httplib2', 'httplib2', 'google.oauth2')
+
+LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def measure(module: str) -> List[Tuple[str, int, int, int]]:
+    """(module, self us, cumulative us, depth) for each import, in -X importtime order"""
+    env = {**os.environ, 'DATABASE_URL': os.environ.get('DATABASE_URL', 'postgresql://localhost:1/import_time_check')}
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=REPO_DIR, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise SystemExit(f'import {module} failed:\n{result.stderr[-2000:]}')
+    imports = []
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            imports.append((match.group(4), int(match.group(1)), int(match.group(2)), len(match.group(3)) // 2))
+    return imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check app import time against a budget')
+    parser.add_argument('--module', default='app')
+    parser.add_argument('--budget-ms', type=float, default=float(os.environ.get('IMPORT_BUDGET_MS', 600)))
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+    
+    imports = measure(args.module)
+    total_ms = sum(self_us for _, self_us, _, _ in imports) / 1000
+    top_level: Dict[str, int] = {}
+    for name, _, cumulative_us, depth in imports:
+        if depth == 0:
+            top_level[name] = cumulative_us
+    
+    print(f'import {args.module}: {total_ms:.1f}ms (budget {args.budget_ms:.0f}ms)')
+    for name, cumulative_us in sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f'    {cumulative_us / 1000:8.1f}ms  {name}')
+    
+    failures = []
+    if total_ms > args.budget_ms:
+        failures.append(f'over budget by {total_ms - args.budget_ms:.1f}ms')
+    eager = sorted({name for name, _, _, _ in imports if name.startswith(LAZY_MODULES)})
+    if eager:
+        failures.append(f"imported eagerly: {', '.join(eager[:10])}")
+    if failures:
+        raise SystemExit('FAIL: ' + '; '.join(failures))
+    print('OK')
+
+
+if __name__ == '__main__':
+    main()
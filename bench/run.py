@@ -0,0 +1,389 @@
+"""
+Drive every app endpoint and sync_gmail_messages, and record the numbers
+    python -m bench.run --database-url postgresql://localhost/daily_discover_bench
+By default the app runs in-process (Flask test client, one per thread) with
+Gmail swapped for bench.fake_gmail; with --base-url a running server is
+driven over HTTP instead. Each endpoint runs --requests requests at every
+--concurrency level and reports throughput and p50/p95/p99 latency.
+/oauth2callback is left out: it needs a real authorization code from Google
+"""
+import argparse
+import http.client
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import urlsplit
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class InProcessClient:
+    """The Flask app through its test client"""
+    
+    def __init__(self, flask_app):
+        self.client = flask_app.test_client()
+    
+    def request(self, method: str, path: str, body: Any = None, headers: Optional[Dict[str, str]] = None,
+                stream: bool = False) -> Dict[str, Any]:
+        response = self.client.open(path, method=method, json=body, headers=headers, buffered=not stream)
+        try:
+            if stream:
+                # Time to the first event, not the life of the stream
+                next(response.response, None)
+                return {'status': response.status_code, 'headers': response.headers, 'body': None}
+            return {'status': response.status_code, 'headers': response.headers, 'body': response.get_data()}
+        finally:
+            response.close()
+
+
+class HttpClient:
+    """A running server over one keep-alive connection"""
+    
+    def __init__(self, base_url: str):
+        parts = urlsplit(base_url)
+        connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.connect = lambda: connection_class(parts.netloc, timeout=30)
+        self.conn = self.connect()
+    
+    def request(self, method: str, path: str, body: Any = None, headers: Optional[Dict[str, str]] = None,
+                stream: bool = False) -> Dict[str, Any]:
+        headers = dict(headers or {})
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        try:
+            self.conn.request(method, path, payload, headers)
+            response = self.conn.getresponse()
+        except (http.client.HTTPException, OSError):
+            self.conn.close()
+            self.conn = self.connect()
+            self.conn.request(method, path, payload, headers)
+            response = self.conn.getresponse()
+        if stream:
+            response.readline()
+            self.conn.close()
+            self.conn = self.connect()
+            return {'status': response.status, 'headers': response.headers, 'body': None}
+        return {'status': response.status, 'headers': response.headers, 'body': response.read()}
+
+
+class Endpoint:
+    """
+    One benchmarked request. path and body may be callables of (context, n)
+    for requests that need fresh ids; prepare runs untimed before each request
+    """
+    
+    def __init__(
+        self,
+        name: str,
+        method: str,
+        path,
+        body=None,
+        headers: Optional[Callable[[Dict[str, Any]], Dict[str, str]]] = None,
+        expect: int = 200,
+        stream: bool = False,
+        prepare: Optional[Callable[[Any, Dict[str, Any], int], None]] = None
+    ):
+        self.name = name
+        self.method = method
+        self.path = path
+        self.body = body
+        self.headers = headers
+        self.expect = expect
+        self.stream = stream
+        self.prepare = prepare
+    
+    def send(self, client, context: Dict[str, Any], n: int) -> Dict[str, Any]:
+        path = self.path(context, n) if callable(self.path) else self.path
+        body = self.body(context, n) if callable(self.body) else self.body
+        headers = self.headers(context) if self.headers else None
+        return client.request(self.method, path, body, headers, self.stream)
+
+
+GROCERIES = ['milk', 'eggs', 'bread', 'coffee', 'bananas', 'spinach', 'rice', 'cheese', 'lemons', 'oats']
+
+def _add_groceries(client, context, n):
+    client.request('POST', '/api/groceries', [f'{name} {n}' for name in GROCERIES[:5]])
+
+ENDPOINTS = [
+    Endpoint('index', 'GET', '/'),
+    Endpoint('dashboard_page', 'GET', '/dashboard'),
+    Endpoint('health', 'GET', '/api/health'),
+    Endpoint('metrics', 'GET', '/api/metrics'),
+    Endpoint('cache_stats', 'GET', '/api/cache/stats'),
+    Endpoint('dashboard_snapshot', 'GET', '/api/dashboard'),
+    Endpoint('dashboard_revalidate', 'GET', '/api/dashboard',
+             headers=lambda context: {'If-None-Match': context['etag']}, expect=304),
+    Endpoint('events_first_event', 'GET', '/api/events', stream=True),
+    Endpoint('groceries_list', 'GET', '/api/groceries'),
+    Endpoint('groceries_add', 'POST', '/api/groceries',
+             body=lambda context, n: {'item_name': f'{GROCERIES[n % len(GROCERIES)]} {n}', 'quantity': 1}, expect=201),
+    Endpoint('groceries_add_many', 'POST', '/api/groceries',
+             body=lambda context, n: {'items': [f'{name} {n}' for name in GROCERIES]}, expect=201),
+    Endpoint('groceries_checkout', 'POST', '/api/groceries/checkout', body={}, expect=201, prepare=_add_groceries),
+    Endpoint('grocery_suggestions', 'GET', '/api/groceries/suggestions?within_days=7'),
+    Endpoint('todos_list', 'GET', '/api/todos'),
+    Endpoint('todos_add', 'POST', '/api/todos', body=lambda context, n: {'text': f'Bench todo {n}'}, expect=201),
+    Endpoint('todos_add_many', 'POST', '/api/todos',
+             body=lambda context, n: [f'Bench todo {n}.{i}' for i in range(10)], expect=201),
+    Endpoint('todo_complete', 'POST', lambda context, n: f"/api/todos/{context['todo_ids'][n]}/complete"),
+    Endpoint('activity_rollups', 'GET', '/api/activity/rollups?granularity=day'),
+    Endpoint('voice_grocery', 'POST', '/api/voice-input', body={'type': 'grocery', 'item': 'milk', 'quantity': 1}),
+    Endpoint('voice_todos', 'POST', '/api/voice-input',
+             body=lambda context, n: {'type': 'todos', 'items': [f'Voice todo {n}.{i}' for i in range(3)]}),
+    Endpoint('gmail_status', 'GET', '/api/gmail/status'),
+    Endpoint('gmail_auth_url', 'GET', '/api/gmail/auth'),
+    Endpoint('gmail_sync_enqueue', 'POST', '/api/gmail/sync', body={'days_back': 20}, expect=202),
+    Endpoint('job_status', 'GET', lambda context, n: f"/api/jobs/{context['job_id']}"),
+    Endpoint('emails_unread', 'GET', '/api/emails'),
+    Endpoint('emails_all', 'GET', '/api/emails?unread_only=false&days_back=365&limit=200'),
+    Endpoint('emails_search', 'GET', '/api/emails/search?q=invoice+meeting'),
+    Endpoint('emails_search_label', 'GET', '/api/emails/search?q=invoice&label=IMPORTANT'),
+]
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+def summarize(latencies: List[float], wall: float, errors: int) -> Dict[str, Any]:
+    latencies = sorted(latencies)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / wall, 2) if wall else None,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3) if latencies else 0.0,
+    }
+
+
+def expect_status(response: Dict[str, Any], status: int, what: str) -> Dict[str, Any]:
+    """The response, or a RuntimeError if it doesn't have the status setup relies on"""
+    if response['status'] != status:
+        raise RuntimeError(f"{what}: expected {status}, got {response['status']}: {str(response.get('body'))[:200]}")
+    return response
+
+
+def build_context(client, requests: int) -> Dict[str, Any]:
+    """Ids and validators the stateful endpoints need, made through the API"""
+    context = {}
+    created = expect_status(
+        client.request('POST', '/api/todos', [f'Bench completable {i}' for i in range(requests)]), 201, 'Creating todos'
+    )
+    context['todo_ids'] = [todo['id'] for todo in json.loads(created['body'])['data']]
+    job = expect_status(client.request('POST', '/api/gmail/sync', {'days_back': 20}), 202, 'Queueing a Gmail sync')
+    context['job_id'] = json.loads(job['body'])['job_id']
+    # Last, so none of the writes above make it stale
+    snapshot = expect_status(client.request('GET', '/api/dashboard'), 200, 'Reading the dashboard ETag')
+    context['etag'] = snapshot['headers'].get('ETag', '').strip('"')
+    return context
+
+
+def run_endpoint(endpoint: Endpoint, make_client, context: Dict[str, Any], requests: int, concurrency: int,
+                 warmup: int) -> Dict[str, Any]:
+    local = threading.local()
+    counter = iter(range(requests))
+    counter_lock = threading.Lock()
+    latencies: List[float] = []
+    errors = 0
+    results_lock = threading.Lock()
+    
+    def client():
+        if not hasattr(local, 'client'):
+            local.client = make_client()
+        return local.client
+    
+    def worker():
+        nonlocal errors
+        while True:
+            with counter_lock:
+                n = next(counter, None)
+            if n is None:
+                return
+            if endpoint.prepare:
+                endpoint.prepare(client(), context, n)
+            start = time.perf_counter()
+            try:
+                ok = endpoint.send(client(), context, n)['status'] == endpoint.expect
+            except Exception:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with results_lock:
+                latencies.append(elapsed)
+                if not ok:
+                    errors += 1
+    
+    # Warm connections, caches and prepared statements outside the timing
+    # (numbered after the timed requests, so they use ids of their own). A
+    # warmup request that fails means the context is broken, and the timed
+    # run would only measure errors
+    warm_client = make_client()
+    for n in range(requests, requests + warmup):
+        if endpoint.prepare:
+            endpoint.prepare(warm_client, context, n)
+        expect_status(endpoint.send(warm_client, context, n), endpoint.expect, f'{endpoint.name} warmup')
+    
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    return summarize(latencies, time.perf_counter() - start, errors)
+
+
+def run_sync_benchmark(messages: int, new_messages: int, latency: float) -> List[Dict[str, Any]]:
+    """Full sync of a fake mailbox, then an incremental sync after new mail arrives"""
+    from bench.fake_gmail import FakeGmailService, install
+    from bench.seed import USER_ID
+    import gmail_service
+    from database import get_db_cursor
+    
+    service = FakeGmailService(messages=messages, latency=latency)
+    restore = install(service)
+    results = []
+    try:
+        with get_db_cursor() as cursor:
+            cursor.execute("DELETE FROM gmail_sync_state WHERE user_id = %s", (USER_ID,))
+            cursor.execute("DELETE FROM email_cache WHERE gmail_id LIKE 'fake%%'")
+        
+        for mode, prepare in (('full', None), ('incremental', lambda: service.add_messages(new_messages))):
+            if prepare:
+                prepare()
+            round_trips = service.round_trips
+            start = time.perf_counter()
+            result = gmail_service.sync_gmail_messages(USER_ID, days_back=20, full=(mode == 'full'))
+            elapsed = time.perf_counter() - start
+            results.append({
+                'mode': mode,
+                'success': result.get('success', False),
+                'synced': result.get('synced', 0),
+                'seconds': round(elapsed, 3),
+                'messages_per_second': round(result.get('synced', 0) / elapsed, 1) if elapsed else None,
+                'round_trips': service.round_trips - round_trips,
+                'error': result.get('error'),
+            })
+    finally:
+        restore()
+    return results
+
+
+def git_revision() -> Dict[str, Any]:
+    def git(*args):
+        try:
+            return subprocess.run(['git', *args], cwd=REPO_DIR, capture_output=True, text=True, timeout=10).stdout.strip()
+        except Exception:
+            return ''
+    return {'commit': git('rev-parse', 'HEAD'), 'dirty': bool(git('status', '--porcelain', '--untracked-files=no'))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Daily Discover API and Gmail sync')
+    parser.add_argument('--database-url', default=os.environ.get('BENCH_DATABASE_URL'))
+    parser.add_argument('--base-url', help='Drive a running server instead of the in-process app')
+    parser.add_argument('--seed', action='store_true', help='Reset and seed the database first (bench.seed volumes)')
+    parser.add_argument('--concurrency', default='1,4,16', help='Comma-separated concurrency levels')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint per concurrency level')
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--endpoints', help='Comma-separated endpoint names (default: all)')
+    parser.add_argument('--gmail-latency-ms', type=float, default=50, help='Fake Gmail latency per round trip')
+    parser.add_argument('--sync-messages', type=int, default=2000, help='Fake mailbox size for the sync benchmark (0 to skip)')
+    parser.add_argument('--sync-new-messages', type=int, default=200)
+    parser.add_argument('--label', default='', help='Free-form note stored with the results')
+    parser.add_argument('--out', help='Results file (default: bench/results/<time>-<commit>.json)')
+    args = parser.parse_args()
+    
+    if not args.database_url:
+        parser.error('--database-url or BENCH_DATABASE_URL is required')
+    concurrency_levels = [int(level) for level in args.concurrency.split(',')]
+    endpoints = ENDPOINTS
+    if args.endpoints:
+        wanted = set(args.endpoints.split(','))
+        endpoints = [endpoint for endpoint in ENDPOINTS if endpoint.name in wanted]
+    
+    if args.seed:
+        from bench.seed import seed
+        print('Seeding:', seed(args.database_url))
+    
+    # The app reads its configuration at import
+    os.environ['DATABASE_URL'] = args.database_url
+    sys.path.insert(0, REPO_DIR)
+    from bench.fake_gmail import FakeGmailService, install
+    import database
+    
+    restore_gmail = None
+    if args.base_url:
+        make_client = lambda: HttpClient(args.base_url)
+        database.init_db_pool(args.database_url)
+    else:
+        restore_gmail = install(FakeGmailService(latency=args.gmail_latency_ms / 1000))
+        from app import create_app
+        flask_app = create_app()
+        make_client = lambda: InProcessClient(flask_app)
+    
+    # Enough fresh todo ids for every todo_complete request
+    context = build_context(make_client(), (args.requests + args.warmup) * len(concurrency_levels))
+    
+    results = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'git': git_revision(),
+            'label': args.label,
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'target': args.base_url or 'in-process',
+            'requests': args.requests,
+            'concurrency': concurrency_levels,
+            'gmail_latency_ms': args.gmail_latency_ms,
+        },
+        'endpoints': {},
+        'sync': [],
+    }
+    
+    offset = 0
+    for endpoint in endpoints:
+        results['endpoints'][endpoint.name] = {}
+        for concurrency in concurrency_levels:
+            # Each level gets its own slice of the todo ids
+            level_context = {**context, 'todo_ids': context['todo_ids'][offset:]}
+            summary = run_endpoint(endpoint, make_client, level_context, args.requests, concurrency, args.warmup)
+            results['endpoints'][endpoint.name][str(concurrency)] = summary
+            print(f"{endpoint.name:24} c={concurrency:<3} {summary['throughput_rps']:>9} req/s  "
+                  f"p50 {summary['p50_ms']:>8}ms  p95 {summary['p95_ms']:>8}ms  p99 {summary['p99_ms']:>8}ms"
+                  f"{'  errors ' + str(summary['errors']) if summary['errors'] else ''}")
+            if endpoint.name == 'todo_complete':
+                offset += args.requests + args.warmup
+    
+    if restore_gmail:
+        restore_gmail()
+    if args.sync_messages:
+        results['sync'] = run_sync_benchmark(args.sync_messages, args.sync_new_messages, args.gmail_latency_ms / 1000)
+        for sync in results['sync']:
+            print(f"sync_gmail_messages {sync['mode']:12} {sync['synced']} messages in {sync['seconds']}s "
+                  f"({sync['messages_per_second']}/s, {sync['round_trips']} round trips)")
+    
+    out = args.out
+    if not out:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        out = os.path.join(RESULTS_DIR, f"{stamp}-{results['meta']['git']['commit'][:8] or 'nogit'}.json")
+    with open(out, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'Results written to {out}')
+
+
+if __name__ == '__main__':
+    main()
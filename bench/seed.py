@@ -0,0 +1,206 @@
+"""
+Seed a scratch database with realistic volumes for benchmarking
+    python -m bench.seed --database-url postgresql://localhost/daily_discover_bench
+The database is reset to schema.sql first, so never point this at real data.
+Rows are generated from a fixed random seed, so every run seeds the same data
+"""
+import argparse
+import os
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict
+import psycopg
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'schema.sql')
+
+# app.DEFAULT_USER_ID; every seeded row belongs to this user
+USER_ID = '00000000-0000-0000-0000-000000000001'
+
+DEFAULT_VOLUMES = {
+    'todos': 20000,
+    'groceries': 20000,
+    'emails': 20000,
+    'activity': 100000,
+}
+
+# Days of history the seeded rows are spread over
+HISTORY_DAYS = 120
+
+GROCERY_NAMES = [
+    'milk', 'eggs', 'bread', 'butter', 'coffee', 'bananas', 'apples', 'spinach',
+    'chicken', 'rice', 'pasta', 'tomatoes', 'onions', 'garlic', 'cheese', 'yogurt',
+    'oats', 'olive oil', 'lemons', 'avocados', 'carrots', 'potatoes', 'tea', 'flour',
+]
+
+TODO_VERBS = ['Call', 'Email', 'Fix', 'Book', 'Pay', 'Clean', 'Order', 'Review', 'Plan', 'Return']
+TODO_OBJECTS = ['dentist', 'landlord', 'bike', 'flights', 'electric bill', 'garage', 'printer ink', 'PR', 'trip', 'library books']
+
+SENDERS = [
+    'Alice Example <alice@example.com>', 'GitHub <noreply@github.com>', 'Bank <alerts@bank.example>',
+    'Newsletter <news@letters.example>', 'Bob <bob@example.org>', 'Calendar <calendar@example.com>',
+]
+SUBJECT_WORDS = ['invoice', 'meeting', 'update', 'weekly', 'digest', 'reminder', 'order', 'shipped', 'review', 'notes']
+LABELS = ['INBOX', 'CATEGORY_UPDATES', 'CATEGORY_PROMOTIONS', 'IMPORTANT', 'STARRED']
+
+ACTIONS = [
+    ('grocery_added', 'grocery'), ('todo_added', 'todo'), ('todo_completed', 'todo'),
+    ('groceries_checked_out', 'shopping_event'), ('gmail_synced', 'email'), ('dashboard_viewed', None),
+]
+
+
+def reset_schema(conn: psycopg.Connection):
+    """Drop everything in the public schema and load schema.sql"""
+    with open(SCHEMA_PATH) as f:
+        schema = f.read()
+    conn.execute('DROP SCHEMA public CASCADE')
+    conn.execute('CREATE SCHEMA public')
+    conn.execute(schema)
+    conn.execute(
+        "INSERT INTO users (id, username, email, password_hash) VALUES (%s, 'bench', 'bench@example.com', 'x')",
+        (USER_ID,)
+    )
+
+def create_past_partitions(conn: psycopg.Connection, since: datetime):
+    """Monthly activity_log partitions back to `since` (schema.sql only creates current and future ones)"""
+    month = since.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    while month < datetime.now(timezone.utc):
+        next_month = (month + timedelta(days=32)).replace(day=1)
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS activity_log_{month:%Y_%m} PARTITION OF activity_log "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{next_month:%Y-%m-%d}')"
+        )
+        month = next_month
+
+
+def seed(database_url: str, volumes: Dict[str, int] = None, random_seed: int = 42) -> Dict[str, int]:
+    """Reset the database and fill it; returns the row counts written"""
+    volumes = {**DEFAULT_VOLUMES, **(volumes or {})}
+    rng = random.Random(random_seed)
+    now = datetime.now(timezone.utc)
+    start = now - timedelta(days=HISTORY_DAYS)
+    
+    def some_time(after: datetime = start) -> datetime:
+        return after + timedelta(seconds=rng.uniform(0, (now - after).total_seconds()))
+    
+    def some_uuid() -> uuid.UUID:
+        return uuid.UUID(int=rng.getrandbits(128), version=4)
+    
+    counts = {}
+    with psycopg.connect(database_url, autocommit=True) as conn:
+        reset_schema(conn)
+        create_past_partitions(conn, start)
+        
+        with conn.transaction(), conn.cursor() as cursor:
+            # Mostly completed, like a list that has been in use for months
+            with cursor.copy(
+                "COPY todos (id, user_id, text, completed, priority, created_at, completed_at) FROM STDIN"
+            ) as copy:
+                for _ in range(volumes['todos']):
+                    created_at = some_time()
+                    completed = rng.random() < 0.9
+                    copy.write_row((
+                        some_uuid(), USER_ID,
+                        f'{rng.choice(TODO_VERBS)} {rng.choice(TODO_OBJECTS)} #{rng.randrange(1000)}',
+                        completed, rng.choice((0, 0, 0, 1, 2)), created_at,
+                        some_time(created_at) if completed else None
+                    ))
+            counts['todos'] = volumes['todos']
+            
+            # Archived groceries in weekly-ish trips, plus a short active list
+            trips = max(1, volumes['groceries'] // 15)
+            trip_times = sorted(some_time() for _ in range(trips))
+            trip_ids = [some_uuid() for _ in trip_times]
+            with cursor.copy("COPY shopping_events (id, user_id, completed_at) FROM STDIN") as copy:
+                for trip_id, completed_at in zip(trip_ids, trip_times):
+                    copy.write_row((trip_id, USER_ID, completed_at))
+            
+            with cursor.copy(
+                "COPY grocery_items (id, user_id, item_name, quantity, is_active, shopping_event_id, created_at, archived_at) "
+                "FROM STDIN"
+            ) as copy:
+                active = min(40, volumes['groceries'])
+                for i in range(volumes['groceries']):
+                    name = rng.choice(GROCERY_NAMES)
+                    if i < active:
+                        copy.write_row((some_uuid(), USER_ID, name, rng.randint(1, 3), True, None, some_time(now - timedelta(days=7)), None))
+                    else:
+                        trip = rng.randrange(trips)
+                        bought_at = trip_times[trip]
+                        copy.write_row((some_uuid(), USER_ID, name, rng.randint(1, 3), False, trip_ids[trip],
+                                        bought_at - timedelta(days=rng.uniform(0, 5)), bought_at))
+            counts['groceries'] = volumes['groceries']
+            counts['shopping_events'] = trips
+            
+            # Fold the trips into grocery_purchase_stats as checkouts would have
+            cursor.execute(
+                """
+                INSERT INTO grocery_purchase_stats (
+                    user_id, item_key, item_name, purchase_count, interval_seconds_total,
+                    first_bought_at, last_bought_at, next_due_at
+                )
+                SELECT user_id, item_key, min(item_name), count(*),
+                       EXTRACT(EPOCH FROM max(bought_at) - min(bought_at)),
+                       min(bought_at), max(bought_at),
+                       CASE WHEN count(*) > 1
+                            THEN max(bought_at) + (max(bought_at) - min(bought_at)) / (count(*) - 1)
+                       END
+                FROM (
+                    SELECT DISTINCT g.user_id, lower(btrim(g.item_name)) AS item_key, g.item_name,
+                           e.completed_at AS bought_at
+                    FROM grocery_items g JOIN shopping_events e ON e.id = g.shopping_event_id
+                ) trips
+                GROUP BY user_id, item_key
+                """
+            )
+            
+            with cursor.copy(
+                "COPY email_cache (id, user_id, gmail_id, thread_id, subject, sender, recipient, snippet, "
+                "is_unread, received_at, labels) FROM STDIN"
+            ) as copy:
+                for i in range(volumes['emails']):
+                    subject = ' '.join(rng.sample(SUBJECT_WORDS, 3)).capitalize()
+                    labels = ['INBOX'] + rng.sample(LABELS[1:], rng.randint(0, 2))
+                    unread = rng.random() < 0.3
+                    if unread:
+                        labels.append('UNREAD')
+                    copy.write_row((
+                        some_uuid(), USER_ID, f'seed{i:012x}', f'thread{i // 3:012x}', subject,
+                        rng.choice(SENDERS), 'bench@example.com',
+                        f'{subject} - ' + ' '.join(rng.choices(SUBJECT_WORDS, k=12)),
+                        unread, some_time(), labels
+                    ))
+            counts['emails'] = volumes['emails']
+            
+            with cursor.copy(
+                "COPY activity_log (id, user_id, action, entity_type, entity_id, ip_address, user_agent, created_at) "
+                "FROM STDIN"
+            ) as copy:
+                for _ in range(volumes['activity']):
+                    action, entity_type = rng.choice(ACTIONS)
+                    copy.write_row((
+                        some_uuid(), USER_ID, action, entity_type,
+                        some_uuid() if entity_type else None,
+                        '192.168.1.20', 'Shortcuts/1.0', some_time()
+                    ))
+            counts['activity'] = volumes['activity']
+        
+        conn.execute('ANALYZE')
+    
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--database-url', default=os.environ.get('BENCH_DATABASE_URL'), required='BENCH_DATABASE_URL' not in os.environ)
+    parser.add_argument('--random-seed', type=int, default=42)
+    for table, count in DEFAULT_VOLUMES.items():
+        parser.add_argument(f'--{table}', type=int, default=count)
+    args = parser.parse_args()
+    
+    counts = seed(args.database_url, {table: getattr(args, table) for table in DEFAULT_VOLUMES}, args.random_seed)
+    print(', '.join(f'{count} {table}' for table, count in counts.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,390 @@
+"""
+Blog post index for Daily Discover
+The Astro posts under blog/src/content/blog/ are indexed into blog_posts so
+the dashboard can list recent posts and posts by tag without running the
+Astro build or walking the filesystem per request. A reindex stats every
+file but only reads the ones whose mtime changed, only reparses the ones
+whose content hash changed, and applies the result in one transaction
+    python -m blog_service [content_dir]   (one-off reindex)
+"""
+import hashlib
+import json
+import os
+import re
+import sys
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from database import get_db_cursor, fetch_page, fetch_json_page, decode_cursor, clamp_page_size
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Astro's blog collection (blog/src/content.config.ts); BLOG_CONTENT_DIR overrides
+DEFAULT_CONTENT_DIR = os.path.join(BASE_DIR, 'blog', 'src', 'content', 'blog')
+
+POST_EXTENSIONS = ('.md', '.mdx')
+
+# Bump when parsing changes, so the next reindex reparses every post
+INDEX_VERSION = 1
+
+# Characters of body text kept for a generated excerpt
+EXCERPT_LENGTH = 280
+
+# Rows per multi-row upsert statement
+UPSERT_BATCH_SIZE = 500
+
+# Sort key of post pages, in ORDER BY order
+BLOG_PAGE_KEYS = ['published_at', 'id']
+
+# blog_posts columns returned to clients (everything but the index bookkeeping)
+BLOG_POST_COLUMNS = (
+    'id, slug, title, excerpt, file_path, published_at, is_draft, tags, created_at, updated_at'
+)
+
+FRONT_MATTER = re.compile(r'\A---[ \t]*\r?\n(.*?)\r?\n---[ \t]*(?:\r?\n|\Z)', re.S)
+
+
+def content_dir() -> str:
+    return os.environ.get('BLOG_CONTENT_DIR') or DEFAULT_CONTENT_DIR
+
+
+# ============================================================================
+# Parsing
+# ============================================================================
+
+def _scalar(value: str) -> Any:
+    """A YAML flow scalar: quoted string, true/false/null, number or bare string"""
+    value = value.strip()
+    quoted = re.match(r'''^("(?:[^"\\]|\\.)*"|'(?:[^']|'')*')''', value)
+    if quoted and quoted.group(1).startswith('"'):
+        try:
+            return json.loads(quoted.group(1))
+        except ValueError:
+            return quoted.group(1)[1:-1]
+    if quoted:
+        return quoted.group(1)[1:-1].replace("''", "'")
+    value = re.sub(r'\s+#.*$', '', value)
+    lowered = value.lower()
+    if lowered in ('true', 'yes'):
+        return True
+    if lowered in ('false', 'no'):
+        return False
+    if lowered in ('null', '~', ''):
+        return None
+    return value
+
+def _flow_list(value: str) -> List[Any]:
+    """[a, "b, c", 'd'] -> ['a', 'b, c', 'd']"""
+    items = re.findall(r'''\s*("(?:[^"\\]|\\.)*"|'(?:[^']|'')*'|[^,]+)\s*(?:,|$)''', value.strip()[1:-1])
+    return [_scalar(item) for item in items if item.strip()]
+
+def parse_front_matter(text: str) -> Tuple[Dict[str, Any], str]:
+    """
+    (front matter, body) of a post. Covers the YAML posts use: scalars,
+    flow [lists], block "- item" lists and | / > block strings; anything
+    else (nested maps) is skipped
+    """
+    match = FRONT_MATTER.match(text)
+    if not match:
+        return {}, text
+
+    meta: Dict[str, Any] = {}
+    lines = match.group(1).splitlines()
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        i += 1
+        key_match = re.match(r'^([A-Za-z_][\w-]*)\s*:(.*)$', line)
+        if not key_match:
+            continue
+        key, value = key_match.group(1), key_match.group(2).strip()
+        # Indented lines that follow belong to this key
+        block = []
+        while i < len(lines) and (not lines[i].strip() or lines[i][:1] in (' ', '\t', '-')):
+            block.append(lines[i])
+            i += 1
+
+        if value.startswith('['):
+            meta[key] = _flow_list(value)
+        elif value[:1] in ('|', '>'):
+            parts = [part.strip() for part in block]
+            meta[key] = ('\n' if value[0] == '|' else ' ').join(parts).strip()
+        elif value:
+            meta[key] = _scalar(value)
+        elif block and all(part.strip().startswith('-') for part in block if part.strip()):
+            meta[key] = [_scalar(part.strip()[1:]) for part in block if part.strip()]
+    return meta, text[match.end():]
+
+def make_excerpt(body: str, length: int = EXCERPT_LENGTH) -> Optional[str]:
+    """The first paragraph of prose in a Markdown body, as plain text"""
+    body = re.sub(r'```.*?(```|\Z)', '', body, flags=re.S)
+    for paragraph in re.split(r'\n\s*\n', body):
+        paragraph = paragraph.strip()
+        if not paragraph or paragraph.startswith(('#', 'import ', 'export ', '<!--', '|', '>')):
+            continue
+        text = re.sub(r'!\[[^\]]*\]\([^)]*\)', '', paragraph)
+        text = re.sub(r'\[([^\]]*)\]\([^)]*\)', r'\1', text)
+        text = re.sub(r'<[^>]+>', '', text)
+        text = re.sub(r'(\*\*|__|[*_`~])', '', text)
+        text = ' '.join(text.split())
+        if not text:
+            continue
+        if len(text) <= length:
+            return text
+        return text[:length].rsplit(' ', 1)[0].rstrip(',.;:') + '…'
+    return None
+
+def _slugify(segment: str) -> str:
+    return re.sub(r'[^a-z0-9]+', '-', segment.lower()).strip('-')
+
+def post_slug(file_path: str, meta: Dict[str, Any]) -> str:
+    """The post's Astro id: front matter slug, else its path without extension"""
+    if isinstance(meta.get('slug'), str) and meta['slug'].strip():
+        return meta['slug'].strip().strip('/')
+    stem = os.path.splitext(file_path)[0].replace(os.sep, '/')
+    return '/'.join(_slugify(segment) for segment in stem.split('/'))
+
+def _published_at(value: Any) -> Optional[datetime]:
+    """pubDate as Astro's z.coerce.date reads it (a bare date is UTC midnight)"""
+    if not value:
+        return None
+    try:
+        moment = datetime.fromisoformat(str(value).strip().replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return moment if moment.tzinfo else moment.replace(tzinfo=timezone.utc)
+
+def parse_post(file_path: str, raw: bytes) -> Dict[str, Any]:
+    """A blog_posts row (without bookkeeping) from a post file's bytes"""
+    meta, body = parse_front_matter(raw.decode('utf-8', errors='replace'))
+    slug = post_slug(file_path, meta)
+    tags = meta.get('tags') or []
+    if isinstance(tags, str):
+        tags = [tags]
+    description = meta.get('description')
+    return {
+        'slug': slug[:255],
+        'title': str(meta.get('title') or slug)[:500],
+        'excerpt': (description.strip() if isinstance(description, str) and description.strip() else make_excerpt(body)),
+        'file_path': file_path,
+        'published_at': _published_at(meta.get('pubDate') or meta.get('date')),
+        'is_draft': meta.get('draft') is True,
+        'tags': [str(tag) for tag in tags if tag is not None],
+    }
+
+def content_hash(raw: bytes) -> str:
+    return hashlib.sha256(f'v{INDEX_VERSION}:'.encode() + raw).hexdigest()
+
+
+# ============================================================================
+# Indexing
+# ============================================================================
+
+def scan_posts(directory: str) -> Dict[str, Tuple[str, int]]:
+    """{path relative to directory: (absolute path, mtime_ns)} for every post file"""
+    found = {}
+    for root, dirs, files in os.walk(directory):
+        # Astro skips files and directories starting with an underscore
+        dirs[:] = [name for name in dirs if not name.startswith(('_', '.'))]
+        for name in files:
+            if name.startswith(('_', '.')) or not name.endswith(POST_EXTENSIONS):
+                continue
+            path = os.path.join(root, name)
+            try:
+                found[os.path.relpath(path, directory)] = (path, os.stat(path).st_mtime_ns)
+            except FileNotFoundError:
+                continue
+    return found
+
+def _upsert_posts(cursor, user_id: str, posts: List[Dict[str, Any]]) -> int:
+    """
+    Insert or update parsed posts in multi-row statements, keyed on file_path
+    Returns the number of newly inserted rows
+    """
+    inserted = 0
+    for i in range(0, len(posts), UPSERT_BATCH_SIZE):
+        batch = posts[i:i + UPSERT_BATCH_SIZE]
+        values = ', '.join(['(%s, %s, %s, %s, %s, %s, %s, %s::text[], %s, %s)'] * len(batch))
+        params = []
+        for post in batch:
+            params.extend((
+                user_id, post['slug'], post['title'], post['excerpt'], post['file_path'],
+                post['published_at'], post['is_draft'], post['tags'], post['content_hash'], post['file_mtime_ns']
+            ))
+        cursor.execute(
+            f"""
+            INSERT INTO blog_posts
+            (user_id, slug, title, excerpt, file_path, published_at, is_draft, tags, content_hash, file_mtime_ns)
+            VALUES {values}
+            ON CONFLICT (file_path) DO UPDATE SET
+                slug = EXCLUDED.slug,
+                title = EXCLUDED.title,
+                excerpt = EXCLUDED.excerpt,
+                published_at = EXCLUDED.published_at,
+                is_draft = EXCLUDED.is_draft,
+                tags = EXCLUDED.tags,
+                content_hash = EXCLUDED.content_hash,
+                file_mtime_ns = EXCLUDED.file_mtime_ns
+            RETURNING (xmax = 0) AS inserted
+            """,
+            params
+        )
+        inserted += sum(1 for row in cursor.fetchall() if row['inserted'])
+    return inserted
+
+def _touch_posts(cursor, user_id: str, mtimes: Dict[str, int]):
+    """Record new mtimes for posts whose content didn't change"""
+    values = ', '.join(['(%s, %s::bigint)'] * len(mtimes))
+    params = []
+    for file_path, mtime_ns in mtimes.items():
+        params.extend((file_path, mtime_ns))
+    params.append(user_id)
+    cursor.execute(
+        f"""
+        UPDATE blog_posts b
+        SET file_mtime_ns = v.mtime_ns
+        FROM (VALUES {values}) AS v(file_path, mtime_ns)
+        WHERE b.file_path = v.file_path AND b.user_id = %s
+        """,
+        params
+    )
+
+def index_posts(user_id: str, directory: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Bring blog_posts in line with the post files: new and changed posts are
+    upserted and posts whose file is gone are deleted, all in one transaction
+    Each file has at most one row, matched on file_path
+    Files with an unchanged mtime aren't opened; files with a new mtime but
+    the same content hash only have their mtime recorded
+    """
+    directory = directory or content_dir()
+    files = scan_posts(directory)
+
+    with get_db_cursor() as cursor:
+        cursor.execute(
+            "SELECT file_path, slug, content_hash, file_mtime_ns FROM blog_posts WHERE user_id = %s",
+            (user_id,)
+        )
+        stored = {row['file_path']: row for row in cursor.fetchall()}
+
+        changed: List[Dict[str, Any]] = []
+        touched: Dict[str, int] = {}
+        for file_path, (path, mtime_ns) in sorted(files.items()):
+            row = stored.get(file_path)
+            if row and row['file_mtime_ns'] == mtime_ns:
+                continue
+            try:
+                with open(path, 'rb') as f:
+                    raw = f.read()
+            except OSError as e:
+                print(f"Error reading blog post {file_path}: {e}")
+                continue
+            digest = content_hash(raw)
+            if row and row['content_hash'] == digest:
+                touched[file_path] = mtime_ns
+                continue
+            post = parse_post(file_path, raw)
+            post['content_hash'] = digest
+            post['file_mtime_ns'] = mtime_ns
+            changed.append(post)
+
+        # A row belongs to its file. Rows of files that are gone, and of files
+        # whose slug changed, are deleted first; that frees their slugs
+        removed = [file_path for file_path in stored if file_path not in files]
+        reslugged = [
+            post['file_path'] for post in changed
+            if post['file_path'] in stored and stored[post['file_path']]['slug'] != post['slug']
+        ]
+        # A slug stays with the file that already has it; a second file
+        # claiming it is left out (and reported) until one of them changes
+        owners = {
+            row['slug']: file_path for file_path, row in stored.items()
+            if file_path in files and file_path not in reslugged
+        }
+        kept = []
+        for post in changed:
+            owner = owners.setdefault(post['slug'], post['file_path'])
+            if owner != post['file_path']:
+                print(f"Blog post {post['file_path']} has slug {post['slug']}, already used by {owner}; not indexed")
+                continue
+            kept.append(post)
+
+        if removed or reslugged:
+            cursor.execute(
+                "DELETE FROM blog_posts WHERE user_id = %s AND file_path = ANY(%s)",
+                (user_id, removed + reslugged)
+            )
+        reinserted = sum(1 for post in kept if post['file_path'] in reslugged)
+        inserted = _upsert_posts(cursor, user_id, kept) - reinserted
+        if touched:
+            _touch_posts(cursor, user_id, touched)
+
+    return {
+        'success': True,
+        'scanned': len(files),
+        'new': inserted,
+        'updated': len(kept) - inserted,
+        'deleted': len(removed) + len(reslugged) - reinserted,
+        'skipped': len(changed) - len(kept),
+        'unchanged': len(files) - len(changed),
+    }
+
+
+# ============================================================================
+# Reads
+# ============================================================================
+
+def get_post_page(
+    user_id: str,
+    tag: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    as_json: bool = False
+) -> Dict[str, Any]:
+    """
+    Get a page of published posts, newest first, optionally only those
+    tagged `tag`
+    Returns the same page shapes as get_cached_email_page
+    Raises ValueError for a malformed cursor
+    """
+    limit = clamp_page_size(limit, default=10)
+    query, params = post_page_query(user_id, tag, limit, cursor)
+    with get_db_cursor() as db_cursor:
+        return (fetch_json_page if as_json else fetch_page)(db_cursor, query, params, limit, BLOG_PAGE_KEYS)
+
+def post_page_query(
+    user_id: str,
+    tag: Optional[str],
+    limit: int,
+    cursor: Optional[str]
+) -> Tuple[str, List[Any]]:
+    """Keyset page query over published blog_posts (limit + 1 rows) and its params"""
+    conditions = ['user_id = %s', 'is_draft = FALSE', 'published_at IS NOT NULL']
+    params: List[Any] = [user_id]
+    if tag:
+        # Containment, so the GIN index on tags finds the posts
+        conditions.append('tags @> %s::text[]')
+        params.append([tag])
+    if cursor:
+        conditions.append('(published_at, id) < (%s::timestamptz, %s::uuid)')
+        params.extend(decode_cursor(cursor, 2))
+    params.append(limit + 1)
+    return f"""
+        SELECT {BLOG_POST_COLUMNS}, '/blog/' || slug || '/' AS url FROM blog_posts
+        WHERE {' AND '.join(conditions)}
+        ORDER BY published_at DESC, id DESC
+        LIMIT %s
+    """, params
+
+
+if __name__ == '__main__':
+    from dotenv import load_dotenv
+    from database import init_db_pool, close_db_pool
+
+    load_dotenv()
+    init_db_pool(os.environ.get('DATABASE_URL', 'postgresql://matt@localhost:5432/daily_discover'), min_size=1, max_size=1)
+    try:
+        result = index_posts('00000000-0000-0000-0000-000000000001', sys.argv[1] if len(sys.argv) > 1 else None)
+        print(f"{result['scanned']} posts: {result['new']} new, {result['updated']} updated, "
+              f"{result['deleted']} deleted, {result['unchanged']} unchanged")
+    finally:
+        close_db_pool()
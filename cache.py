@@ -0,0 +1,143 @@
+"""
+Per-user read cache for Daily Discover list queries
+Entries are dropped by the write paths in this process and, for writes made by
+any process (the other gunicorn worker, the job worker, psql), by NOTIFYs that
+triggers on the cached tables send on commit. The cache is bypassed whenever
+the listener isn't connected, so a missed notification can't serve stale data
+"""
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+from events import get_change_listener
+
+
+class ReadCache:
+    """In-process cache of per-user query results, grouped by scope ('todos', 'groceries')"""
+    
+    def __init__(self, ttl: float = 300.0):
+        self.ttl = ttl
+        self.connected = False
+        self._entries: Dict[Tuple[str, str], Dict[Hashable, Tuple[float, Any]]] = {}
+        self._generations: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.invalidations = 0
+    
+    def get_or_load(self, scope: str, user_id: str, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """Return the cached result for (scope, user_id, key), loading it on a miss"""
+        found, value, generation = self._lookup(scope, user_id, key)
+        if found:
+            return value
+        value = loader()
+        self._store(scope, user_id, key, value, generation)
+        return value
+    
+    async def get_or_load_async(
+        self,
+        scope: str,
+        user_id: str,
+        key: Hashable,
+        loader: Callable[[], Awaitable[Any]]
+    ) -> Any:
+        """get_or_load for a coroutine loader; shares entries with get_or_load"""
+        found, value, generation = self._lookup(scope, user_id, key)
+        if found:
+            return value
+        value = await loader()
+        self._store(scope, user_id, key, value, generation)
+        return value
+    
+    def _lookup(self, scope: str, user_id: str, key: Hashable) -> Tuple[bool, Any, Optional[int]]:
+        """(found, value, generation to pass to _store after loading)"""
+        if not self.connected:
+            with self._lock:
+                self.bypassed += 1
+            return False, None, None
+        
+        group = (scope, str(user_id))
+        with self._lock:
+            entry = self._entries.get(group, {}).get(key)
+            if entry and entry[0] > time.monotonic():
+                self.hits += 1
+                return True, entry[1], None
+            self.misses += 1
+            return False, None, self._generations.get(group, 0)
+    
+    def _store(self, scope: str, user_id: str, key: Hashable, value: Any, generation: Optional[int]):
+        # Don't store a result that an invalidation raced past while loading
+        if generation is None:
+            return
+        group = (scope, str(user_id))
+        with self._lock:
+            if self.connected and self._generations.get(group, 0) == generation:
+                self._entries.setdefault(group, {})[key] = (time.monotonic() + self.ttl, value)
+    
+    def invalidate(self, scope: str, user_id: str):
+        """Drop every cached result for a user's scope"""
+        group = (scope, str(user_id))
+        with self._lock:
+            self._generations[group] = self._generations.get(group, 0) + 1
+            self._entries.pop(group, None)
+            self.invalidations += 1
+    
+    def clear(self):
+        """Drop everything"""
+        with self._lock:
+            for group in list(self._entries) + list(self._generations):
+                self._generations[group] = self._generations.get(group, 0) + 1
+            self._entries.clear()
+    
+    # Sink interface (see events.ChangeListener)
+    
+    def on_listen(self):
+        # Anything cached before LISTEN took effect may have missed its
+        # notification
+        self.clear()
+        self.connected = True
+    
+    def on_disconnect(self):
+        self.connected = False
+        self.clear()
+    
+    def on_change(self, scope: str, user_id: Optional[str]):
+        if user_id:
+            self.invalidate(scope, user_id)
+        else:
+            self.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        """Counters for confirming reads are served from the cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': self.connected,
+                'hits': self.hits,
+                'misses': self.misses,
+                'bypassed': self.bypassed,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+                'invalidations': self.invalidations,
+                'entries': sum(len(entries) for entries in self._entries.values()),
+            }
+
+
+# Shared cache for this process
+read_cache = ReadCache()
+
+_listener = None
+
+def init_read_cache(database_url: str, ttl: float = 300.0):
+    """Enable the read cache by subscribing it to the change listener"""
+    global _listener
+    read_cache.ttl = ttl
+    if _listener is None:
+        _listener = get_change_listener(database_url)
+        _listener.add_sink(read_cache)
+
+def close_read_cache():
+    """Unsubscribe from the change listener, which disables the cache"""
+    global _listener
+    if _listener:
+        _listener.remove_sink(read_cache)
+        _listener = None
@@ -0,0 +1,543 @@
+"""
+Calendar (ICS feed) integration for Daily Discover
+Feeds are read line by line from a local file or a URL, so a feed is never
+held in memory whole. Only occurrences inside a bounded window around today
+are kept: recurring events are expanded inside it and nowhere else. Each
+occurrence is keyed by external_id and carries a content hash, so a sync
+writes just the events that changed and deletes the ones that went away
+    python -m calendar_service [name=source ...]   (one-off sync)
+"""
+import functools
+import hashlib
+import io
+import json
+import os
+import re
+import sys
+import urllib.request
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from dateutil import tz
+from dateutil.relativedelta import relativedelta
+from dateutil.rrule import rrule, rruleset, rrulestr
+from database import get_db_cursor
+
+# Settings are read when used rather than at import, since the entry points
+# import this module before loading .env:
+#   CALENDAR_FEEDS       feeds to sync, comma-separated name=source, where
+#                        source is a path or a file://, http(s):// or
+#                        webcal:// URL; the name is stored as calendar_source
+#   CALENDAR_TIMEZONE    zone for floating and all-day times and for "today"
+#                        (the system zone if unset)
+#   CALENDAR_DAYS_BACK   days before today that events are kept for
+#   CALENDAR_DAYS_AHEAD  days after today that events are kept for
+
+# Seconds to wait on a feed URL
+FETCH_TIMEOUT = float(os.environ.get('CALENDAR_FETCH_TIMEOUT', 30))
+
+# Occurrences kept per recurring event at most
+MAX_OCCURRENCES = 1000
+
+# Rule iterations walked per recurring event at most. Rules are moved up to
+# the window before they are expanded, so only COUNT rules, which have to be
+# walked from their real DTSTART, come anywhere near this
+MAX_ITERATIONS = 100000
+
+# Fixed-length periods of each FREQ, by which DTSTART can be moved without
+# changing the occurrences after it
+RULE_PERIODS = {
+    'SECONDLY': timedelta(seconds=1),
+    'MINUTELY': timedelta(minutes=1),
+    'HOURLY': timedelta(hours=1),
+    'DAILY': timedelta(days=1),
+    'WEEKLY': timedelta(weeks=1),
+}
+
+# Rows per multi-row upsert statement
+UPSERT_BATCH_SIZE = 500
+
+# Default name for a feed configured without one
+DEFAULT_SOURCE = 'ics'
+
+# calendar_events columns returned to clients (everything but the range column)
+CALENDAR_EVENT_COLUMNS = (
+    'id, external_id, calendar_source, title, description, start_time, end_time, '
+    'location, is_all_day'
+)
+
+DURATION = re.compile(
+    r'^([+-])?P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$'
+)
+
+TEXT_ESCAPES = {'n': '\n', 'N': '\n', ',': ',', ';': ';', '\\': '\\'}
+
+
+def configured_feeds() -> List[Tuple[str, str]]:
+    return parse_feeds(os.environ.get('CALENDAR_FEEDS', ''))
+
+@functools.lru_cache(maxsize=None)
+def _zone(name: Optional[str]):
+    return tz.gettz(name) or tz.tzlocal()
+
+def local_tz():
+    return _zone(os.environ.get('CALENDAR_TIMEZONE') or None)
+
+def days_back() -> int:
+    return int(os.environ.get('CALENDAR_DAYS_BACK', 1))
+
+def days_ahead() -> int:
+    return int(os.environ.get('CALENDAR_DAYS_AHEAD', 14))
+
+def parse_feeds(spec: str) -> List[Tuple[str, str]]:
+    """(name, source) pairs from a CALENDAR_FEEDS value"""
+    feeds = []
+    for entry in spec.split(','):
+        entry = entry.strip()
+        if not entry:
+            continue
+        name, sep, source = entry.partition('=')
+        # A bare source may itself contain '=' (URL query strings)
+        if not sep or '/' in name or ':' in name:
+            name, source = DEFAULT_SOURCE, entry
+        feeds.append((name.strip()[:50], source.strip()))
+    return feeds
+
+
+# ============================================================================
+# Streaming ICS parser
+# ============================================================================
+
+def open_feed(source: str) -> io.TextIOBase:
+    """A text stream over a feed: a local path, file://, http(s):// or webcal://"""
+    if source.startswith('webcal://'):
+        source = 'https://' + source[len('webcal://'):]
+    if '://' in source:
+        request = urllib.request.Request(source, headers={'User-Agent': 'DailyDiscover/1.0'})
+        response = urllib.request.urlopen(request, timeout=FETCH_TIMEOUT)
+        return io.TextIOWrapper(response, encoding='utf-8', errors='replace')
+    return open(source, encoding='utf-8', errors='replace')
+
+def unfold_lines(lines: Iterable[str]) -> Iterator[str]:
+    """Content lines with RFC 5545 folding undone (continuations start with a space or tab)"""
+    current = None
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if line[:1] in (' ', '\t'):
+            if current is not None:
+                current += line[1:]
+            continue
+        if current:
+            yield current
+        current = line
+    if current:
+        yield current
+
+def parse_content_line(line: str) -> Tuple[str, Dict[str, str], str]:
+    """NAME;PARAM=VALUE;...:value -> (NAME, {PARAM: VALUE}, value)"""
+    in_quotes = False
+    for i, char in enumerate(line):
+        if char == '"':
+            in_quotes = not in_quotes
+        elif char == ':' and not in_quotes:
+            head, value = line[:i], line[i + 1:]
+            break
+    else:
+        head, value = line, ''
+
+    name, *param_parts = re.split(r';(?=(?:[^"]*"[^"]*")*[^"]*$)', head)
+    params = {}
+    for part in param_parts:
+        key, _, param_value = part.partition('=')
+        params[key.upper()] = param_value.strip('"')
+    return name.upper(), params, value
+
+def iter_events(lines: Iterable[str]) -> Iterator[Dict[str, List[Tuple[Dict[str, str], str]]]]:
+    """
+    VEVENTs as {PROPERTY: [(params, value), ...]}, one at a time as the feed
+    is read; components nested in an event (VALARM) are skipped
+    """
+    event = None
+    depth = 0
+    for line in unfold_lines(lines):
+        name, params, value = parse_content_line(line)
+        if name == 'BEGIN':
+            if event is not None:
+                depth += 1
+            elif value.upper() == 'VEVENT':
+                event, depth = {}, 0
+        elif name == 'END':
+            if event is None:
+                continue
+            if depth:
+                depth -= 1
+            elif value.upper() == 'VEVENT':
+                yield event
+                event = None
+        elif event is not None and not depth:
+            event.setdefault(name, []).append((params, value))
+
+def _text(event: Dict, name: str) -> Optional[str]:
+    if name not in event:
+        return None
+    value = event[name][0][1]
+    return re.sub(r'\\(.)', lambda m: TEXT_ESCAPES.get(m.group(1), m.group(1)), value).strip() or None
+
+def parse_time(value: str, params: Dict[str, str]) -> Tuple[datetime, bool]:
+    """
+    An ICS DATE or DATE-TIME as an aware datetime, and whether it was a DATE
+    Dates are local midnight; floating times and unknown TZIDs are local
+    """
+    value = value.strip()
+    if params.get('VALUE') == 'DATE' or len(value) == 8:
+        return datetime.strptime(value[:8], '%Y%m%d').replace(tzinfo=local_tz()), True
+    if value.endswith('Z'):
+        return datetime.strptime(value[:-1], '%Y%m%dT%H%M%S').replace(tzinfo=timezone.utc), False
+    zone = None
+    if 'TZID' in params:
+        try:
+            zone = tz.gettz(params['TZID'].lstrip('/'))
+        except ValueError:
+            zone = None
+    return datetime.strptime(value, '%Y%m%dT%H%M%S').replace(tzinfo=zone or local_tz()), False
+
+def parse_duration(value: str) -> timedelta:
+    match = DURATION.match(value.strip())
+    if not match:
+        raise ValueError(f'Invalid duration: {value}')
+    sign, weeks, days, hours, minutes, seconds = match.groups()
+    duration = timedelta(
+        weeks=int(weeks or 0), days=int(days or 0),
+        hours=int(hours or 0), minutes=int(minutes or 0), seconds=int(seconds or 0)
+    )
+    return -duration if sign == '-' else duration
+
+def _time_list(event: Dict, name: str) -> List[datetime]:
+    """All values of a multi-valued DATE/DATE-TIME property (EXDATE, RDATE)"""
+    times = []
+    for params, value in event.get(name, []):
+        if params.get('VALUE') == 'PERIOD':
+            continue
+        for part in value.split(','):
+            if part.strip():
+                times.append(parse_time(part, params)[0])
+    return times
+
+def _normalize_until(rule: str, start: datetime) -> str:
+    """
+    dateutil needs UNTIL in UTC when DTSTART is aware; feeds often send a
+    DATE or floating time instead, meaning the end of that day or a time in
+    the event's own zone
+    """
+    def to_utc(match):
+        value = match.group(1)
+        if value.endswith('Z'):
+            return match.group(0)
+        if len(value) == 8:
+            until = datetime.strptime(value, '%Y%m%d').replace(hour=23, minute=59, second=59, tzinfo=start.tzinfo)
+        else:
+            until = datetime.strptime(value, '%Y%m%dT%H%M%S').replace(tzinfo=start.tzinfo)
+        return 'UNTIL=' + until.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    return re.sub(r'UNTIL=([0-9TZ]+)', to_utc, rule.upper())
+
+def _rule_near(rule: str, start: datetime, after: datetime) -> rrule:
+    """
+    An RRULE with its DTSTART moved forward by whole periods to shortly
+    before `after`, so expanding it does not walk every occurrence since the
+    event began. COUNT rules count from the real DTSTART and are not moved
+    """
+    rule = _normalize_until(rule, start)
+    parts = dict(part.partition('=')[::2] for part in rule.split(';') if part)
+    freq = parts.get('FREQ')
+    interval = int(parts.get('INTERVAL') or 1)
+    if 'COUNT' in parts or after <= start:
+        return rrulestr(rule, dtstart=start)
+
+    # dateutil iterates in wall-clock time, so periods are counted in it too
+    local_after = after.astimezone(start.tzinfo).replace(tzinfo=None)
+    if freq in RULE_PERIODS:
+        period = RULE_PERIODS[freq] * interval
+        periods = (local_after - start.replace(tzinfo=None)) // period - 1
+        moved = start + period * periods
+    elif freq in ('MONTHLY', 'YEARLY'):
+        months = interval * (12 if freq == 'YEARLY' else 1)
+        periods = ((local_after.year - start.year) * 12 + local_after.month - start.month) // months - 1
+        moved = start + relativedelta(months=months * periods)
+        # A rule that names no day falls on DTSTART's day (and month), which
+        # moving DTSTART can clamp (Jan 31 -> Feb 28), so pin them first
+        if not any(key in parts for key in ('BYMONTHDAY', 'BYDAY', 'BYYEARDAY', 'BYWEEKNO')):
+            rule += f';BYMONTHDAY={start.day}'
+            if freq == 'YEARLY' and 'BYMONTH' not in parts:
+                rule += f';BYMONTH={start.month}'
+    else:
+        periods = 0
+    return rrulestr(rule, dtstart=moved if periods > 0 else start)
+
+def _stamp(moment: datetime, all_day: bool) -> str:
+    """Identifies one occurrence of a recurring event (matches RECURRENCE-ID)"""
+    if all_day:
+        return moment.strftime('%Y%m%d')
+    return moment.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+def _external_id(source: str, uid: str, stamp: Optional[str] = None) -> str:
+    external_id = f'{source}:{uid}' + (f'/{stamp}' if stamp else '')
+    if len(external_id) > 255:
+        external_id = f'{source}:' + hashlib.sha256(external_id.encode()).hexdigest()
+    return external_id
+
+def _occurrence(event: Dict, external_id: str, source: str, start: datetime, duration: timedelta, all_day: bool) -> Dict[str, Any]:
+    """A calendar_events row, with the content hash of everything a sync writes"""
+    end = start + duration
+    row = {
+        'external_id': external_id,
+        'calendar_source': source,
+        'title': (_text(event, 'SUMMARY') or '(No title)')[:500],
+        'description': _text(event, 'DESCRIPTION'),
+        'start_time': start,
+        'end_time': end,
+        'location': (_text(event, 'LOCATION') or '')[:500] or None,
+        'is_all_day': all_day,
+    }
+    content = [row['title'], row['description'], start.isoformat(), end.isoformat(), row['location'], all_day]
+    row['content_hash'] = hashlib.sha256(json.dumps(content).encode()).hexdigest()
+    return row
+
+def expand_events(
+    events: Iterable[Dict],
+    source: str,
+    window_start: datetime,
+    window_end: datetime
+) -> List[Dict[str, Any]]:
+    """
+    calendar_events rows for every occurrence overlapping the window
+    Recurring events are expanded only inside it, and RECURRENCE-ID
+    overrides replace (or, when cancelled, remove) the occurrence they name
+    wherever they appear in the feed
+    """
+    occurrences: Dict[str, Dict[str, Any]] = {}
+    overrides: Dict[str, Dict[str, Any]] = {}
+    overridden: Set[str] = set()
+
+    def overlaps(start: datetime, duration: timedelta) -> bool:
+        return start < window_end and (start + duration > window_start or start >= window_start)
+
+    for event in events:
+        uid = _text(event, 'UID')
+        if not uid or 'DTSTART' not in event:
+            continue
+        try:
+            start, all_day = parse_time(event['DTSTART'][0][1], event['DTSTART'][0][0])
+            if 'DTEND' in event:
+                duration = parse_time(event['DTEND'][0][1], event['DTEND'][0][0])[0] - start
+            elif 'DURATION' in event:
+                duration = parse_duration(event['DURATION'][0][1])
+            else:
+                duration = timedelta(days=1) if all_day else timedelta(0)
+            duration = max(duration, timedelta(0))
+            cancelled = (_text(event, 'STATUS') or '').upper() == 'CANCELLED'
+
+            if 'RECURRENCE-ID' in event:
+                original, original_all_day = parse_time(event['RECURRENCE-ID'][0][1], event['RECURRENCE-ID'][0][0])
+                external_id = _external_id(source, uid, _stamp(original, original_all_day))
+                overridden.add(external_id)
+                if not cancelled and overlaps(start, duration):
+                    overrides[external_id] = _occurrence(event, external_id, source, start, duration, all_day)
+                continue
+            if cancelled:
+                continue
+
+            if 'RRULE' not in event and 'RDATE' not in event:
+                if overlaps(start, duration):
+                    external_id = _external_id(source, uid)
+                    occurrences[external_id] = _occurrence(event, external_id, source, start, duration, all_day)
+                continue
+
+            # Occurrences that start before the window but run into it count
+            after = window_start - duration
+            recurrence = rruleset()
+            recurrence.rdate(start)
+            for _, rule in event.get('RRULE', []):
+                recurrence.rrule(_rule_near(rule, start, after))
+            for moment in _time_list(event, 'RDATE'):
+                recurrence.rdate(moment)
+            for moment in _time_list(event, 'EXDATE'):
+                recurrence.exdate(moment)
+            kept = 0
+            for walked, moment in enumerate(recurrence):
+                if moment >= window_end:
+                    break
+                if walked >= MAX_ITERATIONS or kept >= MAX_OCCURRENCES:
+                    print(f"Truncating recurring calendar event {uid} from {source} at {moment.isoformat()}")
+                    break
+                if moment < after or (moment == after and duration):
+                    continue
+                kept += 1
+                external_id = _external_id(source, uid, _stamp(moment, all_day))
+                occurrences[external_id] = _occurrence(event, external_id, source, moment, duration, all_day)
+        except (ValueError, TypeError, OverflowError) as e:
+            print(f"Skipping calendar event {uid} from {source}: {e}")
+
+    for external_id in overridden:
+        occurrences.pop(external_id, None)
+    occurrences.update(overrides)
+    return list(occurrences.values())
+
+
+# ============================================================================
+# Sync
+# ============================================================================
+
+def sync_window(now: Optional[datetime] = None) -> Tuple[datetime, datetime]:
+    """Local midnight CALENDAR_DAYS_BACK days ago to the end of CALENDAR_DAYS_AHEAD days after today"""
+    today = _local_midnight(now)
+    return today - timedelta(days=days_back()), today + timedelta(days=days_ahead() + 1)
+
+def _local_midnight(now: Optional[datetime] = None) -> datetime:
+    now = (now or datetime.now(timezone.utc)).astimezone(local_tz())
+    return now.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def _upsert_events(cursor, user_id: str, rows: List[Dict[str, Any]]) -> int:
+    """
+    Insert or update events in multi-row statements, skipping rows whose
+    content hash already matches
+    Returns the number of newly inserted rows
+    """
+    inserted = 0
+    for i in range(0, len(rows), UPSERT_BATCH_SIZE):
+        batch = rows[i:i + UPSERT_BATCH_SIZE]
+        values = ', '.join(['(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)'] * len(batch))
+        params = []
+        for row in batch:
+            params.extend((
+                user_id, row['external_id'], row['calendar_source'], row['title'], row['description'],
+                row['start_time'], row['end_time'], row['location'], row['is_all_day'], row['content_hash']
+            ))
+        cursor.execute(
+            f"""
+            INSERT INTO calendar_events
+            (user_id, external_id, calendar_source, title, description,
+             start_time, end_time, location, is_all_day, content_hash)
+            VALUES {values}
+            ON CONFLICT (external_id) DO UPDATE SET
+                calendar_source = EXCLUDED.calendar_source,
+                title = EXCLUDED.title,
+                description = EXCLUDED.description,
+                start_time = EXCLUDED.start_time,
+                end_time = EXCLUDED.end_time,
+                location = EXCLUDED.location,
+                is_all_day = EXCLUDED.is_all_day,
+                content_hash = EXCLUDED.content_hash,
+                synced_at = CURRENT_TIMESTAMP
+            WHERE calendar_events.content_hash IS DISTINCT FROM EXCLUDED.content_hash
+            RETURNING (xmax = 0) AS inserted
+            """,
+            params
+        )
+        inserted += sum(1 for row in cursor.fetchall() if row['inserted'])
+    return inserted
+
+def sync_calendar_feed(
+    user_id: str,
+    name: str,
+    source: str,
+    now: Optional[datetime] = None
+) -> Dict[str, Any]:
+    """
+    Read one feed and bring its calendar_events rows in line with it, in one
+    transaction. The feed is parsed before the database is touched, so a
+    feed that fails to load leaves its events as they were
+    """
+    window_start, window_end = sync_window(now)
+    with open_feed(source) as stream:
+        rows = expand_events(iter_events(stream), name, window_start, window_end)
+
+    with get_db_cursor() as cursor:
+        cursor.execute(
+            "SELECT external_id, content_hash FROM calendar_events WHERE user_id = %s AND calendar_source = %s",
+            (user_id, name)
+        )
+        stored = {row['external_id']: row['content_hash'] for row in cursor.fetchall()}
+        changed = [row for row in rows if stored.get(row['external_id']) != row['content_hash']]
+        seen = {row['external_id'] for row in rows}
+        removed = [external_id for external_id in stored if external_id not in seen]
+
+        inserted = _upsert_events(cursor, user_id, changed)
+        if removed:
+            cursor.execute(
+                "DELETE FROM calendar_events WHERE user_id = %s AND calendar_source = %s AND external_id = ANY(%s)",
+                (user_id, name, removed)
+            )
+
+    return {
+        'source': name,
+        'events': len(rows),
+        'new': inserted,
+        'updated': len(changed) - inserted,
+        'deleted': len(removed),
+    }
+
+def sync_calendars(user_id: str, feeds: Optional[List[Tuple[str, str]]] = None, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Sync every configured feed (CALENDAR_FEEDS unless feeds is given)
+    A failing feed is reported and the others still sync
+    """
+    feeds = configured_feeds() if feeds is None else feeds
+    results, errors = [], []
+    for name, source in feeds:
+        try:
+            results.append(sync_calendar_feed(user_id, name, source, now=now))
+        except Exception as e:
+            print(f"Error syncing calendar {name}: {e}")
+            errors.append({'source': name, 'error': str(e)})
+    return {
+        'success': not errors,
+        'feeds': results,
+        'errors': errors,
+        'error': '; '.join(f"{error['source']}: {error['error']}" for error in errors) or None,
+    }
+
+
+# ============================================================================
+# Reads
+# ============================================================================
+
+def get_events_between(user_id: str, start: datetime, end: datetime) -> List[Dict[str, Any]]:
+    """Events overlapping [start, end), in start order; served by the GiST index on during"""
+    with get_db_cursor() as cursor:
+        cursor.execute(
+            f"""
+            SELECT {CALENDAR_EVENT_COLUMNS} FROM calendar_events
+            WHERE during && tstzrange(%s, %s) AND user_id = %s
+            ORDER BY start_time, end_time, id
+            """,
+            (start, end, user_id)
+        )
+        return cursor.fetchall()
+
+def get_today_events(user_id: str, now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """Events overlapping today (local time), including ones already over"""
+    today = _local_midnight(now)
+    return get_events_between(user_id, today, today + timedelta(days=1))
+
+def get_upcoming_events(user_id: str, days: int = 5, now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """Events overlapping the `days` days after today (local time)"""
+    days = max(1, min(days, days_ahead()))
+    tomorrow = _local_midnight(now) + timedelta(days=1)
+    return get_events_between(user_id, tomorrow, tomorrow + timedelta(days=days))
+
+
+if __name__ == '__main__':
+    from dotenv import load_dotenv
+    from database import init_db_pool, close_db_pool
+
+    load_dotenv()
+    init_db_pool(os.environ.get('DATABASE_URL', 'postgresql://matt@localhost:5432/daily_discover'), min_size=1, max_size=1)
+    try:
+        feeds = parse_feeds(','.join(sys.argv[1:])) if len(sys.argv) > 1 else None
+        result = sync_calendars('00000000-0000-0000-0000-000000000001', feeds)
+        for feed in result['feeds']:
+            print(f"{feed['source']}: {feed['events']} events, {feed['new']} new, "
+                  f"{feed['updated']} updated, {feed['deleted']} deleted")
+        if not result['success']:
+            raise SystemExit(result['error'])
+    finally:
+        close_db_pool()
@@ -0,0 +1,72 @@
+"""
+Response compression for Daily Discover
+Content negotiation on Accept-Encoding and gzip/brotli encoders, shared by the
+Flask app, the ASGI routes and the prebuilt dashboard assets (assets.py)
+"""
+import gzip
+import os
+from typing import Dict, Iterable, Optional
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this go out uncompressed (headers would eat the gain)
+MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+
+# Per-response levels: fast enough to run on every API response on a Pi
+GZIP_LEVEL = int(os.environ.get('COMPRESS_GZIP_LEVEL', 5))
+BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 4))
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/html', 'text/css', 'application/javascript', 'text/plain')
+
+
+def available_encodings() -> tuple:
+    """Encodings this process can produce, in order of preference"""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+def choose_encoding(accept_encoding: Optional[str], offered: Iterable[str] = None) -> Optional[str]:
+    """
+    The offered encoding the client accepts with the highest q-value (ties
+    go to the order offered), or None for identity
+    """
+    if not accept_encoding:
+        return None
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.split(','):
+        name, _, params = part.strip().partition(';')
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    best, best_q = None, 0.0
+    for encoding in (offered or available_encodings()):
+        q = accepted.get(encoding, accepted.get('*', 0.0))
+        if q > best_q:
+            best, best_q = encoding, q
+    return best
+
+def compress(body: bytes, encoding: str, static: bool = False) -> bytes:
+    """Encode body; static=True uses the slowest, smallest settings (for build-time assets)"""
+    if encoding == 'br':
+        return brotli.compress(body, quality=11 if static else BROTLI_QUALITY)
+    if encoding == 'gzip':
+        # mtime=0 keeps the output stable for identical input
+        return gzip.compress(body, compresslevel=9 if static else GZIP_LEVEL, mtime=0)
+    raise ValueError(f'Unsupported encoding: {encoding}')
+
+def should_compress(content_type: Optional[str], size: int) -> bool:
+    if size < MIN_SIZE or not content_type:
+        return False
+    return content_type.split(';')[0].strip() in COMPRESSIBLE_TYPES
+
+def weaken_etag(etag: Optional[str]) -> Optional[str]:
+    """An encoded body isn't byte-identical to the one the strong ETag named"""
+    if not etag or etag.startswith('W/'):
+        return etag
+    return f'W/{etag}'
@@ -2,45 +2,230 @@
 Database models and connection management for Daily Discover
 """
 import os
-from datetime import datetime
-from typing import Optional, List, Dict, Any
+import sys
+import atexit
+import base64
+import functools
+import json
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Any, Tuple
 from contextlib import contextmanager
 import psycopg
 from psycopg.rows import dict_row
-from psycopg_pool import ConnectionPool
+from psycopg_pool import ConnectionPool, PoolTimeout
+from cache import read_cache
+from profiling import ProfiledCursor, record_pool_wait
 
 # Database connection pool
 _pool: Optional[ConnectionPool] = None
 
-def init_db_pool(database_url: str, min_size: int = 1, max_size: int = 10):
-    """Initialize the database connection pool"""
-    global _pool
+# The embedded backend module when DATABASE_URL selects one (database_sqlite),
+# else None for PostgreSQL
+_embedded = None
+
+SQLITE_URL_PREFIX = 'sqlite:///'
+
+# Page sizes for keyset-paginated list reads
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+# email_cache columns returned to clients (everything but search_vector)
+EMAIL_CACHE_COLUMNS = (
+    'id, user_id, gmail_id, thread_id, subject, sender, recipient, snippet, '
+    'is_unread, received_at, labels, created_at, synced_at'
+)
+
+# Background activity log writer (None means ActivityLog.log writes inline)
+_log_writer: Optional["ActivityLogWriter"] = None
+
+class PoolMetrics:
+    """Checkout counters for the connection pool, complementing ConnectionPool.get_stats()"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+    
+    def reset(self):
+        with self._lock:
+            self.checkouts = 0
+            self.in_use = 0
+            self.wait_ms_total = 0.0
+            self.wait_ms_max = 0.0
+            self.timeouts = 0
+            self.errors = 0
+    
+    def checked_out(self, wait_ms: float):
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.wait_ms_total += wait_ms
+            self.wait_ms_max = max(self.wait_ms_max, wait_ms)
+    
+    def checked_in(self):
+        with self._lock:
+            self.in_use -= 1
+    
+    def timed_out(self):
+        with self._lock:
+            self.timeouts += 1
+    
+    def failed(self):
+        with self._lock:
+            self.errors += 1
+    
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'in_use': self.in_use,
+                'wait_ms_total': round(self.wait_ms_total, 3),
+                'wait_ms_avg': round(self.wait_ms_total / self.checkouts, 3) if self.checkouts else 0.0,
+                'wait_ms_max': round(self.wait_ms_max, 3),
+                'timeouts': self.timeouts,
+                'connection_errors': self.errors,
+            }
+
+_pool_metrics = PoolMetrics()
+
+def init_db_pool(
+    database_url: str,
+    min_size: Optional[int] = None,
+    max_size: Optional[int] = None,
+    timeout: Optional[float] = None
+):
+    """
+    Initialize the database connection pool
+    Sizes and the checkout timeout default to DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE
+    and DB_POOL_TIMEOUT (1, 10 and 30 seconds); each process gets its own pool.
+    A sqlite:/// URL opens the embedded SQLite backend instead (see
+    database_sqlite), which the models then use
+    """
+    global _pool, _embedded
+    if is_sqlite_url(database_url):
+        import database_sqlite
+        database_sqlite.init_db(sqlite_path(database_url), timeout)
+        _embedded = database_sqlite
+        return
     if _pool is not None:
         try:
             _pool.close()
         except:
             print("wtf")
-    _pool = ConnectionPool(database_url, min_size=min_size, max_size=max_size, open=True)
+    if min_size is None:
+        min_size = int(os.environ.get('DB_POOL_MIN_SIZE', 1))
+    if max_size is None:
+        max_size = int(os.environ.get('DB_POOL_MAX_SIZE', 10))
+    if timeout is None:
+        timeout = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+    _pool_metrics.reset()
+    _pool = ConnectionPool(
+        database_url,
+        min_size=min_size,
+        max_size=max_size,
+        timeout=timeout,
+        kwargs={'cursor_factory': ProfiledCursor},
+        open=True
+    )
+
+def is_sqlite_url(database_url: str) -> bool:
+    """Whether DATABASE_URL selects the embedded SQLite backend"""
+    return database_url.startswith(SQLITE_URL_PREFIX)
+
+def sqlite_path(database_url: str) -> str:
+    """File of a sqlite:/// URL: sqlite:///data/dd.db is relative, sqlite:////var/dd.db absolute"""
+    return database_url[len(SQLITE_URL_PREFIX):]
 
 def get_db_pool() -> ConnectionPool:
     """Get the database connection pool"""
+    if _embedded is not None:
+        raise RuntimeError("This feature needs PostgreSQL; DATABASE_URL selects the SQLite backend.")
     if _pool is None:
         raise RuntimeError("Database pool not initialized. Call init_db_pool() first.")
     return _pool
 
 def close_db_pool():
     """Close the database connection pool"""
-    global _pool
+    global _pool, _embedded
+    close_activity_log_writer()
+    if _embedded is not None:
+        _embedded.close_db()
+        _embedded = None
     if _pool:
         _pool.close()
         _pool = None
 
 @contextmanager
-def get_db_connection():
+def get_db_connection(timeout: Optional[float] = None):
     """Context manager for database connections"""
     pool = get_db_pool()
-    with pool.connection() as conn:
+    checkout = pool.connection(timeout=timeout)
+    
+    start = time.perf_counter()
+    try:
+        conn = checkout.__enter__()
+    except PoolTimeout:
+        _pool_metrics.timed_out()
+        raise
+    except psycopg.OperationalError:
+        _pool_metrics.failed()
+        raise
+    wait_ms = (time.perf_counter() - start) * 1000
+    _pool_metrics.checked_out(wait_ms)
+    record_pool_wait(wait_ms)
+    
+    try:
         yield conn
+    except BaseException:
+        if not checkout.__exit__(*sys.exc_info()):
+            raise
+    else:
+        checkout.__exit__(None, None, None)
+    finally:
+        _pool_metrics.checked_in()
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Checkout wait times, in-use vs idle connections, timeouts and errors for this process"""
+    if _embedded is not None:
+        return _embedded.get_pool_stats()
+    stats = _pool_metrics.snapshot()
+    if _pool is not None:
+        pool_stats = _pool.get_stats()
+        stats.update({
+            'size': pool_stats.get('pool_size', 0),
+            'idle': pool_stats.get('pool_available', 0),
+            'min_size': pool_stats.get('pool_min'),
+            'max_size': pool_stats.get('pool_max'),
+            'requests_waiting': pool_stats.get('requests_waiting', 0),
+            'connections_lost': pool_stats.get('connections_lost', 0),
+            'pool_connection_errors': pool_stats.get('connections_errors', 0),
+        })
+    return stats
+
+def check_db_health(timeout: float = 2.0) -> Dict[str, Any]:
+    """Time a pool checkout plus a trivial query"""
+    if _embedded is not None:
+        return _embedded.check_db_health(timeout)
+    start = time.perf_counter()
+    try:
+        with get_db_connection(timeout=timeout) as conn:
+            checked_out = time.perf_counter()
+            conn.execute("SELECT 1").fetchone()
+        finished = time.perf_counter()
+        return {
+            'status': 'connected',
+            'latency_ms': round((finished - start) * 1000, 3),
+            'checkout_ms': round((checked_out - start) * 1000, 3),
+            'query_ms': round((finished - checked_out) * 1000, 3),
+        }
+    except Exception as e:
+        return {
+            'status': 'error',
+            'latency_ms': round((time.perf_counter() - start) * 1000, 3),
+            'error': str(e),
+        }
 
 @contextmanager
 def get_db_cursor():
@@ -50,31 +235,157 @@ def get_db_cursor():
             yield cursor
 
 
+class Session:
+    """
+    Unit of work: model operations that share one connection and one transaction
+    Model methods take session=... to join it. Statements go out in pipeline
+    mode, so writes whose results aren't read (like ActivityLog.log) are
+    queued and sent along with the next read or the COMMIT
+    """
+    
+    def __init__(self, conn: psycopg.Connection):
+        self.conn = conn
+    
+    def cursor(self) -> psycopg.Cursor:
+        return self.conn.cursor(row_factory=dict_row)
+
+@contextmanager
+def db_session():
+    """Context manager for a unit of work; commits on exit, rolls back on error"""
+    if _embedded is not None:
+        with _embedded.db_session() as session:
+            yield session
+        return
+    with get_db_connection() as conn:
+        with conn.pipeline():
+            with conn.transaction():
+                yield Session(conn)
+
+@contextmanager
+def _session_cursor(session: Optional[Session] = None):
+    """A cursor on the session's connection, or on a pooled connection of its own"""
+    if session is None:
+        with get_db_cursor() as cursor:
+            yield cursor
+    else:
+        with session.cursor() as cursor:
+            yield cursor
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """Encode a row's sort key as an opaque page cursor"""
+    raw = json.dumps(values, default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """Decode a page cursor, raising ValueError if it isn't one of ours"""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError('Invalid cursor')
+    return values
+
+def clamp_page_size(limit: Optional[int], default: int = DEFAULT_PAGE_SIZE) -> int:
+    """Keep a requested page size between 1 and MAX_PAGE_SIZE"""
+    if limit is None:
+        return default
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+def fetch_page(cursor, query: str, params: Any, limit: int, key_columns: List[str]) -> Dict[str, Any]:
+    """
+    Run a keyset page query that selects up to limit + 1 rows
+    Returns the first `limit` rows and, if there were more, the cursor
+    for the next page
+    """
+    cursor.execute(query, params)
+    return _page_result(cursor.fetchall(), limit, key_columns)
+
+def _page_result(rows: List[Dict[str, Any]], limit: int, key_columns: List[str]) -> Dict[str, Any]:
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([rows[-1][column] for column in key_columns])
+    return {'items': rows, 'next_cursor': next_cursor}
+
+def fetch_json_page(cursor, query: str, params: Any, limit: int, key_columns: List[str]) -> Dict[str, Any]:
+    """
+    Like fetch_page, but Postgres renders the page as a JSON array, so rows
+    never become Python objects. The query must order by key_columns, all
+    descending
+    Returns {'items_json': str, 'count': int, 'next_cursor': str or None}
+    """
+    cursor.execute(_json_page_sql(query, key_columns), [*params, limit, limit])
+    return _json_page_result(cursor.fetchone())
+
+def _json_page_sql(query: str, key_columns: List[str]) -> str:
+    """Wrap a page query so it returns one row: the JSON page, count, has_more and the last key"""
+    order = ', '.join(f'{column} DESC' for column in key_columns)
+    reverse = ', '.join(f'{column} ASC' for column in key_columns)
+    return f"""
+        WITH page AS ({query}),
+        kept AS (SELECT * FROM page ORDER BY {order} LIMIT %s)
+        SELECT
+            (SELECT coalesce(json_agg(kept ORDER BY {order}), '[]')::text FROM kept) AS items_json,
+            (SELECT count(*) FROM kept) AS count,
+            (SELECT count(*) FROM page) > %s AS has_more,
+            (SELECT json_build_array({', '.join(key_columns)}) FROM kept ORDER BY {reverse} LIMIT 1) AS last_key
+    """
+
+def _json_page_result(result: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        'items_json': result['items_json'],
+        'count': result['count'],
+        'next_cursor': encode_cursor(result['last_key']) if result['has_more'] else None,
+    }
+
+
+def embedded_backend(model):
+    """
+    Route a model's public methods to the same-named model of the embedded
+    backend when one is selected, so callers never branch on the backend.
+    The methods defined here are the PostgreSQL implementation
+    """
+    for name, member in list(vars(model).items()):
+        if name.startswith('_') or not isinstance(member, staticmethod):
+            continue
+        
+        @functools.wraps(member.__func__)
+        def method(*args, _name=name, _postgres=member.__func__, **kwargs):
+            if _embedded is not None:
+                return getattr(getattr(_embedded, model.__name__), _name)(*args, **kwargs)
+            return _postgres(*args, **kwargs)
+        
+        setattr(model, name, staticmethod(method))
+    return model
+
+
+@embedded_backend
 class User:
     """User model"""
     
+    # SQL shared with the async models in database_async.py
+    CREATE_SQL = """
+        INSERT INTO users (username, email, password_hash)
+        VALUES (%s, %s, %s)
+        RETURNING id, username, email, created_at
+    """
+    GET_BY_ID_SQL = "SELECT id, username, email, created_at, updated_at FROM users WHERE id = %s"
+    GET_BY_EMAIL_SQL = "SELECT * FROM users WHERE email = %s"
+    
     @staticmethod
     def create(username: str, email: str, password_hash: str) -> Dict[str, Any]:
         """Create a new user"""
         with get_db_cursor() as cursor:
-            cursor.execute(
-                """
-                INSERT INTO users (username, email, password_hash)
-                VALUES (%s, %s, %s)
-                RETURNING id, username, email, created_at
-                """,
-                (username, email, password_hash)
-            )
+            cursor.execute(User.CREATE_SQL, (username, email, password_hash))
             return dict(cursor.fetchone())
     
     @staticmethod
     def get_by_id(user_id: str) -> Optional[Dict[str, Any]]:
         """Get user by ID"""
         with get_db_cursor() as cursor:
-            cursor.execute(
-                "SELECT id, username, email, created_at, updated_at FROM users WHERE id = %s",
-                (user_id,)
-            )
+            cursor.execute(User.GET_BY_ID_SQL, (user_id,))
             result = cursor.fetchone()
             return dict(result) if result else None
     
@@ -82,34 +393,74 @@ class User:
     def get_by_email(email: str) -> Optional[Dict[str, Any]]:
         """Get user by email"""
         with get_db_cursor() as cursor:
-            cursor.execute(
-                "SELECT * FROM users WHERE email = %s",
-                (email,)
-            )
+            cursor.execute(User.GET_BY_EMAIL_SQL, (email,))
             result = cursor.fetchone()
             return dict(result) if result else None
 
 
+@embedded_backend
 class Todo:
     """TODO item model"""
     
+    # Sort key of get_page, in ORDER BY order
+    PAGE_KEYS = ['priority', 'created_at', 'id']
+    
+    MARK_COMPLETED_SQL = """
+        UPDATE todos 
+        SET completed = %s, 
+            completed_at = CASE WHEN %s THEN CURRENT_TIMESTAMP ELSE NULL END
+        WHERE id = %s
+        RETURNING user_id
+    """
+    
+    @staticmethod
+    def _insert_sql(count: int) -> str:
+        values = ', '.join(['(%s, %s, %s)'] * count)
+        return f"""
+            INSERT INTO todos (user_id, text, priority)
+            VALUES {values}
+            RETURNING id, user_id, text, completed, priority, created_at
+        """
+    
+    @staticmethod
+    def _insert_params(user_id: str, todos: List[Dict[str, Any]]) -> List[Any]:
+        params = []
+        for todo in todos:
+            params.extend((user_id, todo['text'], todo.get('priority', 0)))
+        return params
+    
     @staticmethod
-    def create(user_id: str, text: str, priority: int = 0) -> Dict[str, Any]:
+    def create(user_id: str, text: str, priority: int = 0, session: Optional[Session] = None) -> Dict[str, Any]:
         """Create a new TODO item"""
-        with get_db_cursor() as cursor:
-            cursor.execute(
-                """
-                INSERT INTO todos (user_id, text, priority)
-                VALUES (%s, %s, %s)
-                RETURNING id, user_id, text, completed, priority, created_at
-                """,
-                (user_id, text, priority)
-            )
+        with _session_cursor(session) as cursor:
+            cursor.execute(Todo._insert_sql(1), (user_id, text, priority), prepare=True)
+            read_cache.invalidate('todos', user_id)
             return dict(cursor.fetchone())
     
+    @staticmethod
+    def create_many(user_id: str, todos: List[Dict[str, Any]], session: Optional[Session] = None) -> List[Dict[str, Any]]:
+        """
+        Create several TODO items in one statement
+        Each entry needs 'text' and may set 'priority'
+        """
+        if not todos:
+            return []
+        
+        with _session_cursor(session) as cursor:
+            cursor.execute(Todo._insert_sql(len(todos)), Todo._insert_params(user_id, todos))
+            read_cache.invalidate('todos', user_id)
+            return cursor.fetchall()
+    
     @staticmethod
     def get_all(user_id: str, include_completed: bool = False) -> List[Dict[str, Any]]:
-        """Get all TODO items for a user"""
+        """Get all TODO items for a user (served from the read cache when enabled)"""
+        return read_cache.get_or_load(
+            'todos', user_id, ('all', include_completed),
+            lambda: Todo._get_all(user_id, include_completed)
+        )
+    
+    @staticmethod
+    def _get_all(user_id: str, include_completed: bool) -> List[Dict[str, Any]]:
         with get_db_cursor() as cursor:
             if include_completed:
                 cursor.execute(
@@ -129,44 +480,200 @@ class Todo:
                     """,
                     (user_id,)
                 )
-            return [dict(row) for row in cursor.fetchall()]
+            return cursor.fetchall()
+    
+    @staticmethod
+    def get_page(
+        user_id: str,
+        include_completed: bool = False,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        as_json: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Get a page of TODO items for a user, in get_all's order
+        Returns {'items': [...], 'next_cursor': str or None}, or with as_json
+        {'items_json': str, 'count': int, 'next_cursor': str or None}
+        Raises ValueError for a malformed cursor
+        """
+        limit = clamp_page_size(limit)
+        after = decode_cursor(cursor, 3) if cursor else None
+        return read_cache.get_or_load(
+            'todos', user_id, ('page', include_completed, limit, cursor, as_json),
+            lambda: Todo._get_page(user_id, include_completed, limit, after, as_json)
+        )
+    
+    @staticmethod
+    def _get_page(
+        user_id: str,
+        include_completed: bool,
+        limit: int,
+        after: Optional[List[Any]],
+        as_json: bool
+    ) -> Dict[str, Any]:
+        query, params = Todo._page_query(user_id, include_completed, limit, after)
+        with get_db_cursor() as db_cursor:
+            return (fetch_json_page if as_json else fetch_page)(db_cursor, query, params, limit, Todo.PAGE_KEYS)
     
     @staticmethod
-    def mark_completed(todo_id: str, completed: bool = True) -> bool:
+    def _page_query(
+        user_id: str,
+        include_completed: bool,
+        limit: int,
+        after: Optional[List[Any]]
+    ) -> Tuple[str, List[Any]]:
+        """Keyset page query (limit + 1 rows, for fetch_page) and its params"""
+        conditions = ['user_id = %s']
+        params: List[Any] = [user_id]
+        if not include_completed:
+            conditions.append('completed = FALSE')
+        if after:
+            conditions.append('(priority, created_at, id) < (%s, %s::timestamptz, %s::uuid)')
+            params.extend(after)
+        params.append(limit + 1)
+        return f"""
+            SELECT * FROM todos
+            WHERE {' AND '.join(conditions)}
+            ORDER BY priority DESC, created_at DESC, id DESC
+            LIMIT %s
+        """, params
+    
+    @staticmethod
+    def mark_completed(todo_id: str, completed: bool = True, session: Optional[Session] = None) -> bool:
         """Mark a TODO as completed or uncompleted"""
-        with get_db_cursor() as cursor:
-            cursor.execute(
-                """
-                UPDATE todos 
-                SET completed = %s, 
-                    completed_at = CASE WHEN %s THEN CURRENT_TIMESTAMP ELSE NULL END
-                WHERE id = %s
-                """,
-                (completed, completed, todo_id)
-            )
-            return cursor.rowcount > 0
+        with _session_cursor(session) as cursor:
+            # RETURNING rather than rowcount, which pipeline mode only
+            # fills in after a sync
+            cursor.execute(Todo.MARK_COMPLETED_SQL, (completed, completed, todo_id), prepare=True)
+            result = cursor.fetchone()
+            if result is None:
+                return False
+            read_cache.invalidate('todos', result['user_id'])
+            return True
 
 
+@embedded_backend
 class GroceryItem:
     """Grocery item model"""
     
+    # Sort key of get_active_page, in ORDER BY order
+    ACTIVE_PAGE_KEYS = ['created_at', 'id']
+    
+    LOCK_ACTIVE_SQL = """
+        SELECT id FROM grocery_items
+        WHERE user_id = %s AND is_active = TRUE
+        FOR UPDATE
+    """
+    
+    CREATE_EVENT_SQL = """
+        INSERT INTO shopping_events (user_id, notes)
+        VALUES (%s, %s)
+        RETURNING id, completed_at
+    """
+    
+    # Items bought more than once on a trip count as one purchase; the
+    # typical interval is the mean gap between trips that included it
+    ARCHIVE_SQL = """
+        WITH archived AS (
+            UPDATE grocery_items
+            SET is_active = FALSE,
+                shopping_event_id = %(event_id)s,
+                archived_at = CURRENT_TIMESTAMP
+            WHERE user_id = %(user_id)s AND id = ANY(%(item_ids)s) AND is_active = TRUE
+            RETURNING item_name
+        ),
+        bought AS (
+            SELECT lower(btrim(item_name)) AS item_key, min(btrim(item_name)) AS item_name
+            FROM archived
+            GROUP BY 1
+        )
+        INSERT INTO grocery_purchase_stats AS stats
+            (user_id, item_key, item_name, purchase_count, first_bought_at, last_bought_at)
+        SELECT %(user_id)s, item_key, item_name, 1, %(bought_at)s, %(bought_at)s
+        FROM bought
+        ON CONFLICT (user_id, item_key) DO UPDATE SET
+            item_name = EXCLUDED.item_name,
+            purchase_count = stats.purchase_count + 1,
+            interval_seconds_total = stats.interval_seconds_total
+                + extract(epoch FROM EXCLUDED.last_bought_at - stats.last_bought_at),
+            last_bought_at = EXCLUDED.last_bought_at,
+            next_due_at = EXCLUDED.last_bought_at + make_interval(secs =>
+                (stats.interval_seconds_total
+                    + extract(epoch FROM EXCLUDED.last_bought_at - stats.last_bought_at))
+                / stats.purchase_count)
+    """
+    
+    DUE_SOON_SQL = """
+        SELECT stats.item_name, stats.purchase_count, stats.last_bought_at, stats.next_due_at,
+               (stats.interval_seconds_total / (stats.purchase_count - 1) / 86400)::float8
+                   AS typical_interval_days
+        FROM grocery_purchase_stats stats
+        WHERE stats.user_id = %s
+          AND stats.next_due_at <= CURRENT_TIMESTAMP + make_interval(days => %s)
+          AND NOT EXISTS (
+              SELECT 1 FROM grocery_items item
+              WHERE item.user_id = stats.user_id
+                AND item.is_active = TRUE
+                AND lower(btrim(item.item_name)) = stats.item_key
+          )
+        ORDER BY stats.next_due_at
+        LIMIT %s
+    """
+    
+    @staticmethod
+    def _insert_sql(count: int) -> str:
+        values = ', '.join(['(%s, %s, %s, %s)'] * count)
+        return f"""
+            INSERT INTO grocery_items (user_id, item_name, quantity, notes)
+            VALUES {values}
+            RETURNING id, user_id, item_name, quantity, notes, is_active, created_at
+        """
+    
     @staticmethod
-    def create(user_id: str, item_name: str, quantity: int = 1, notes: Optional[str] = None) -> Dict[str, Any]:
+    def _insert_params(user_id: str, items: List[Dict[str, Any]]) -> List[Any]:
+        params = []
+        for item in items:
+            params.extend((user_id, item['item_name'], item.get('quantity', 1), item.get('notes')))
+        return params
+    
+    @staticmethod
+    def create(
+        user_id: str,
+        item_name: str,
+        quantity: int = 1,
+        notes: Optional[str] = None,
+        session: Optional[Session] = None
+    ) -> Dict[str, Any]:
         """Create a new grocery item"""
-        with get_db_cursor() as cursor:
-            cursor.execute(
-                """
-                INSERT INTO grocery_items (user_id, item_name, quantity, notes)
-                VALUES (%s, %s, %s, %s)
-                RETURNING id, user_id, item_name, quantity, notes, is_active, created_at
-                """,
-                (user_id, item_name, quantity, notes)
-            )
+        with _session_cursor(session) as cursor:
+            cursor.execute(GroceryItem._insert_sql(1), (user_id, item_name, quantity, notes), prepare=True)
+            read_cache.invalidate('groceries', user_id)
             return dict(cursor.fetchone())
     
+    @staticmethod
+    def create_many(user_id: str, items: List[Dict[str, Any]], session: Optional[Session] = None) -> List[Dict[str, Any]]:
+        """
+        Create several grocery items in one statement
+        Each entry needs 'item_name' and may set 'quantity' and 'notes'
+        """
+        if not items:
+            return []
+        
+        with _session_cursor(session) as cursor:
+            cursor.execute(GroceryItem._insert_sql(len(items)), GroceryItem._insert_params(user_id, items))
+            read_cache.invalidate('groceries', user_id)
+            return cursor.fetchall()
+    
     @staticmethod
     def get_active(user_id: str) -> List[Dict[str, Any]]:
-        """Get all active grocery items for a user"""
+        """Get all active grocery items for a user (served from the read cache when enabled)"""
+        return read_cache.get_or_load(
+            'groceries', user_id, 'active',
+            lambda: GroceryItem._get_active(user_id)
+        )
+    
+    @staticmethod
+    def _get_active(user_id: str) -> List[Dict[str, Any]]:
         with get_db_cursor() as cursor:
             cursor.execute(
                 """
@@ -176,41 +683,138 @@ class GroceryItem:
                 """,
                 (user_id,)
             )
-            return [dict(row) for row in cursor.fetchall()]
+            return cursor.fetchall()
     
     @staticmethod
-    def archive_items(user_id: str, item_ids: List[str], event_notes: Optional[str] = None) -> str:
-        """Archive multiple grocery items by creating a shopping event"""
-        with get_db_cursor() as cursor:
-            # Create shopping event
-            cursor.execute(
-                """
-                INSERT INTO shopping_events (user_id, notes)
-                VALUES (%s, %s)
-                RETURNING id
-                """,
-                (user_id, event_notes)
-            )
-            event_id = cursor.fetchone()['id']
-            
-            # Archive the items
-            cursor.execute(
-                """
-                UPDATE grocery_items
-                SET is_active = FALSE, 
-                    shopping_event_id = %s,
-                    archived_at = CURRENT_TIMESTAMP
-                WHERE user_id = %s AND id = ANY(%s)
-                """,
-                (event_id, user_id, item_ids)
+    def get_active_page(
+        user_id: str,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        as_json: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Get a page of active grocery items for a user, newest first
+        Returns {'items': [...], 'next_cursor': str or None}, or with as_json
+        {'items_json': str, 'count': int, 'next_cursor': str or None}
+        Raises ValueError for a malformed cursor
+        """
+        limit = clamp_page_size(limit)
+        after = decode_cursor(cursor, 2) if cursor else None
+        return read_cache.get_or_load(
+            'groceries', user_id, ('active_page', limit, cursor, as_json),
+            lambda: GroceryItem._get_active_page(user_id, limit, after, as_json)
+        )
+    
+    @staticmethod
+    def _get_active_page(user_id: str, limit: int, after: Optional[List[Any]], as_json: bool) -> Dict[str, Any]:
+        query, params = GroceryItem._active_page_query(user_id, limit, after)
+        with get_db_cursor() as db_cursor:
+            return (fetch_json_page if as_json else fetch_page)(
+                db_cursor, query, params, limit, GroceryItem.ACTIVE_PAGE_KEYS
             )
+    
+    @staticmethod
+    def _active_page_query(user_id: str, limit: int, after: Optional[List[Any]]) -> Tuple[str, List[Any]]:
+        """Keyset page query (limit + 1 rows, for fetch_page) and its params"""
+        keyset = ''
+        params: List[Any] = [user_id]
+        if after:
+            keyset = 'AND (created_at, id) < (%s::timestamptz, %s::uuid)'
+            params.extend(after)
+        params.append(limit + 1)
+        return f"""
+            SELECT * FROM grocery_items
+            WHERE user_id = %s AND is_active = TRUE
+            {keyset}
+            ORDER BY created_at DESC, id DESC
+            LIMIT %s
+        """, params
+    
+    @staticmethod
+    def archive_items(
+        user_id: str,
+        item_ids: List[str],
+        event_notes: Optional[str] = None,
+        session: Optional[Session] = None
+    ) -> str:
+        """Archive multiple grocery items by creating a shopping event"""
+        with _session_cursor(session) as cursor:
+            event_id = GroceryItem._archive(cursor, user_id, item_ids, event_notes)
+            read_cache.invalidate('groceries', user_id)
+            return event_id
+    
+    @staticmethod
+    def checkout(user_id: str, notes: Optional[str] = None, session: Optional[Session] = None) -> Optional[Dict[str, Any]]:
+        """
+        Archive the whole active list as one shopping trip
+        Returns {'event_id': str, 'archived': int}, or None if the list is empty
+        """
+        with _session_cursor(session) as cursor:
+            # Lock the list so two checkouts cannot archive the same items
+            cursor.execute(GroceryItem.LOCK_ACTIVE_SQL, (user_id,))
+            item_ids = [row['id'] for row in cursor.fetchall()]
+            if not item_ids:
+                return None
             
-            return str(event_id)
+            event_id = GroceryItem._archive(cursor, user_id, item_ids, notes)
+            read_cache.invalidate('groceries', user_id)
+            return {'event_id': event_id, 'archived': len(item_ids)}
+    
+    @staticmethod
+    def _archive(cursor, user_id: str, item_ids: List[Any], event_notes: Optional[str]) -> str:
+        """
+        Create a shopping event, move the items into it and fold the trip into
+        grocery_purchase_stats, so history reads never scan archived items
+        """
+        cursor.execute(GroceryItem.CREATE_EVENT_SQL, (user_id, event_notes))
+        event = cursor.fetchone()
+        cursor.execute(GroceryItem.ARCHIVE_SQL, GroceryItem._archive_params(user_id, item_ids, event))
+        return str(event['id'])
+    
+    @staticmethod
+    def _archive_params(user_id: str, item_ids: List[Any], event: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'event_id': event['id'],
+            'user_id': user_id,
+            'item_ids': item_ids,
+            'bought_at': event['completed_at'],
+        }
+    
+    @staticmethod
+    def get_due_soon(user_id: str, within_days: int = 3, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Items that are probably needed soon: bought at least twice, due within
+        within_days by their typical interval, and not already on the list
+        """
+        return read_cache.get_or_load(
+            'groceries', user_id, ('due_soon', within_days, limit),
+            lambda: GroceryItem._get_due_soon(user_id, within_days, limit)
+        )
+    
+    @staticmethod
+    def _get_due_soon(user_id: str, within_days: int, limit: int) -> List[Dict[str, Any]]:
+        with get_db_cursor() as cursor:
+            cursor.execute(GroceryItem.DUE_SOON_SQL, (user_id, within_days, limit))
+            return cursor.fetchall()
 
 
+@embedded_backend
 class ActivityLog:
     """Activity logging for observability"""
     
+    INSERT_SQL = """
+        INSERT INTO activity_log 
+        (user_id, action, entity_type, entity_id, details, ip_address, user_agent)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+    """
+    
+    RECENT_SQL = """
+        SELECT * FROM activity_log
+        WHERE user_id = %s
+        ORDER BY created_at DESC
+        LIMIT %s
+    """
+    
     @staticmethod
     def log(
         user_id: Optional[str],
@@ -219,32 +823,619 @@ class ActivityLog:
         entity_id: Optional[str] = None,
         details: Optional[Dict[str, Any]] = None,
         ip_address: Optional[str] = None,
-        user_agent: Optional[str] = None
+        user_agent: Optional[str] = None,
+        session: Optional[Session] = None
     ):
-        """Log an activity"""
-        with get_db_cursor() as cursor:
+        """
+        Log an activity
+        Inside a session the entry is part of the session's transaction;
+        otherwise it is handed to the background writer when one is running,
+        or written immediately
+        """
+        if session is None and _log_writer is not None and _log_writer.running:
+            _log_writer.submit((
+                user_id, action, entity_type, entity_id,
+                psycopg.types.json.Jsonb(details) if details else None,
+                ip_address, user_agent, datetime.now(timezone.utc)
+            ))
+            return
+        
+        with _session_cursor(session) as cursor:
             cursor.execute(
-                """
-                INSERT INTO activity_log 
-                (user_id, action, entity_type, entity_id, details, ip_address, user_agent)
-                VALUES (%s, %s, %s, %s, %s, %s, %s)
-                """,
+                ActivityLog.INSERT_SQL,
                 (user_id, action, entity_type, entity_id, 
                  psycopg.types.json.Jsonb(details) if details else None,
-                 ip_address, user_agent)
+                 ip_address, user_agent),
+                prepare=True
             )
     
     @staticmethod
     def get_recent(user_id: str, limit: int = 50) -> List[Dict[str, Any]]:
         """Get recent activity for a user"""
+        with get_db_cursor() as cursor:
+            cursor.execute(ActivityLog.RECENT_SQL, (user_id, limit))
+            return cursor.fetchall()
+    
+    @staticmethod
+    def roll_up(settle_seconds: int = 300) -> Dict[str, Any]:
+        """
+        Fold activity_log rows since the last run into the hourly and daily
+        rollups. Only hours that ended settle_seconds ago are rolled, so
+        entries still buffered by the writer land before their hour is read
+        Returns {'from': datetime or None, 'through': datetime}
+        """
         with get_db_cursor() as cursor:
             cursor.execute(
                 """
-                SELECT * FROM activity_log
-                WHERE user_id = %s
-                ORDER BY created_at DESC
-                LIMIT %s
+                SELECT
+                    coalesce(
+                        rolled_through,
+                        (SELECT date_trunc('hour', min(created_at)) FROM activity_log)
+                    ) AS rolled_from,
+                    date_trunc('hour', CURRENT_TIMESTAMP - make_interval(secs => %s)) AS rolled_through
+                FROM activity_rollup_state
+                FOR UPDATE
                 """,
-                (user_id, limit)
+                (settle_seconds,)
             )
-            return [dict(row) for row in cursor.fetchall()]
+            window = cursor.fetchone()
+            start, end = window['rolled_from'], window['rolled_through']
+            
+            if start is not None and start < end:
+                cursor.execute(
+                    """
+                    INSERT INTO activity_rollups (granularity, bucket_start, action, entity_type, event_count)
+                    SELECT 'hour', date_trunc('hour', created_at), action, coalesce(entity_type, ''), count(*)
+                    FROM activity_log
+                    WHERE created_at >= %s AND created_at < %s
+                    GROUP BY 2, 3, 4
+                    ON CONFLICT (granularity, bucket_start, action, entity_type) DO UPDATE SET
+                        event_count = EXCLUDED.event_count
+                    """,
+                    (start, end)
+                )
+                # Days are summed from their hours, so a partly rolled day is
+                # recomputed whole on the next run
+                cursor.execute(
+                    """
+                    INSERT INTO activity_rollups (granularity, bucket_start, action, entity_type, event_count)
+                    SELECT 'day', date_trunc('day', bucket_start), action, entity_type, sum(event_count)
+                    FROM activity_rollups
+                    WHERE granularity = 'hour'
+                      AND bucket_start >= date_trunc('day', %s::timestamptz)
+                      AND bucket_start < %s
+                    GROUP BY 2, 3, 4
+                    ON CONFLICT (granularity, bucket_start, action, entity_type) DO UPDATE SET
+                        event_count = EXCLUDED.event_count
+                    """,
+                    (start, end)
+                )
+            
+            cursor.execute("UPDATE activity_rollup_state SET rolled_through = %s", (end,))
+            return {'from': start, 'through': end}
+    
+    @staticmethod
+    def maintain(retention_days: int = 90, hourly_retention_days: int = 400) -> Dict[str, Any]:
+        """
+        Create upcoming activity_log partitions, roll up, then drop partitions
+        and hourly rollups past retention (daily rollups are kept). Rows
+        that landed in the default partition belong to no monthly one, so
+        expired ones are deleted from it row by row
+        """
+        rolled = ActivityLog.roll_up()
+        with get_db_cursor() as cursor:
+            cursor.execute("SELECT create_activity_log_partitions(2) AS created")
+            created = cursor.fetchone()['created']
+            cursor.execute(
+                "SELECT drop_activity_log_partitions(make_interval(days => %s)) AS dropped",
+                (retention_days,)
+            )
+            dropped = cursor.fetchone()['dropped']
+            cursor.execute(
+                """
+                DELETE FROM activity_log_default
+                WHERE created_at < CURRENT_TIMESTAMP - make_interval(days => %s)
+                """,
+                (retention_days,)
+            )
+            rows_deleted = cursor.rowcount
+            cursor.execute(
+                """
+                DELETE FROM activity_rollups
+                WHERE granularity = 'hour'
+                  AND bucket_start < CURRENT_TIMESTAMP - make_interval(days => %s)
+                """,
+                (hourly_retention_days,)
+            )
+            return {
+                'partitions_created': created,
+                'partitions_dropped': dropped,
+                'activity_rows_deleted': rows_deleted,
+                'hourly_rollups_deleted': cursor.rowcount,
+                'rolled_through': rolled['through'].isoformat(),
+            }
+    
+    @staticmethod
+    def get_rollups(
+        granularity: str,
+        since: datetime,
+        until: Optional[datetime] = None,
+        action: Optional[str] = None,
+        entity_type: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Activity counts per hour or day bucket in [since, until), oldest first"""
+        with get_db_cursor() as cursor:
+            cursor.execute(*ActivityLog._rollups_query(granularity, since, until, action, entity_type))
+            return cursor.fetchall()
+    
+    @staticmethod
+    def _rollups_query(
+        granularity: str,
+        since: datetime,
+        until: Optional[datetime],
+        action: Optional[str],
+        entity_type: Optional[str]
+    ) -> Tuple[str, List[Any]]:
+        conditions = ['granularity = %s', 'bucket_start >= %s']
+        params: List[Any] = [granularity, since]
+        if until is not None:
+            conditions.append('bucket_start < %s')
+            params.append(until)
+        if action is not None:
+            conditions.append('action = %s')
+            params.append(action)
+        if entity_type is not None:
+            conditions.append('entity_type = %s')
+            params.append(entity_type)
+        return f"""
+            SELECT bucket_start, action, entity_type, event_count
+            FROM activity_rollups
+            WHERE {' AND '.join(conditions)}
+            ORDER BY bucket_start, action, entity_type
+        """, params
+
+
+class ActivityLogWriter:
+    """
+    Buffers activity log entries in memory and writes them to activity_log
+    in batches with COPY from a background thread
+    A batch is written once it reaches batch_size entries or the oldest entry
+    has waited flush_interval seconds. When the buffer is full, log() waits up
+    to block_timeout seconds for room and then drops the entry
+    """
+    
+    COPY_SQL = """
+        COPY activity_log
+        (user_id, action, entity_type, entity_id, details, ip_address, user_agent, created_at)
+        FROM STDIN
+    """
+    
+    def __init__(
+        self,
+        max_buffer: int = 10000,
+        batch_size: int = 200,
+        flush_interval: float = 1.0,
+        block_timeout: float = 0.0
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.block_timeout = block_timeout
+        self._queue: queue.Queue = queue.Queue(maxsize=max_buffer)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats_lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+    
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive() and not self._stop.is_set()
+    
+    def start(self):
+        """Start the flusher thread"""
+        if self._thread is not None and self._thread.is_alive():
+            # A stop() that timed out leaves its flusher writing; two would race
+            raise RuntimeError('Activity log writer is still running or flushing')
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='activity-log-writer', daemon=True)
+        self._thread.start()
+    
+    def stop(self, timeout: float = 5.0):
+        """
+        Stop the flusher thread, writing out everything still buffered
+        If the thread is still writing after timeout seconds it is left to
+        finish on its own, and whatever it hasn't written when the process
+        exits is lost
+        """
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            print(f"Activity log writer still flushing after {timeout}s; "
+                  f"{self._queue.qsize()} buffered entries may be lost")
+            return
+        self._thread = None
+        # Anything submitted while the thread was exiting
+        self._write(self._drain(None))
+    
+    def submit(self, row: tuple) -> bool:
+        """Buffer a row, returning False if it had to be dropped"""
+        try:
+            if self.block_timeout > 0:
+                self._queue.put(row, timeout=self.block_timeout)
+            else:
+                self._queue.put_nowait(row)
+            return True
+        except queue.Full:
+            with self._stats_lock:
+                self.dropped += 1
+            return False
+    
+    def stats(self) -> Dict[str, int]:
+        """Counters for monitoring the writer"""
+        with self._stats_lock:
+            return {
+                'buffered': self._queue.qsize(),
+                'written': self.written,
+                'dropped': self.dropped,
+                'failed': self.failed,
+                'batches': self.batches,
+            }
+    
+    def _drain(self, limit: Optional[int]) -> List[tuple]:
+        """Take buffered rows without waiting"""
+        rows = []
+        while limit is None or len(rows) < limit:
+            try:
+                rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return rows
+    
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+            
+            # Collect until the batch is full or the first entry has waited long enough
+            rows = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(rows) < self.batch_size and not self._stop.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    rows.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(rows)
+        
+        # Final flush on shutdown
+        while True:
+            rows = self._drain(self.batch_size)
+            if not rows:
+                break
+            self._write(rows)
+    
+    def _write(self, rows: List[tuple]):
+        if not rows:
+            return
+        try:
+            with get_db_cursor() as cursor:
+                with cursor.copy(self.COPY_SQL) as copy:
+                    for row in rows:
+                        copy.write_row(row)
+            with self._stats_lock:
+                self.written += len(rows)
+                self.batches += 1
+        except Exception as e:
+            print(f"Error writing activity log batch: {e}")
+            with self._stats_lock:
+                self.failed += len(rows)
+
+
+def init_activity_log_writer(**kwargs) -> ActivityLogWriter:
+    """Start writing activity log entries in the background (see ActivityLogWriter)"""
+    global _log_writer
+    if _log_writer is not None:
+        _log_writer.stop()
+    _log_writer = ActivityLogWriter(**kwargs)
+    _log_writer.start()
+    return _log_writer
+
+def get_activity_log_writer() -> Optional[ActivityLogWriter]:
+    """Get the background activity log writer, if one is running"""
+    return _log_writer
+
+def close_activity_log_writer():
+    """Flush buffered activity log entries and stop the background writer"""
+    global _log_writer
+    if _log_writer:
+        _log_writer.stop()
+        _log_writer = None
+
+# Buffered entries must reach the database before the pool goes away
+atexit.register(close_activity_log_writer)
+
+
+class Job:
+    """Background job queue, consumed by worker.py"""
+    
+    ENQUEUE_SQL = """
+        INSERT INTO jobs (kind, user_id, payload, dedupe_key, run_after)
+        VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP + make_interval(secs => %s))
+        ON CONFLICT (dedupe_key) WHERE status = 'queued' DO UPDATE SET
+            run_after = LEAST(jobs.run_after, EXCLUDED.run_after),
+            payload = jobs.payload || EXCLUDED.payload || jsonb_strip_nulls(jsonb_build_object(
+                'full', CASE WHEN jobs.payload ? 'full' OR EXCLUDED.payload ? 'full' THEN
+                    coalesce((jobs.payload->>'full')::boolean, FALSE)
+                    OR coalesce((EXCLUDED.payload->>'full')::boolean, FALSE)
+                END,
+                'days_back', GREATEST((jobs.payload->>'days_back')::numeric, (EXCLUDED.payload->>'days_back')::numeric)
+            ))
+        RETURNING id, kind, status, run_after, created_at
+    """
+    
+    GET_SQL = """
+        SELECT id, kind, status, progress, result, error, attempts,
+               run_after, created_at, updated_at, finished_at
+        FROM jobs WHERE id = %s
+    """
+    
+    @staticmethod
+    def enqueue(
+        kind: str,
+        user_id: Optional[str] = None,
+        payload: Optional[Dict[str, Any]] = None,
+        dedupe_key: Optional[str] = None,
+        delay_seconds: int = 0
+    ) -> Dict[str, Any]:
+        """
+        Queue a job
+        Jobs sharing a dedupe_key are coalesced: while one is queued, enqueueing
+        again returns the queued job (pulled forward if the new one is due sooner)
+        with the payloads merged. Later keys win, except that `full` is kept if
+        either asked for it and `days_back` takes the larger window
+        """
+        with get_db_cursor() as cursor:
+            cursor.execute(
+                Job.ENQUEUE_SQL,
+                (kind, user_id, psycopg.types.json.Jsonb(payload or {}), dedupe_key, delay_seconds)
+            )
+            return dict(cursor.fetchone())
+    
+    @staticmethod
+    def claim(worker_id: str, kinds: List[str], stale_after_seconds: int = 900) -> Optional[Dict[str, Any]]:
+        """
+        Claim the next runnable job, or a running job whose worker went quiet
+        Returns None when nothing is runnable, including when the only runnable
+        job shares a dedupe_key with one that is already running
+        """
+        try:
+            with get_db_cursor() as cursor:
+                cursor.execute(
+                    """
+                    UPDATE jobs SET
+                        status = 'running',
+                        attempts = attempts + 1,
+                        locked_by = %s,
+                        locked_at = CURRENT_TIMESTAMP
+                    WHERE id = (
+                        SELECT id FROM jobs
+                        WHERE kind = ANY(%s)
+                        AND NOT EXISTS (
+                            SELECT 1 FROM jobs running
+                            WHERE running.dedupe_key = jobs.dedupe_key
+                            AND running.status = 'running'
+                            AND running.id <> jobs.id
+                        )
+                        AND (
+                            (status = 'queued' AND run_after <= CURRENT_TIMESTAMP)
+                            OR (status = 'running'
+                                AND locked_at < CURRENT_TIMESTAMP - make_interval(secs => %s))
+                        )
+                        ORDER BY run_after
+                        LIMIT 1
+                        FOR UPDATE SKIP LOCKED
+                    )
+                    RETURNING *
+                    """,
+                    (worker_id, kinds, stale_after_seconds)
+                )
+                result = cursor.fetchone()
+                return dict(result) if result else None
+        except psycopg.errors.UniqueViolation:
+            # Lost a race with another worker claiming the same dedupe_key
+            return None
+    
+    @staticmethod
+    def update_progress(job_id: str, progress: Dict[str, Any]):
+        """Record progress counters for a running job"""
+        with get_db_cursor() as cursor:
+            cursor.execute(
+                "UPDATE jobs SET progress = %s WHERE id = %s",
+                (psycopg.types.json.Jsonb(progress), job_id)
+            )
+    
+    @staticmethod
+    def complete(job_id: str, result: Optional[Dict[str, Any]] = None):
+        """Mark a job as succeeded"""
+        with get_db_cursor() as cursor:
+            cursor.execute(
+                """
+                UPDATE jobs SET
+                    status = 'succeeded',
+                    result = %s,
+                    error = NULL,
+                    finished_at = CURRENT_TIMESTAMP
+                WHERE id = %s
+                """,
+                (psycopg.types.json.Jsonb(result) if result else None, job_id)
+            )
+    
+    @staticmethod
+    def fail(job_id: str, error: str, retry_delay_seconds: int = 60):
+        """Record a failed attempt, requeueing the job until it runs out of attempts"""
+        try:
+            with get_db_cursor() as cursor:
+                cursor.execute(
+                    """
+                    UPDATE jobs SET
+                        status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END,
+                        run_after = CURRENT_TIMESTAMP + make_interval(secs => %s * attempts),
+                        finished_at = CASE WHEN attempts < max_attempts THEN NULL ELSE CURRENT_TIMESTAMP END,
+                        error = %s
+                    WHERE id = %s
+                    """,
+                    (retry_delay_seconds, error, job_id)
+                )
+        except psycopg.errors.UniqueViolation:
+            # A newer job with the same dedupe_key is already queued and will
+            # do the retry's work
+            with get_db_cursor() as cursor:
+                cursor.execute(
+                    """
+                    UPDATE jobs SET status = 'failed', error = %s, finished_at = CURRENT_TIMESTAMP
+                    WHERE id = %s
+                    """,
+                    (error, job_id)
+                )
+    
+    @staticmethod
+    def get(job_id: str) -> Optional[Dict[str, Any]]:
+        """Get a job by ID"""
+        with get_db_cursor() as cursor:
+            cursor.execute(Job.GET_SQL, (job_id,))
+            result = cursor.fetchone()
+            return dict(result) if result else None
+    
+    @staticmethod
+    def claim_schedule(name: str, interval_seconds: int) -> bool:
+        """
+        Claim a due run of a periodic schedule
+        Only one process wins each run, however many schedulers are polling
+        """
+        with get_db_cursor() as cursor:
+            cursor.execute(
+                """
+                INSERT INTO job_schedules (name, next_run_at)
+                VALUES (%s, CURRENT_TIMESTAMP + make_interval(secs => %s))
+                ON CONFLICT (name) DO UPDATE SET
+                    next_run_at = CURRENT_TIMESTAMP + make_interval(secs => %s)
+                WHERE job_schedules.next_run_at <= CURRENT_TIMESTAMP
+                RETURNING name
+                """,
+                (name, interval_seconds, interval_seconds)
+            )
+            return cursor.fetchone() is not None
+
+
+@embedded_backend
+class ChangeVersions:
+    """Per-user change counters bumped by triggers (see notify_cache_invalidate)"""
+    
+    GET_SQL = "SELECT scope, version FROM change_versions WHERE user_id = %s"
+    
+    @staticmethod
+    def get(user_id: str) -> Dict[str, int]:
+        """Current version of each scope for a user, e.g. {'todos': 12}"""
+        with get_db_cursor() as cursor:
+            cursor.execute(ChangeVersions.GET_SQL, (user_id,), prepare=True)
+            return {row['scope']: row['version'] for row in cursor.fetchall()}
+
+
+@embedded_backend
+class Dashboard:
+    """Everything the dashboard page shows, read in one statement"""
+    
+    # Bump when the snapshot's shape changes, so old ETags stop matching
+    SNAPSHOT_VERSION = 1
+    
+    # The snapshot subqueries sit in a CASE branch, so Postgres never runs
+    # them when the ETag matches
+    SNAPSHOT_SQL = f"""
+        WITH tagged AS (
+            SELECT concat_ws('.',
+                'v' || %(snapshot_version)s,
+                to_char(CURRENT_DATE, 'YYYYMMDD'),
+                (SELECT string_agg(scope || version, '.' ORDER BY scope)
+                 FROM change_versions WHERE user_id = %(user_id)s),
+                'gmail' || coalesce(
+                    (SELECT version FROM oauth_tokens WHERE provider = %(provider)s), 0)
+            ) AS etag
+        )
+        SELECT etag,
+            CASE WHEN etag = ANY(%(if_none_match)s) THEN NULL ELSE json_build_object(
+                'todos', (
+                    SELECT coalesce(json_agg(todo), '[]') FROM (
+                        SELECT * FROM todos
+                        WHERE user_id = %(user_id)s AND completed = FALSE
+                        ORDER BY priority DESC, created_at DESC, id DESC
+                        LIMIT %(limit)s
+                    ) todo
+                ),
+                'groceries', (
+                    SELECT coalesce(json_agg(item), '[]') FROM (
+                        SELECT * FROM grocery_items
+                        WHERE user_id = %(user_id)s AND is_active = TRUE
+                        ORDER BY created_at DESC, id DESC
+                        LIMIT %(limit)s
+                    ) item
+                ),
+                'emails', (
+                    SELECT coalesce(json_agg(email), '[]') FROM (
+                        SELECT {EMAIL_CACHE_COLUMNS} FROM email_cache
+                        WHERE user_id = %(user_id)s AND is_unread = TRUE
+                          AND received_at >= CURRENT_TIMESTAMP - make_interval(days => %(days_back)s)
+                        ORDER BY received_at DESC, id DESC
+                        LIMIT %(limit)s
+                    ) email
+                ),
+                'gmail', json_build_object(
+                    'authenticated', EXISTS (SELECT 1 FROM oauth_tokens WHERE provider = %(provider)s AND is_valid)
+                )
+            )::text END AS snapshot_json
+        FROM tagged
+    """
+    
+    @staticmethod
+    def snapshot(
+        user_id: str,
+        if_none_match: Optional[List[str]] = None,
+        days_back: int = 20,
+        limit: int = DEFAULT_PAGE_SIZE
+    ) -> Dict[str, Any]:
+        """
+        Open todos, active groceries, unread emails and Gmail connection status,
+        tagged with an ETag built from the user's change_versions
+        Returns {'etag': str, 'snapshot_json': str}, with snapshot_json None
+        when the ETag is in if_none_match (the snapshot is then never built)
+        The ETag also carries the date, so emails age out of the window daily
+        """
+        with get_db_cursor() as cursor:
+            cursor.execute(
+                Dashboard.SNAPSHOT_SQL,
+                Dashboard._snapshot_params(user_id, if_none_match, days_back, limit)
+            )
+            return cursor.fetchone()
+    
+    @staticmethod
+    def _snapshot_params(
+        user_id: str,
+        if_none_match: Optional[List[str]],
+        days_back: int,
+        limit: int
+    ) -> Dict[str, Any]:
+        return {
+            'snapshot_version': Dashboard.SNAPSHOT_VERSION,
+            'user_id': user_id,
+            'provider': 'gmail',
+            'if_none_match': if_none_match or [],
+            'days_back': days_back,
+            'limit': limit,
+        }
@@ -0,0 +1,459 @@
+"""
+Async counterparts of the database.py models, for the ASGI app (asgi.py)
+Same SQL, caching and return shapes, on a psycopg AsyncConnectionPool so a
+request waiting on Postgres doesn't hold a thread. The job worker, the Flask
+routes and the background writers keep using database.py
+"""
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Optional, List, Dict, Any
+import psycopg
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+from cache import read_cache
+from profiling import ProfiledAsyncCursor, record_pool_wait
+import database
+from database import (
+    clamp_page_size,
+    decode_cursor,
+    DEFAULT_PAGE_SIZE,
+    _page_result,
+    _json_page_sql,
+    _json_page_result,
+)
+
+# Async connection pool (opened by init_db_pool inside the event loop)
+_pool: Optional[AsyncConnectionPool] = None
+
+async def init_db_pool(
+    database_url: str,
+    min_size: Optional[int] = None,
+    max_size: Optional[int] = None,
+    timeout: Optional[float] = None
+):
+    """
+    Open the async connection pool; sizes and timeout default to the same
+    DB_POOL_* settings as database.init_db_pool
+    """
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+    if min_size is None:
+        min_size = int(os.environ.get('DB_POOL_MIN_SIZE', 1))
+    if max_size is None:
+        max_size = int(os.environ.get('DB_POOL_MAX_SIZE', 10))
+    if timeout is None:
+        timeout = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+    _pool = AsyncConnectionPool(
+        database_url,
+        min_size=min_size,
+        max_size=max_size,
+        timeout=timeout,
+        kwargs={'cursor_factory': ProfiledAsyncCursor},
+        open=False
+    )
+    await _pool.open()
+
+def get_db_pool() -> AsyncConnectionPool:
+    """Get the async connection pool"""
+    if _pool is None:
+        raise RuntimeError("Async database pool not initialized. Call init_db_pool() first.")
+    return _pool
+
+async def close_db_pool():
+    """Close the async connection pool"""
+    global _pool
+    if _pool:
+        await _pool.close()
+        _pool = None
+
+@asynccontextmanager
+async def get_db_connection(timeout: Optional[float] = None):
+    """Async context manager for database connections"""
+    start = time.perf_counter()
+    async with get_db_pool().connection(timeout=timeout) as conn:
+        record_pool_wait((time.perf_counter() - start) * 1000)
+        yield conn
+
+@asynccontextmanager
+async def get_db_cursor():
+    """Async context manager for database cursors"""
+    async with get_db_connection() as conn:
+        async with conn.cursor(row_factory=dict_row) as cursor:
+            yield cursor
+
+def get_pool_stats() -> Dict[str, Any]:
+    """In-use vs idle connections and waits for the async pool"""
+    if _pool is None:
+        return {}
+    pool_stats = _pool.get_stats()
+    size = pool_stats.get('pool_size', 0)
+    idle = pool_stats.get('pool_available', 0)
+    return {
+        'in_use': size - idle,
+        'size': size,
+        'idle': idle,
+        'min_size': pool_stats.get('pool_min'),
+        'max_size': pool_stats.get('pool_max'),
+        'requests_waiting': pool_stats.get('requests_waiting', 0),
+        'wait_ms_total': pool_stats.get('requests_wait_ms', 0),
+        'timeouts': pool_stats.get('requests_errors', 0),
+        'connections_lost': pool_stats.get('connections_lost', 0),
+    }
+
+async def check_db_health(timeout: float = 2.0) -> Dict[str, Any]:
+    """Time a pool checkout plus a trivial query"""
+    start = time.perf_counter()
+    try:
+        async with get_db_connection(timeout=timeout) as conn:
+            checked_out = time.perf_counter()
+            await (await conn.execute("SELECT 1")).fetchone()
+        finished = time.perf_counter()
+        return {
+            'status': 'connected',
+            'latency_ms': round((finished - start) * 1000, 3),
+            'checkout_ms': round((checked_out - start) * 1000, 3),
+            'query_ms': round((finished - checked_out) * 1000, 3),
+        }
+    except Exception as e:
+        return {
+            'status': 'error',
+            'latency_ms': round((time.perf_counter() - start) * 1000, 3),
+            'error': str(e),
+        }
+
+
+class Session:
+    """Unit of work on one connection and transaction (see database.Session)"""
+    
+    def __init__(self, conn: psycopg.AsyncConnection):
+        self.conn = conn
+    
+    def cursor(self) -> psycopg.AsyncCursor:
+        return self.conn.cursor(row_factory=dict_row)
+
+@asynccontextmanager
+async def db_session():
+    """Async context manager for a unit of work; commits on exit, rolls back on error"""
+    async with get_db_connection() as conn:
+        async with conn.pipeline():
+            async with conn.transaction():
+                yield Session(conn)
+
+@asynccontextmanager
+async def _session_cursor(session: Optional[Session] = None):
+    """A cursor on the session's connection, or on a pooled connection of its own"""
+    if session is None:
+        async with get_db_cursor() as cursor:
+            yield cursor
+    else:
+        async with session.cursor() as cursor:
+            yield cursor
+
+
+async def fetch_page(cursor, query: str, params: Any, limit: int, key_columns: List[str]) -> Dict[str, Any]:
+    """Async database.fetch_page"""
+    await cursor.execute(query, params)
+    return _page_result(await cursor.fetchall(), limit, key_columns)
+
+async def fetch_json_page(cursor, query: str, params: Any, limit: int, key_columns: List[str]) -> Dict[str, Any]:
+    """Async database.fetch_json_page"""
+    await cursor.execute(_json_page_sql(query, key_columns), [*params, limit, limit])
+    return _json_page_result(await cursor.fetchone())
+
+
+class User:
+    """Async database.User"""
+    
+    @staticmethod
+    async def create(username: str, email: str, password_hash: str) -> Dict[str, Any]:
+        async with get_db_cursor() as cursor:
+            await cursor.execute(database.User.CREATE_SQL, (username, email, password_hash))
+            return await cursor.fetchone()
+    
+    @staticmethod
+    async def get_by_id(user_id: str) -> Optional[Dict[str, Any]]:
+        async with get_db_cursor() as cursor:
+            await cursor.execute(database.User.GET_BY_ID_SQL, (user_id,))
+            return await cursor.fetchone()
+    
+    @staticmethod
+    async def get_by_email(email: str) -> Optional[Dict[str, Any]]:
+        async with get_db_cursor() as cursor:
+            await cursor.execute(database.User.GET_BY_EMAIL_SQL, (email,))
+            return await cursor.fetchone()
+
+
+class Todo:
+    """Async database.Todo"""
+    
+    @staticmethod
+    async def create(user_id: str, text: str, priority: int = 0, session: Optional[Session] = None) -> Dict[str, Any]:
+        async with _session_cursor(session) as cursor:
+            await cursor.execute(database.Todo._insert_sql(1), (user_id, text, priority), prepare=True)
+            read_cache.invalidate('todos', user_id)
+            return await cursor.fetchone()
+    
+    @staticmethod
+    async def create_many(
+        user_id: str,
+        todos: List[Dict[str, Any]],
+        session: Optional[Session] = None
+    ) -> List[Dict[str, Any]]:
+        if not todos:
+            return []
+        
+        async with _session_cursor(session) as cursor:
+            await cursor.execute(database.Todo._insert_sql(len(todos)), database.Todo._insert_params(user_id, todos))
+            read_cache.invalidate('todos', user_id)
+            return await cursor.fetchall()
+    
+    @staticmethod
+    async def get_page(
+        user_id: str,
+        include_completed: bool = False,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        as_json: bool = False
+    ) -> Dict[str, Any]:
+        limit = clamp_page_size(limit)
+        after = decode_cursor(cursor, 3) if cursor else None
+        return await read_cache.get_or_load_async(
+            'todos', user_id, ('page', include_completed, limit, cursor, as_json),
+            lambda: Todo._get_page(user_id, include_completed, limit, after, as_json)
+        )
+    
+    @staticmethod
+    async def _get_page(
+        user_id: str,
+        include_completed: bool,
+        limit: int,
+        after: Optional[List[Any]],
+        as_json: bool
+    ) -> Dict[str, Any]:
+        query, params = database.Todo._page_query(user_id, include_completed, limit, after)
+        async with get_db_cursor() as db_cursor:
+            fetch = fetch_json_page if as_json else fetch_page
+            return await fetch(db_cursor, query, params, limit, database.Todo.PAGE_KEYS)
+    
+    @staticmethod
+    async def mark_completed(todo_id: str, completed: bool = True, session: Optional[Session] = None) -> bool:
+        async with _session_cursor(session) as cursor:
+            await cursor.execute(database.Todo.MARK_COMPLETED_SQL, (completed, completed, todo_id), prepare=True)
+            result = await cursor.fetchone()
+            if result is None:
+                return False
+            read_cache.invalidate('todos', result['user_id'])
+            return True
+
+
+class GroceryItem:
+    """Async database.GroceryItem"""
+    
+    @staticmethod
+    async def create(
+        user_id: str,
+        item_name: str,
+        quantity: int = 1,
+        notes: Optional[str] = None,
+        session: Optional[Session] = None
+    ) -> Dict[str, Any]:
+        async with _session_cursor(session) as cursor:
+            await cursor.execute(
+                database.GroceryItem._insert_sql(1), (user_id, item_name, quantity, notes), prepare=True
+            )
+            read_cache.invalidate('groceries', user_id)
+            return await cursor.fetchone()
+    
+    @staticmethod
+    async def create_many(
+        user_id: str,
+        items: List[Dict[str, Any]],
+        session: Optional[Session] = None
+    ) -> List[Dict[str, Any]]:
+        if not items:
+            return []
+        
+        async with _session_cursor(session) as cursor:
+            await cursor.execute(
+                database.GroceryItem._insert_sql(len(items)), database.GroceryItem._insert_params(user_id, items)
+            )
+            read_cache.invalidate('groceries', user_id)
+            return await cursor.fetchall()
+    
+    @staticmethod
+    async def get_active_page(
+        user_id: str,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        as_json: bool = False
+    ) -> Dict[str, Any]:
+        limit = clamp_page_size(limit)
+        after = decode_cursor(cursor, 2) if cursor else None
+        return await read_cache.get_or_load_async(
+            'groceries', user_id, ('active_page', limit, cursor, as_json),
+            lambda: GroceryItem._get_active_page(user_id, limit, after, as_json)
+        )
+    
+    @staticmethod
+    async def _get_active_page(user_id: str, limit: int, after: Optional[List[Any]], as_json: bool) -> Dict[str, Any]:
+        query, params = database.GroceryItem._active_page_query(user_id, limit, after)
+        async with get_db_cursor() as db_cursor:
+            fetch = fetch_json_page if as_json else fetch_page
+            return await fetch(db_cursor, query, params, limit, database.GroceryItem.ACTIVE_PAGE_KEYS)
+    
+    @staticmethod
+    async def archive_items(
+        user_id: str,
+        item_ids: List[str],
+        event_notes: Optional[str] = None,
+        session: Optional[Session] = None
+    ) -> str:
+        async with _session_cursor(session) as cursor:
+            event_id = await GroceryItem._archive(cursor, user_id, item_ids, event_notes)
+            read_cache.invalidate('groceries', user_id)
+            return event_id
+    
+    @staticmethod
+    async def checkout(
+        user_id: str,
+        notes: Optional[str] = None,
+        session: Optional[Session] = None
+    ) -> Optional[Dict[str, Any]]:
+        async with _session_cursor(session) as cursor:
+            await cursor.execute(database.GroceryItem.LOCK_ACTIVE_SQL, (user_id,))
+            item_ids = [row['id'] for row in await cursor.fetchall()]
+            if not item_ids:
+                return None
+            
+            event_id = await GroceryItem._archive(cursor, user_id, item_ids, notes)
+            read_cache.invalidate('groceries', user_id)
+            return {'event_id': event_id, 'archived': len(item_ids)}
+    
+    @staticmethod
+    async def _archive(cursor, user_id: str, item_ids: List[Any], event_notes: Optional[str]) -> str:
+        await cursor.execute(database.GroceryItem.CREATE_EVENT_SQL, (user_id, event_notes))
+        event = await cursor.fetchone()
+        await cursor.execute(
+            database.GroceryItem.ARCHIVE_SQL, database.GroceryItem._archive_params(user_id, item_ids, event)
+        )
+        return str(event['id'])
+    
+    @staticmethod
+    async def get_due_soon(user_id: str, within_days: int = 3, limit: int = 20) -> List[Dict[str, Any]]:
+        return await read_cache.get_or_load_async(
+            'groceries', user_id, ('due_soon', within_days, limit),
+            lambda: GroceryItem._get_due_soon(user_id, within_days, limit)
+        )
+    
+    @staticmethod
+    async def _get_due_soon(user_id: str, within_days: int, limit: int) -> List[Dict[str, Any]]:
+        async with get_db_cursor() as cursor:
+            await cursor.execute(database.GroceryItem.DUE_SOON_SQL, (user_id, within_days, limit))
+            return await cursor.fetchall()
+
+
+class ActivityLog:
+    """Async database.ActivityLog (rollup maintenance stays in the worker)"""
+    
+    @staticmethod
+    async def log(
+        user_id: Optional[str],
+        action: str,
+        entity_type: Optional[str] = None,
+        entity_id: Optional[str] = None,
+        details: Optional[Dict[str, Any]] = None,
+        ip_address: Optional[str] = None,
+        user_agent: Optional[str] = None,
+        session: Optional[Session] = None
+    ):
+        """
+        Log an activity; outside a session the entry goes to the background
+        writer when one is running (a non-blocking hand-off)
+        """
+        log_writer = database.get_activity_log_writer()
+        if session is None and log_writer is not None and log_writer.running:
+            database.ActivityLog.log(user_id, action, entity_type, entity_id, details, ip_address, user_agent)
+            return
+        
+        async with _session_cursor(session) as cursor:
+            await cursor.execute(
+                database.ActivityLog.INSERT_SQL,
+                (user_id, action, entity_type, entity_id,
+                 psycopg.types.json.Jsonb(details) if details else None,
+                 ip_address, user_agent),
+                prepare=True
+            )
+    
+    @staticmethod
+    async def get_recent(user_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+        async with get_db_cursor() as cursor:
+            await cursor.execute(database.ActivityLog.RECENT_SQL, (user_id, limit))
+            return await cursor.fetchall()
+    
+    @staticmethod
+    async def get_rollups(
+        granularity: str,
+        since: datetime,
+        until: Optional[datetime] = None,
+        action: Optional[str] = None,
+        entity_type: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        async with get_db_cursor() as cursor:
+            await cursor.execute(*database.ActivityLog._rollups_query(granularity, since, until, action, entity_type))
+            return await cursor.fetchall()
+
+
+class Job:
+    """Async database.Job (claiming and completing jobs stays in the worker)"""
+    
+    @staticmethod
+    async def enqueue(
+        kind: str,
+        user_id: Optional[str] = None,
+        payload: Optional[Dict[str, Any]] = None,
+        dedupe_key: Optional[str] = None,
+        delay_seconds: int = 0
+    ) -> Dict[str, Any]:
+        async with get_db_cursor() as cursor:
+            await cursor.execute(
+                database.Job.ENQUEUE_SQL,
+                (kind, user_id, psycopg.types.json.Jsonb(payload or {}), dedupe_key, delay_seconds)
+            )
+            return await cursor.fetchone()
+    
+    @staticmethod
+    async def get(job_id: str) -> Optional[Dict[str, Any]]:
+        async with get_db_cursor() as cursor:
+            await cursor.execute(database.Job.GET_SQL, (job_id,))
+            return await cursor.fetchone()
+
+
+class ChangeVersions:
+    """Async database.ChangeVersions"""
+    
+    @staticmethod
+    async def get(user_id: str) -> Dict[str, int]:
+        async with get_db_cursor() as cursor:
+            await cursor.execute(database.ChangeVersions.GET_SQL, (user_id,), prepare=True)
+            return {row['scope']: row['version'] for row in await cursor.fetchall()}
+
+
+class Dashboard:
+    """Async database.Dashboard"""
+    
+    @staticmethod
+    async def snapshot(
+        user_id: str,
+        if_none_match: Optional[List[str]] = None,
+        days_back: int = 20,
+        limit: int = DEFAULT_PAGE_SIZE
+    ) -> Dict[str, Any]:
+        async with get_db_cursor() as cursor:
+            await cursor.execute(
+                database.Dashboard.SNAPSHOT_SQL,
+                database.Dashboard._snapshot_params(user_id, if_none_match, days_back, limit)
+            )
+            return await cursor.fetchone()
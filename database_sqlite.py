@@ -0,0 +1,938 @@
+"""
+Embedded SQLite storage for Daily Discover (DATABASE_URL=sqlite:///path/to.db)
+Same models, signatures and return shapes as database.py, which hands its
+User, Todo, GroceryItem, ActivityLog, ChangeVersions and Dashboard calls to
+this module when the URL selects it. The file runs in WAL mode with
+memory-mapped reads, so readers never wait on the writer: each thread reads
+on its own query_only connection, and every write goes through one shared
+connection behind a lock, in BEGIN IMMEDIATE transactions (writers in other
+processes wait on busy_timeout). Statements are constant strings, so each
+connection's statement cache prepares them once. The job queue, Gmail cache,
+read cache and live events need PostgreSQL and are off with this backend
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Optional, List, Dict, Any, Tuple
+from profiling import ProfiledSQLiteCursor, record_pool_wait
+from database import (
+    PoolMetrics,
+    clamp_page_size,
+    decode_cursor,
+    DEFAULT_PAGE_SIZE,
+    _page_result,
+)
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema_sqlite.sql')
+
+# Bytes of the file each connection maps into memory instead of read()ing
+MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+
+# How long a write waits on another process's write transaction
+BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+
+# Prepared statements kept per connection
+STATEMENT_CACHE_SIZE = 256
+
+# Timestamps are stored as UTC ISO 8601 text with milliseconds, matching the
+# schema's defaults, so comparing the text compares the times
+NOW_SQL = "strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')"
+
+def _adapt_timestamp(value: datetime) -> str:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).isoformat(timespec='milliseconds')
+
+sqlite3.register_adapter(datetime, _adapt_timestamp)
+sqlite3.register_converter('TIMESTAMPTZ', lambda value: datetime.fromisoformat(value.decode()))
+sqlite3.register_converter('BOOLEAN', lambda value: value == b'1')
+sqlite3.register_converter('JSON', json.loads)
+
+def _dict_row(cursor: sqlite3.Cursor, row: tuple) -> Dict[str, Any]:
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+def _to_json(value: Any) -> str:
+    return json.dumps(value, default=_json_default)
+
+def _parse_timestamp(value: Any) -> datetime:
+    """A timestamp from a page cursor, raising ValueError if it isn't one"""
+    if not isinstance(value, str):
+        raise ValueError('Invalid cursor')
+    return datetime.fromisoformat(value)
+
+
+class SQLiteDatabase:
+    """One database file: a lock-guarded writer connection and per-thread readers"""
+    
+    def __init__(self, path: str, write_timeout: float = 30.0):
+        self.path = path
+        self.write_timeout = write_timeout
+        self.metrics = PoolMetrics()
+        self._write_lock = threading.Lock()
+        self._writer_thread: Optional[int] = None
+        self._local = threading.local()
+        self._readers: List[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+        self._writer = self._connect()
+        # Persistent: once set, every connection to the file uses the WAL
+        self._writer.execute('PRAGMA journal_mode = WAL')
+    
+    def _connect(self, read_only: bool = False) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            detect_types=sqlite3.PARSE_DECLTYPES | sqlite3.PARSE_COLNAMES,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE
+        )
+        conn.row_factory = _dict_row
+        conn.execute(f'PRAGMA mmap_size = {MMAP_SIZE}')
+        conn.execute('PRAGMA foreign_keys = ON')
+        conn.execute('PRAGMA temp_store = MEMORY')
+        # Durable as of the last checkpoint rather than every commit, which
+        # is what makes WAL commits cheap on an SD card
+        conn.execute('PRAGMA synchronous = NORMAL')
+        if read_only:
+            conn.execute('PRAGMA query_only = ON')
+        return conn
+    
+    def reader(self) -> sqlite3.Connection:
+        """This thread's read connection, opened on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._connect(read_only=True)
+            self._local.conn = conn
+            with self._readers_lock:
+                self._readers.append(conn)
+        return conn
+    
+    @contextmanager
+    def write_transaction(self):
+        """The writer connection, inside BEGIN IMMEDIATE; commits on exit, rolls back on error"""
+        if self._writer_thread == threading.get_ident():
+            # The lock isn't reentrant; waiting on it here would only time out
+            raise RuntimeError('This thread already has a write transaction open; pass its session')
+        start = time.perf_counter()
+        if not self._write_lock.acquire(timeout=self.write_timeout):
+            self.metrics.timed_out()
+            raise TimeoutError('Timed out waiting for the SQLite writer')
+        wait_ms = (time.perf_counter() - start) * 1000
+        self.metrics.checked_out(wait_ms)
+        record_pool_wait(wait_ms)
+        self._writer_thread = threading.get_ident()
+        try:
+            # Take the write lock up front, so the transaction can't fail
+            # halfway through trying to upgrade from a read
+            self._writer.execute('BEGIN IMMEDIATE')
+            try:
+                yield self._writer
+            except BaseException:
+                self._writer.execute('ROLLBACK')
+                raise
+            else:
+                self._writer.execute('COMMIT')
+        finally:
+            self._writer_thread = None
+            self.metrics.checked_in()
+            self._write_lock.release()
+    
+    def reader_count(self) -> int:
+        with self._readers_lock:
+            return len(self._readers)
+    
+    def close(self):
+        with self._readers_lock:
+            for conn in self._readers:
+                conn.close()
+            self._readers = []
+        self._local = threading.local()
+        with self._write_lock:
+            self._writer.close()
+
+
+# The open database (None until init_db)
+_db: Optional[SQLiteDatabase] = None
+
+def init_db(path: str, write_timeout: Optional[float] = None):
+    """
+    Open the database file, creating it from schema_sqlite.sql if needed
+    The write lock timeout defaults to DB_POOL_TIMEOUT (30 seconds), like a
+    pool checkout
+    """
+    global _db
+    if _db is not None:
+        _db.close()
+    if write_timeout is None:
+        write_timeout = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    db = SQLiteDatabase(path, write_timeout)
+    with open(SCHEMA_PATH) as f:
+        schema = f.read()
+    with db.write_transaction() as conn:
+        for statement in _split_script(schema):
+            conn.execute(statement)
+        # Fresh statistics for the planner, cheap when nothing changed
+        conn.execute('PRAGMA optimize')
+    _db = db
+
+def _split_script(script: str) -> List[str]:
+    """
+    Complete statements of a SQL script (executescript would commit on its own,
+    outside the write lock)
+    """
+    statements, pending = [], ''
+    for line in script.splitlines(keepends=True):
+        pending += line
+        if sqlite3.complete_statement(pending):
+            if pending.strip():
+                statements.append(pending)
+            pending = ''
+    return statements
+
+def get_db() -> SQLiteDatabase:
+    """Get the open database"""
+    if _db is None:
+        raise RuntimeError("SQLite database not initialized. Call init_db() first.")
+    return _db
+
+def close_db():
+    """Close the database's connections"""
+    global _db
+    if _db:
+        _db.close()
+        _db = None
+
+@contextmanager
+def _read_cursor():
+    """A cursor on this thread's reader; each statement sees the latest commit"""
+    cursor = get_db().reader().cursor(ProfiledSQLiteCursor)
+    try:
+        yield cursor
+    finally:
+        cursor.close()
+
+@contextmanager
+def _read_transaction():
+    """A reader cursor whose statements all see one snapshot"""
+    with _read_cursor() as cursor:
+        cursor.execute('BEGIN')
+        try:
+            yield cursor
+        finally:
+            cursor.execute('COMMIT')
+
+def check_db_health(timeout: float = 2.0) -> Dict[str, Any]:
+    """Time a trivial query on this thread's reader"""
+    start = time.perf_counter()
+    try:
+        with _read_cursor() as cursor:
+            checked_out = time.perf_counter()
+            cursor.execute('SELECT 1').fetchone()
+        finished = time.perf_counter()
+        return {
+            'status': 'connected',
+            'latency_ms': round((finished - start) * 1000, 3),
+            'checkout_ms': round((checked_out - start) * 1000, 3),
+            'query_ms': round((finished - checked_out) * 1000, 3),
+        }
+    except Exception as e:
+        return {
+            'status': 'error',
+            'latency_ms': round((time.perf_counter() - start) * 1000, 3),
+            'error': str(e),
+        }
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Write lock waits, timeouts and open reader connections for this process"""
+    if _db is None:
+        return PoolMetrics().snapshot()
+    stats = _db.metrics.snapshot()
+    stats.update({
+        'backend': 'sqlite',
+        'size': 1 + _db.reader_count(),
+        'idle': 1 - stats['in_use'],
+        'readers': _db.reader_count(),
+    })
+    return stats
+
+
+class Session:
+    """
+    Unit of work on the writer: model operations that share one transaction
+    Model methods take session=... to join it
+    """
+    
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+    
+    def cursor(self) -> sqlite3.Cursor:
+        return self.conn.cursor(ProfiledSQLiteCursor)
+
+@contextmanager
+def db_session():
+    """Context manager for a unit of work; commits on exit, rolls back on error"""
+    with get_db().write_transaction() as conn:
+        yield Session(conn)
+
+@contextmanager
+def _session_cursor(session: Optional[Session] = None):
+    """A cursor in the session's transaction, or in a write transaction of its own"""
+    if session is None:
+        with db_session() as own_session:
+            cursor = own_session.cursor()
+            try:
+                yield cursor
+            finally:
+                cursor.close()
+    else:
+        cursor = session.cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+
+
+def fetch_page(cursor, query: str, params: Any, limit: int, key_columns: List[str]) -> Dict[str, Any]:
+    """database.fetch_page: up to limit rows and the next page's cursor"""
+    cursor.execute(query, params)
+    return _page_result(cursor.fetchall(), limit, key_columns)
+
+def fetch_json_page(cursor, query: str, params: Any, limit: int, key_columns: List[str]) -> Dict[str, Any]:
+    """
+    database.fetch_json_page's shape; the rows are encoded here, since
+    there is no server round trip for SQL-side JSON to save
+    """
+    page = fetch_page(cursor, query, params, limit, key_columns)
+    return {
+        'items_json': _to_json(page['items']),
+        'count': len(page['items']),
+        'next_cursor': page['next_cursor'],
+    }
+
+
+class User:
+    """User model"""
+    
+    CREATE_SQL = """
+        INSERT INTO users (username, email, password_hash)
+        VALUES (?, ?, ?)
+        RETURNING id, username, email, created_at AS "created_at [TIMESTAMPTZ]"
+    """
+    GET_BY_ID_SQL = "SELECT id, username, email, created_at, updated_at FROM users WHERE id = ?"
+    GET_BY_EMAIL_SQL = "SELECT * FROM users WHERE email = ?"
+    
+    @staticmethod
+    def create(username: str, email: str, password_hash: str) -> Dict[str, Any]:
+        """Create a new user"""
+        with _session_cursor() as cursor:
+            cursor.execute(User.CREATE_SQL, (username, email, password_hash))
+            return cursor.fetchone()
+    
+    @staticmethod
+    def get_by_id(user_id: str) -> Optional[Dict[str, Any]]:
+        """Get user by ID"""
+        with _read_cursor() as cursor:
+            cursor.execute(User.GET_BY_ID_SQL, (user_id,))
+            return cursor.fetchone()
+    
+    @staticmethod
+    def get_by_email(email: str) -> Optional[Dict[str, Any]]:
+        """Get user by email"""
+        with _read_cursor() as cursor:
+            cursor.execute(User.GET_BY_EMAIL_SQL, (email,))
+            return cursor.fetchone()
+
+
+class Todo:
+    """TODO item model"""
+    
+    # Sort key of get_page, in ORDER BY order
+    PAGE_KEYS = ['priority', 'created_at', 'id']
+    
+    # RETURNING columns carry no declared type, so the converters are named
+    RETURNING_SQL = """
+        RETURNING id, user_id, text, completed AS "completed [BOOLEAN]", priority,
+                  created_at AS "created_at [TIMESTAMPTZ]"
+    """
+    
+    MARK_COMPLETED_SQL = f"""
+        UPDATE todos
+        SET completed = ?,
+            completed_at = CASE WHEN ? THEN {NOW_SQL} ELSE NULL END,
+            updated_at = {NOW_SQL}
+        WHERE id = ?
+        RETURNING user_id
+    """
+    
+    @staticmethod
+    def _insert_sql(count: int) -> str:
+        values = ', '.join(['(?, ?, ?)'] * count)
+        return f"INSERT INTO todos (user_id, text, priority) VALUES {values} {Todo.RETURNING_SQL}"
+    
+    @staticmethod
+    def _insert_params(user_id: str, todos: List[Dict[str, Any]]) -> List[Any]:
+        params = []
+        for todo in todos:
+            params.extend((user_id, todo['text'], todo.get('priority', 0)))
+        return params
+    
+    @staticmethod
+    def create(user_id: str, text: str, priority: int = 0, session: Optional[Session] = None) -> Dict[str, Any]:
+        """Create a new TODO item"""
+        with _session_cursor(session) as cursor:
+            cursor.execute(Todo._insert_sql(1), (user_id, text, priority))
+            return cursor.fetchone()
+    
+    @staticmethod
+    def create_many(user_id: str, todos: List[Dict[str, Any]], session: Optional[Session] = None) -> List[Dict[str, Any]]:
+        """
+        Create several TODO items in one statement
+        Each entry needs 'text' and may set 'priority'
+        """
+        if not todos:
+            return []
+        
+        with _session_cursor(session) as cursor:
+            cursor.execute(Todo._insert_sql(len(todos)), Todo._insert_params(user_id, todos))
+            return cursor.fetchall()
+    
+    @staticmethod
+    def get_all(user_id: str, include_completed: bool = False) -> List[Dict[str, Any]]:
+        """Get all TODO items for a user"""
+        completed = '' if include_completed else 'AND completed = 0'
+        with _read_cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT * FROM todos
+                WHERE user_id = ? {completed}
+                ORDER BY priority DESC, created_at DESC
+                """,
+                (user_id,)
+            )
+            return cursor.fetchall()
+    
+    @staticmethod
+    def get_page(
+        user_id: str,
+        include_completed: bool = False,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        as_json: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Get a page of TODO items for a user, in get_all's order
+        Returns {'items': [...], 'next_cursor': str or None}, or with as_json
+        {'items_json': str, 'count': int, 'next_cursor': str or None}
+        Raises ValueError for a malformed cursor
+        """
+        limit = clamp_page_size(limit)
+        after = decode_cursor(cursor, 3) if cursor else None
+        if after:
+            after[1] = _parse_timestamp(after[1])
+        query, params = Todo._page_query(user_id, include_completed, limit, after)
+        with _read_cursor() as db_cursor:
+            return (fetch_json_page if as_json else fetch_page)(db_cursor, query, params, limit, Todo.PAGE_KEYS)
+    
+    @staticmethod
+    def _page_query(
+        user_id: str,
+        include_completed: bool,
+        limit: int,
+        after: Optional[List[Any]]
+    ) -> Tuple[str, List[Any]]:
+        """Keyset page query (limit + 1 rows, for fetch_page) and its params"""
+        conditions = ['user_id = ?']
+        params: List[Any] = [user_id]
+        if not include_completed:
+            conditions.append('completed = 0')
+        if after:
+            conditions.append('(priority, created_at, id) < (?, ?, ?)')
+            params.extend(after)
+        params.append(limit + 1)
+        return f"""
+            SELECT * FROM todos
+            WHERE {' AND '.join(conditions)}
+            ORDER BY priority DESC, created_at DESC, id DESC
+            LIMIT ?
+        """, params
+    
+    @staticmethod
+    def mark_completed(todo_id: str, completed: bool = True, session: Optional[Session] = None) -> bool:
+        """Mark a TODO as completed or uncompleted"""
+        with _session_cursor(session) as cursor:
+            cursor.execute(Todo.MARK_COMPLETED_SQL, (completed, completed, todo_id))
+            return cursor.fetchone() is not None
+
+
+class GroceryItem:
+    """Grocery item model"""
+    
+    # Sort key of get_active_page, in ORDER BY order
+    ACTIVE_PAGE_KEYS = ['created_at', 'id']
+    
+    RETURNING_SQL = """
+        RETURNING id, user_id, item_name, quantity, notes, is_active AS "is_active [BOOLEAN]",
+                  created_at AS "created_at [TIMESTAMPTZ]"
+    """
+    
+    # No FOR UPDATE needed: the write transaction already excludes other writers
+    ACTIVE_IDS_SQL = "SELECT id FROM grocery_items WHERE user_id = ? AND is_active = 1"
+    
+    CREATE_EVENT_SQL = """
+        INSERT INTO shopping_events (user_id, notes)
+        VALUES (?, ?)
+        RETURNING id, completed_at AS "completed_at [TIMESTAMPTZ]"
+    """
+    
+    ARCHIVE_SQL = f"""
+        UPDATE grocery_items
+        SET is_active = 0,
+            shopping_event_id = :event_id,
+            archived_at = :bought_at,
+            updated_at = {NOW_SQL}
+        WHERE user_id = :user_id AND is_active = 1
+          AND id IN (SELECT value FROM json_each(:item_ids))
+    """
+    
+    # Folds the trip just archived into the stats, as database.py's
+    # ARCHIVE_SQL does: items bought more than once on a trip count as one
+    # purchase, and the typical interval is the mean gap between trips
+    FOLD_STATS_SQL = """
+        INSERT INTO grocery_purchase_stats AS stats
+            (user_id, item_key, item_name, purchase_count, first_bought_at, last_bought_at)
+        SELECT :user_id, lower(trim(item_name)), min(trim(item_name)), 1, :bought_at, :bought_at
+        FROM grocery_items
+        WHERE shopping_event_id = :event_id
+        GROUP BY lower(trim(item_name))
+        ON CONFLICT (user_id, item_key) DO UPDATE SET
+            item_name = excluded.item_name,
+            purchase_count = stats.purchase_count + 1,
+            interval_seconds_total = stats.interval_seconds_total
+                + (julianday(excluded.last_bought_at) - julianday(stats.last_bought_at)) * 86400,
+            last_bought_at = excluded.last_bought_at,
+            next_due_at = strftime('%Y-%m-%dT%H:%M:%f+00:00', excluded.last_bought_at, printf('%+.3f seconds',
+                (stats.interval_seconds_total
+                    + (julianday(excluded.last_bought_at) - julianday(stats.last_bought_at)) * 86400)
+                / stats.purchase_count))
+    """
+    
+    DUE_SOON_SQL = """
+        SELECT stats.item_name, stats.purchase_count, stats.last_bought_at, stats.next_due_at,
+               stats.interval_seconds_total / (stats.purchase_count - 1) / 86400.0
+                   AS typical_interval_days
+        FROM grocery_purchase_stats stats
+        WHERE stats.user_id = ?
+          AND stats.next_due_at <= ?
+          AND NOT EXISTS (
+              SELECT 1 FROM grocery_items item
+              WHERE item.user_id = stats.user_id
+                AND item.is_active = 1
+                AND lower(trim(item.item_name)) = stats.item_key
+          )
+        ORDER BY stats.next_due_at
+        LIMIT ?
+    """
+    
+    @staticmethod
+    def _insert_sql(count: int) -> str:
+        values = ', '.join(['(?, ?, ?, ?)'] * count)
+        return f"""
+            INSERT INTO grocery_items (user_id, item_name, quantity, notes)
+            VALUES {values} {GroceryItem.RETURNING_SQL}
+        """
+    
+    @staticmethod
+    def _insert_params(user_id: str, items: List[Dict[str, Any]]) -> List[Any]:
+        params = []
+        for item in items:
+            params.extend((user_id, item['item_name'], item.get('quantity', 1), item.get('notes')))
+        return params
+    
+    @staticmethod
+    def create(
+        user_id: str,
+        item_name: str,
+        quantity: int = 1,
+        notes: Optional[str] = None,
+        session: Optional[Session] = None
+    ) -> Dict[str, Any]:
+        """Create a new grocery item"""
+        with _session_cursor(session) as cursor:
+            cursor.execute(GroceryItem._insert_sql(1), (user_id, item_name, quantity, notes))
+            return cursor.fetchone()
+    
+    @staticmethod
+    def create_many(user_id: str, items: List[Dict[str, Any]], session: Optional[Session] = None) -> List[Dict[str, Any]]:
+        """
+        Create several grocery items in one statement
+        Each entry needs 'item_name' and may set 'quantity' and 'notes'
+        """
+        if not items:
+            return []
+        
+        with _session_cursor(session) as cursor:
+            cursor.execute(GroceryItem._insert_sql(len(items)), GroceryItem._insert_params(user_id, items))
+            return cursor.fetchall()
+    
+    @staticmethod
+    def get_active(user_id: str) -> List[Dict[str, Any]]:
+        """Get all active grocery items for a user"""
+        with _read_cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT * FROM grocery_items
+                WHERE user_id = ? AND is_active = 1
+                ORDER BY created_at DESC
+                """,
+                (user_id,)
+            )
+            return cursor.fetchall()
+    
+    @staticmethod
+    def get_active_page(
+        user_id: str,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        as_json: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Get a page of active grocery items for a user, newest first
+        Returns {'items': [...], 'next_cursor': str or None}, or with as_json
+        {'items_json': str, 'count': int, 'next_cursor': str or None}
+        Raises ValueError for a malformed cursor
+        """
+        limit = clamp_page_size(limit)
+        after = decode_cursor(cursor, 2) if cursor else None
+        if after:
+            after[0] = _parse_timestamp(after[0])
+        query, params = GroceryItem._active_page_query(user_id, limit, after)
+        with _read_cursor() as db_cursor:
+            return (fetch_json_page if as_json else fetch_page)(
+                db_cursor, query, params, limit, GroceryItem.ACTIVE_PAGE_KEYS
+            )
+    
+    @staticmethod
+    def _active_page_query(user_id: str, limit: int, after: Optional[List[Any]]) -> Tuple[str, List[Any]]:
+        """Keyset page query (limit + 1 rows, for fetch_page) and its params"""
+        keyset = ''
+        params: List[Any] = [user_id]
+        if after:
+            keyset = 'AND (created_at, id) < (?, ?)'
+            params.extend(after)
+        params.append(limit + 1)
+        return f"""
+            SELECT * FROM grocery_items
+            WHERE user_id = ? AND is_active = 1
+            {keyset}
+            ORDER BY created_at DESC, id DESC
+            LIMIT ?
+        """, params
+    
+    @staticmethod
+    def archive_items(
+        user_id: str,
+        item_ids: List[str],
+        event_notes: Optional[str] = None,
+        session: Optional[Session] = None
+    ) -> str:
+        """Archive multiple grocery items by creating a shopping event"""
+        with _session_cursor(session) as cursor:
+            return GroceryItem._archive(cursor, user_id, item_ids, event_notes)
+    
+    @staticmethod
+    def checkout(user_id: str, notes: Optional[str] = None, session: Optional[Session] = None) -> Optional[Dict[str, Any]]:
+        """
+        Archive the whole active list as one shopping trip
+        Returns {'event_id': str, 'archived': int}, or None if the list is empty
+        """
+        with _session_cursor(session) as cursor:
+            cursor.execute(GroceryItem.ACTIVE_IDS_SQL, (user_id,))
+            item_ids = [row['id'] for row in cursor.fetchall()]
+            if not item_ids:
+                return None
+            
+            event_id = GroceryItem._archive(cursor, user_id, item_ids, notes)
+            return {'event_id': event_id, 'archived': len(item_ids)}
+    
+    @staticmethod
+    def _archive(cursor, user_id: str, item_ids: List[Any], event_notes: Optional[str]) -> str:
+        """Create a shopping event, move the items into it and fold the trip into grocery_purchase_stats"""
+        cursor.execute(GroceryItem.CREATE_EVENT_SQL, (user_id, event_notes))
+        event = cursor.fetchone()
+        params = {
+            'event_id': event['id'],
+            'user_id': user_id,
+            'item_ids': json.dumps([str(item_id) for item_id in item_ids]),
+            'bought_at': event['completed_at'],
+        }
+        cursor.execute(GroceryItem.ARCHIVE_SQL, params)
+        cursor.execute(GroceryItem.FOLD_STATS_SQL, params)
+        return event['id']
+    
+    @staticmethod
+    def get_due_soon(user_id: str, within_days: int = 3, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Items that are probably needed soon: bought at least twice, due within
+        within_days by their typical interval, and not already on the list
+        """
+        due_by = datetime.now(timezone.utc) + timedelta(days=within_days)
+        with _read_cursor() as cursor:
+            cursor.execute(GroceryItem.DUE_SOON_SQL, (user_id, due_by, limit))
+            return cursor.fetchall()
+
+
+class ActivityLog:
+    """Activity logging for observability"""
+    
+    INSERT_SQL = """
+        INSERT INTO activity_log
+        (user_id, action, entity_type, entity_id, details, ip_address, user_agent)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """
+    
+    RECENT_SQL = """
+        SELECT * FROM activity_log
+        WHERE user_id = ?
+        ORDER BY created_at DESC
+        LIMIT ?
+    """
+    
+    HOURLY_ROLLUP_SQL = """
+        INSERT INTO activity_rollups (granularity, bucket_start, action, entity_type, event_count)
+        SELECT 'hour', strftime('%Y-%m-%dT%H:00:00.000+00:00', created_at), action, coalesce(entity_type, ''), count(*)
+        FROM activity_log
+        WHERE created_at >= ? AND created_at < ?
+        GROUP BY 2, 3, 4
+        ON CONFLICT (granularity, bucket_start, action, entity_type) DO UPDATE SET
+            event_count = excluded.event_count
+    """
+    
+    DAILY_ROLLUP_SQL = """
+        INSERT INTO activity_rollups (granularity, bucket_start, action, entity_type, event_count)
+        SELECT 'day', strftime('%Y-%m-%dT00:00:00.000+00:00', bucket_start), action, entity_type, sum(event_count)
+        FROM activity_rollups
+        WHERE granularity = 'hour' AND bucket_start >= ? AND bucket_start < ?
+        GROUP BY 2, 3, 4
+        ON CONFLICT (granularity, bucket_start, action, entity_type) DO UPDATE SET
+            event_count = excluded.event_count
+    """
+    
+    @staticmethod
+    def log(
+        user_id: Optional[str],
+        action: str,
+        entity_type: Optional[str] = None,
+        entity_id: Optional[str] = None,
+        details: Optional[Dict[str, Any]] = None,
+        ip_address: Optional[str] = None,
+        user_agent: Optional[str] = None,
+        session: Optional[Session] = None
+    ):
+        """
+        Log an activity
+        Inside a session the entry is part of the session's transaction;
+        otherwise it is written in a transaction of its own
+        """
+        with _session_cursor(session) as cursor:
+            cursor.execute(
+                ActivityLog.INSERT_SQL,
+                (user_id, action, entity_type, entity_id,
+                 _to_json(details) if details else None,
+                 ip_address, user_agent)
+            )
+    
+    @staticmethod
+    def get_recent(user_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """Get recent activity for a user"""
+        with _read_cursor() as cursor:
+            cursor.execute(ActivityLog.RECENT_SQL, (user_id, limit))
+            return cursor.fetchall()
+    
+    @staticmethod
+    def roll_up(settle_seconds: int = 300) -> Dict[str, Any]:
+        """
+        Fold activity_log rows since the last run into the hourly and daily
+        rollups. Only hours that ended settle_seconds ago are rolled
+        Returns {'from': datetime or None, 'through': datetime}
+        """
+        end = _hour(datetime.now(timezone.utc) - timedelta(seconds=settle_seconds))
+        with _session_cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT rolled_through,
+                       (SELECT min(created_at) FROM activity_log) AS "oldest [TIMESTAMPTZ]"
+                FROM activity_rollup_state
+                """
+            )
+            state = cursor.fetchone()
+            start = state['rolled_through'] or (_hour(state['oldest']) if state['oldest'] else None)
+            
+            if start is not None and start < end:
+                cursor.execute(ActivityLog.HOURLY_ROLLUP_SQL, (start, end))
+                # Days are summed from their hours, so a partly rolled day is
+                # recomputed whole on the next run
+                cursor.execute(ActivityLog.DAILY_ROLLUP_SQL, (start.replace(hour=0), end))
+            
+            cursor.execute("UPDATE activity_rollup_state SET rolled_through = ?", (end,))
+            return {'from': start, 'through': end}
+    
+    @staticmethod
+    def maintain(retention_days: int = 90, hourly_retention_days: int = 400) -> Dict[str, Any]:
+        """
+        Roll up, then delete activity_log rows and hourly rollups past
+        retention (daily rollups are kept). There are no partitions here, so
+        the partition counts are always 0
+        """
+        rolled = ActivityLog.roll_up()
+        now = datetime.now(timezone.utc)
+        with _session_cursor() as cursor:
+            cursor.execute(
+                "DELETE FROM activity_log WHERE created_at < ?",
+                (now - timedelta(days=retention_days),)
+            )
+            rows_deleted = cursor.rowcount
+            cursor.execute(
+                "DELETE FROM activity_rollups WHERE granularity = 'hour' AND bucket_start < ?",
+                (now - timedelta(days=hourly_retention_days),)
+            )
+            return {
+                'partitions_created': 0,
+                'partitions_dropped': 0,
+                'activity_rows_deleted': rows_deleted,
+                'hourly_rollups_deleted': cursor.rowcount,
+                'rolled_through': rolled['through'].isoformat(),
+            }
+    
+    @staticmethod
+    def get_rollups(
+        granularity: str,
+        since: datetime,
+        until: Optional[datetime] = None,
+        action: Optional[str] = None,
+        entity_type: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Activity counts per hour or day bucket in [since, until), oldest first"""
+        conditions = ['granularity = ?', 'bucket_start >= ?']
+        params: List[Any] = [granularity, since]
+        if until is not None:
+            conditions.append('bucket_start < ?')
+            params.append(until)
+        if action is not None:
+            conditions.append('action = ?')
+            params.append(action)
+        if entity_type is not None:
+            conditions.append('entity_type = ?')
+            params.append(entity_type)
+        with _read_cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT bucket_start, action, entity_type, event_count
+                FROM activity_rollups
+                WHERE {' AND '.join(conditions)}
+                ORDER BY bucket_start, action, entity_type
+                """,
+                params
+            )
+            return cursor.fetchall()
+
+def _hour(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+class ChangeVersions:
+    """Per-user change counters bumped by the *_change_version triggers"""
+    
+    GET_SQL = "SELECT scope, version FROM change_versions WHERE user_id = ?"
+    
+    @staticmethod
+    def get(user_id: str) -> Dict[str, int]:
+        """Current version of each scope for a user, e.g. {'todos': 12}"""
+        with _read_cursor() as cursor:
+            cursor.execute(ChangeVersions.GET_SQL, (user_id,))
+            return {row['scope']: row['version'] for row in cursor.fetchall()}
+
+
+class Dashboard:
+    """Everything the dashboard page shows, read from one snapshot"""
+    
+    # database.Dashboard.SNAPSHOT_VERSION; the ETags have the same form
+    SNAPSHOT_VERSION = 1
+    
+    GMAIL_VERSION_SQL = "SELECT version, is_valid FROM oauth_tokens WHERE provider = 'gmail'"
+    
+    TODOS_SQL = """
+        SELECT * FROM todos
+        WHERE user_id = ? AND completed = 0
+        ORDER BY priority DESC, created_at DESC, id DESC
+        LIMIT ?
+    """
+    
+    GROCERIES_SQL = """
+        SELECT * FROM grocery_items
+        WHERE user_id = ? AND is_active = 1
+        ORDER BY created_at DESC, id DESC
+        LIMIT ?
+    """
+    
+    EMAILS_SQL = """
+        SELECT * FROM email_cache
+        WHERE user_id = ? AND is_unread = 1 AND received_at >= ?
+        ORDER BY received_at DESC, id DESC
+        LIMIT ?
+    """
+    
+    @staticmethod
+    def snapshot(
+        user_id: str,
+        if_none_match: Optional[List[str]] = None,
+        days_back: int = 20,
+        limit: int = DEFAULT_PAGE_SIZE
+    ) -> Dict[str, Any]:
+        """
+        Open todos, active groceries, unread emails and Gmail connection status,
+        tagged with an ETag built from the user's change_versions
+        Returns {'etag': str, 'snapshot_json': str}, with snapshot_json None
+        when the ETag is in if_none_match (the snapshot is then never built)
+        """
+        now = datetime.now(timezone.utc)
+        with _read_transaction() as cursor:
+            cursor.execute(ChangeVersions.GET_SQL, (user_id,))
+            versions = sorted(f"{row['scope']}{row['version']}" for row in cursor.fetchall())
+            cursor.execute(Dashboard.GMAIL_VERSION_SQL)
+            gmail = cursor.fetchone()
+            etag = '.'.join([
+                f'v{Dashboard.SNAPSHOT_VERSION}',
+                now.strftime('%Y%m%d'),
+                *(['.'.join(versions)] if versions else []),
+                f"gmail{gmail['version'] if gmail else 0}",
+            ])
+            if etag in (if_none_match or []):
+                return {'etag': etag, 'snapshot_json': None}
+            
+            cursor.execute(Dashboard.TODOS_SQL, (user_id, limit))
+            todos = cursor.fetchall()
+            cursor.execute(Dashboard.GROCERIES_SQL, (user_id, limit))
+            groceries = cursor.fetchall()
+            cursor.execute(Dashboard.EMAILS_SQL, (user_id, now - timedelta(days=days_back), limit))
+            emails = cursor.fetchall()
+        
+        return {
+            'etag': etag,
+            'snapshot_json': _to_json({
+                'todos': todos,
+                'groceries': groceries,
+                'emails': emails,
+                'gmail': {'authenticated': gmail is not None and bool(gmail['is_valid'])},
+            }),
+        }
@@ -20,6 +20,10 @@ echo "🐍 Installing Python dependencies..."
 uv pip install -r requirements.txt
 uv pip install -r requirements-prod.txt
 
+# 3. Prebuild the dashboard shell (hashed CSS/JS with gzip/brotli variants)
+echo "🧱 Building dashboard assets..."
+uv run python -m assets
+
 # Note: Blog (Astro) is deployed to Cloudflare Pages separately (blog/ subdirectory)
 # No Astro build needed on Pi
 
@@ -28,15 +32,17 @@ echo "🗄️  Checking database..."
 # Uncomment if you have migrations:
 # psql $DATABASE_URL < schema.sql
 
-# 5. Restart Flask service
-echo "🔄 Restarting Flask service..."
+# 5. Restart Flask service and background worker
+echo "🔄 Restarting Flask service and worker..."
 
-# Copy updated service file
+# Copy updated service files
 sudo cp systemd/daily-discover-flask.service /etc/systemd/system/
+sudo cp systemd/daily-discover-worker.service /etc/systemd/system/
 sudo systemctl daemon-reload
 
-# Restart Flask
+# Restart Flask and the worker
 sudo systemctl restart daily-discover-flask
+sudo systemctl restart daily-discover-worker
 
 # 6. Verify
 echo ""
@@ -20,6 +20,11 @@ echo -e "${BLUE}Starting Flask on port 8080...${NC}"
 python run.py &
 FLASK_PID=$!
 
+# Start the background job worker
+echo -e "${BLUE}Starting background worker...${NC}"
+python worker.py &
+WORKER_PID=$!
+
 echo ""
 echo -e "${GREEN}✓ Flask running at http://localhost:8080${NC}"
 echo -e "${GREEN}✓ Dashboard at http://localhost:8080/dashboard${NC}"
@@ -30,7 +35,7 @@ echo ""
 echo "Press CTRL+C to stop server"
 
 # Trap CTRL+C and cleanup
-trap "kill $FLASK_PID; exit" INT
+trap "kill $FLASK_PID $WORKER_PID; exit" INT
 
 # Wait for both processes
 wait
@@ -0,0 +1,320 @@
+"""
+Change notifications for Daily Discover
+One LISTEN connection per process receives the NOTIFYs that triggers on the
+todo, grocery and email tables send on commit ('<scope>:<user_id>'), whichever
+process made the write, and hands them to sinks: the read cache (cache.py) and
+the Server-Sent Events broker behind /api/events
+"""
+import asyncio
+import re
+import threading
+import weakref
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Set
+import psycopg
+
+# Channel the notify_cache_invalidate trigger in schema.sql notifies on
+CHANGE_CHANNEL = 'cache_invalidate'
+
+# Scopes with change versions, i.e. what a live client may need to reload
+SCOPES = ('emails', 'groceries', 'todos')
+
+
+class ChangeListener:
+    """
+    Background thread that LISTENs on a dedicated connection and passes each
+    change to its sinks. A sink implements on_listen() (now listening; changes
+    before this may have been missed), on_disconnect() and
+    on_change(scope, user_id) (user_id is None for a bare scope payload)
+    """
+    
+    def __init__(self, database_url: str, reconnect_delay: float = 5.0):
+        self.database_url = database_url
+        self.reconnect_delay = reconnect_delay
+        self.listening = False
+        self._sinks: List = []
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    def add_sink(self, sink):
+        self._sinks.append(sink)
+        if self.listening:
+            sink.on_listen()
+    
+    def remove_sink(self, sink):
+        if sink in self._sinks:
+            self._sinks.remove(sink)
+            sink.on_disconnect()
+    
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='change-listener', daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+    
+    def _dispatch(self, method: str, *args):
+        for sink in list(self._sinks):
+            try:
+                getattr(sink, method)(*args)
+            except Exception as e:
+                print(f"Change listener sink error ({method}): {e}")
+    
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                with psycopg.connect(self.database_url, autocommit=True) as conn:
+                    conn.execute(f'LISTEN {CHANGE_CHANNEL}')
+                    self.listening = True
+                    self._dispatch('on_listen')
+                    while not self._stop.is_set():
+                        for notify in conn.notifies(timeout=1.0):
+                            scope, _, user_id = notify.payload.partition(':')
+                            self._dispatch('on_change', scope, user_id or None)
+            except Exception as e:
+                print(f"Change listener error: {e}")
+            finally:
+                if self.listening:
+                    self.listening = False
+                    self._dispatch('on_disconnect')
+            self._stop.wait(self.reconnect_delay)
+
+
+_listener: Optional[ChangeListener] = None
+
+def get_change_listener(database_url: str) -> ChangeListener:
+    """The process's change listener, started on first use"""
+    global _listener
+    if _listener is None:
+        _listener = ChangeListener(database_url)
+        _listener.start()
+    return _listener
+
+def close_change_listener():
+    global _listener
+    if _listener:
+        _listener.stop()
+        _listener = None
+
+
+def version_tag(versions: Dict[str, int]) -> str:
+    """Event id for a user's change versions, e.g. 'emails3.groceries7.todos12'"""
+    return '.'.join(f'{scope}{versions.get(scope, 0)}' for scope in SCOPES)
+
+def parse_version_tag(tag: str) -> Dict[str, int]:
+    """Inverse of version_tag; unknown or malformed parts are ignored"""
+    versions = {}
+    for part in tag.split('.'):
+        match = re.fullmatch(r'([a-z_]+)(\d+)', part)
+        if match:
+            versions[match.group(1)] = int(match.group(2))
+    return versions
+
+
+class _Subscriber:
+    """
+    One open event stream; pending changes coalesce until it next wakes
+    Streams served from an event loop wait on an asyncio.Event, set from the
+    listener thread through the loop
+    """
+    
+    def __init__(self, user_id: str, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.user_id = user_id
+        self.pending: Set[str] = set()
+        self.event_id: Optional[str] = None
+        self.loop = loop
+        self.wakeup = threading.Event() if loop is None else asyncio.Event()
+    
+    def wake(self):
+        if self.loop is None:
+            self.wakeup.set()
+        else:
+            self.loop.call_soon_threadsafe(self.wakeup.set)
+
+
+class EventBroker:
+    """
+    Fans changes out to open /api/events streams
+    Each stream gets a 'change' event naming the scopes to reload, with the
+    user's version tag as its id, so a client reconnecting with Last-Event-ID
+    is told exactly which scopes changed while it was away
+    """
+    
+    def __init__(
+        self,
+        load_versions: Callable[[str], Dict[str, int]],
+        heartbeat: float = 15.0,
+        max_clients: int = 4,
+        retry_ms: int = 3000
+    ):
+        self.load_versions = load_versions
+        self.heartbeat = heartbeat
+        self.max_clients = max_clients
+        self.retry_ms = retry_ms
+        self._subscribers: Dict[str, Set[_Subscriber]] = {}
+        self._lock = threading.Lock()
+        self.events_sent = 0
+    
+    def client_count(self) -> int:
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+    
+    def stats(self):
+        return {
+            'clients': self.client_count(),
+            'max_clients': self.max_clients,
+            'events_sent': self.events_sent,
+        }
+    
+    def _publish(self, user_id: str, scopes: Set[str]):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        if not subscribers:
+            return
+        event_id = version_tag(self.load_versions(user_id))
+        for subscriber in subscribers:
+            with self._lock:
+                subscriber.pending |= scopes
+                subscriber.event_id = event_id
+            subscriber.wake()
+    
+    # Sink interface (see ChangeListener)
+    
+    def on_listen(self):
+        # Changes during a listener outage went unseen; have everyone recheck
+        with self._lock:
+            user_ids = list(self._subscribers)
+        for user_id in user_ids:
+            self._publish(user_id, set(SCOPES))
+    
+    def on_disconnect(self):
+        pass
+    
+    def on_change(self, scope: str, user_id: Optional[str]):
+        if scope not in SCOPES:
+            return
+        with self._lock:
+            user_ids = [user_id] if user_id else list(self._subscribers)
+        for changed_user_id in user_ids:
+            self._publish(changed_user_id, {scope})
+    
+    def stream(self, user_id: str, last_event_id: Optional[str] = None) -> Iterator[str]:
+        """
+        SSE stream for a user: a 'ready' event carrying the current id (or a
+        'change' event if Last-Event-ID is behind), then a 'change' event per
+        batch of changes, with a comment line every heartbeat seconds so
+        proxies keep the connection open and dead clients are noticed
+        Raises OverflowError when max_clients streams are already open
+        """
+        subscriber = self._subscribe(_Subscriber(user_id))
+        
+        def generate():
+            try:
+                yield from self._opening(self.load_versions(user_id), last_event_id)
+                while True:
+                    if not subscriber.wakeup.wait(self.heartbeat):
+                        yield ': heartbeat\n\n'
+                        continue
+                    yield self._take(subscriber)
+            finally:
+                release()
+        
+        stream = generate()
+        release = self._release_with(stream, subscriber)
+        return stream
+    
+    def astream(self, user_id: str, last_event_id: Optional[str] = None) -> AsyncIterator[str]:
+        """stream() for an event loop; an idle stream holds no thread"""
+        subscriber = self._subscribe(_Subscriber(user_id, asyncio.get_running_loop()))
+        
+        async def generate():
+            try:
+                current = await asyncio.to_thread(self.load_versions, user_id)
+                for message in self._opening(current, last_event_id):
+                    yield message
+                while True:
+                    try:
+                        await asyncio.wait_for(subscriber.wakeup.wait(), self.heartbeat)
+                    except asyncio.TimeoutError:
+                        yield ': heartbeat\n\n'
+                        continue
+                    yield self._take(subscriber)
+            finally:
+                release()
+        
+        stream = generate()
+        release = self._release_with(stream, subscriber)
+        return stream
+    
+    def _subscribe(self, subscriber: _Subscriber) -> _Subscriber:
+        """
+        Take a client slot, raising OverflowError when max_clients are taken
+        Counted and taken under one lock, so a burst of reconnects can't all
+        pass the check before any of them subscribes. Callers subscribe before
+        reading versions so no change falls in between
+        """
+        with self._lock:
+            if sum(len(subscribers) for subscribers in self._subscribers.values()) >= self.max_clients:
+                raise OverflowError('Too many live clients')
+            self._subscribers.setdefault(subscriber.user_id, set()).add(subscriber)
+        return subscriber
+    
+    def _release_with(self, stream, subscriber: _Subscriber) -> Callable[[], None]:
+        """
+        Unsubscribe once the stream finishes, or once it is garbage collected
+        if it never started (closing an unstarted generator skips its finally)
+        """
+        return weakref.finalize(stream, self._unsubscribe, subscriber)
+    
+    def _unsubscribe(self, subscriber: _Subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(subscriber.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[subscriber.user_id]
+    
+    def _opening(self, current: Dict[str, int], last_event_id: Optional[str]) -> List[str]:
+        """First messages of a stream: retry interval, then 'ready' or a catch-up 'change'"""
+        event_id = version_tag(current)
+        messages = [f'retry: {self.retry_ms}\n\n']
+        if last_event_id and last_event_id != event_id:
+            seen = parse_version_tag(last_event_id)
+            missed = [scope for scope in SCOPES if seen.get(scope) != current.get(scope, 0)]
+            messages.append(self._format('change', event_id, missed))
+        else:
+            messages.append(self._format('ready', event_id, []))
+        return messages
+    
+    def _take(self, subscriber: _Subscriber) -> str:
+        """The woken subscriber's pending changes as one 'change' event"""
+        with self._lock:
+            subscriber.wakeup.clear()
+            scopes = sorted(subscriber.pending)
+            subscriber.pending.clear()
+            event_id = subscriber.event_id
+        self.events_sent += 1
+        return self._format('change', event_id, scopes)
+    
+    @staticmethod
+    def _format(event: str, event_id: str, scopes: List[str]) -> str:
+        scope_list = ', '.join(f'"{scope}"' for scope in scopes)
+        return f'event: {event}\nid: {event_id}\ndata: {{"scopes": [{scope_list}]}}\n\n'
+
+
+_broker: Optional[EventBroker] = None
+
+def init_event_broker(database_url: str, load_versions: Callable[[str], Dict[str, int]], **kwargs) -> EventBroker:
+    """Start serving /api/events from this process's change listener"""
+    global _broker
+    if _broker is not None:
+        get_change_listener(database_url).remove_sink(_broker)
+    _broker = EventBroker(load_versions, **kwargs)
+    get_change_listener(database_url).add_sink(_broker)
+    return _broker
+
+def get_event_broker() -> Optional[EventBroker]:
+    return _broker
@@ -2,25 +2,85 @@
 Gmail API integration for Daily Discover
 """
 import os
+import json
 import pickle
+import threading
+import time
 from datetime import datetime, timedelta
-from typing import List, Dict, Any, Optional
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import Flow
-from googleapiclient.discovery import build
-from database import get_db_cursor
+from typing import TYPE_CHECKING, List, Dict, Any, Optional, Tuple, Iterator, Callable
+from database import get_db_cursor, fetch_page, fetch_json_page, decode_cursor, clamp_page_size, EMAIL_CACHE_COLUMNS
+import database_async
+from profiling import google_call
 import psycopg
 
+# The Google client libraries are imported on first Gmail use rather than
+# here: they are most of the app's import time, and most requests never
+# touch Gmail
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
+
 # Gmail API scopes
 SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
 
-# Token storage file
+# Token store key for Gmail credentials
+TOKEN_PROVIDER = 'gmail'
+
+# Legacy token file, imported into the token store on first use
 TOKEN_FILE = 'token.pickle'
 
+# How long cached credentials are trusted before checking the token store
+# for a newer version written by another worker
+TOKEN_RECHECK_SECONDS = int(os.environ.get('TOKEN_RECHECK_SECONDS', 30))
+
+# Headers requested for cached messages
+METADATA_HEADERS = ['From', 'To', 'Subject', 'Date']
+
+# Messages listed per page of a full scan
+PAGE_SIZE = 100
+
+# Sort key of cached email pages, in ORDER BY order
+EMAIL_PAGE_KEYS = ['received_at', 'id']
+
+# Sort key of email search pages: best match first, then newest
+EMAIL_SEARCH_KEYS = ['rank', 'received_at', 'id']
+
+# Text search configuration of email_cache.search_vector (schema.sql)
+SEARCH_CONFIG = 'english'
+
+# Snippets are short, so the whole snippet comes back with every match marked.
+# Gmail snippets are already HTML-escaped, so the result is safe as HTML
+HEADLINE_OPTIONS = 'StartSel=<mark>, StopSel=</mark>, HighlightAll=true'
+
+# Gmail accepts up to 100 calls per batch but starts rate limiting
+# concurrent requests well before that
+BATCH_SIZE = 50
+
+# Mailbox changes replayed by incremental syncs
+HISTORY_TYPES = ['messageAdded', 'messageDeleted', 'labelAdded', 'labelRemoved']
+
+# New messages with these labels are left out of the cache, like the
+# full scan's query does
+SKIPPED_LABELS = {'SPAM', 'TRASH', 'DRAFT'}
+
+# Cached credentials for this process
+_cache: Dict[str, Any] = {'creds': None, 'version': None, 'checked_at': None}
+_cache_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+_legacy_checked = False
+
+# Per-thread Gmail API clients
+_local = threading.local()
+
+
+def gmail_sync_key(user_id: str) -> str:
+    """Dedupe key that keeps one sync per mailbox in flight (see worker.py)"""
+    return f'gmail_sync:{user_id}'
+
 
 def get_gmail_auth_url(redirect_uri: str) -> str:
     """Generate Gmail OAuth authorization URL"""
+    from google_auth_oauthlib.flow import Flow
+    
     client_id = os.environ.get('GOOGLE_CLIENT_ID')
     client_secret = os.environ.get('GOOGLE_CLIENT_SECRET')
     
@@ -47,8 +107,10 @@ def get_gmail_auth_url(redirect_uri: str) -> str:
     return auth_url
 
 
-def handle_oauth_callback(code: str, redirect_uri: str) -> Credentials:
+def handle_oauth_callback(code: str, redirect_uri: str) -> 'Credentials':
     """Handle OAuth callback and exchange code for credentials"""
+    from google_auth_oauthlib.flow import Flow
+    
     client_id = os.environ.get('GOOGLE_CLIENT_ID')
     client_secret = os.environ.get('GOOGLE_CLIENT_SECRET')
     
@@ -66,122 +128,611 @@ def handle_oauth_callback(code: str, redirect_uri: str) -> Credentials:
         redirect_uri=redirect_uri
     )
     
-    flow.fetch_token(code=code)
+    with google_call():
+        flow.fetch_token(code=code)
     credentials = flow.credentials
     
-    # Save credentials to file
-    with open(TOKEN_FILE, 'wb') as token:
-        pickle.dump(credentials, token)
+    # Save credentials to the shared token store
+    with get_db_cursor() as cursor:
+        version = _save_token(cursor, credentials)
+    _set_cached_credentials(credentials, version)
     
     return credentials
 
 
-def get_credentials() -> Optional[Credentials]:
-    """Get stored credentials if they exist and are valid"""
-    creds = None
+def _save_token(cursor, creds: 'Credentials') -> int:
+    """Write credentials to the token store, returning the new version"""
+    cursor.execute(
+        """
+        INSERT INTO oauth_tokens (provider, token)
+        VALUES (%s, %s)
+        ON CONFLICT (provider) DO UPDATE SET
+            token = EXCLUDED.token,
+            version = oauth_tokens.version + 1,
+            is_valid = TRUE
+        RETURNING version
+        """,
+        (TOKEN_PROVIDER, psycopg.types.json.Jsonb(json.loads(creds.to_json())))
+    )
+    return cursor.fetchone()['version']
+
+
+def _invalidate_token(cursor) -> int:
+    """
+    Mark the stored token as rejected by Google, returning the new version
+    The row is kept for its version, which changes the dashboard ETag
+    """
+    cursor.execute(
+        """
+        UPDATE oauth_tokens SET is_valid = FALSE, version = version + 1, updated_at = CURRENT_TIMESTAMP
+        WHERE provider = %s
+        RETURNING version
+        """,
+        (TOKEN_PROVIDER,)
+    )
+    return cursor.fetchone()['version']
+
+
+def _credentials_from_row(row: Dict[str, Any]) -> 'Credentials':
+    """Rebuild credentials from a token store row"""
+    from google.oauth2.credentials import Credentials
+    return Credentials.from_authorized_user_info(row['token'], SCOPES)
+
+
+def _set_cached_credentials(creds: Optional['Credentials'], version: Optional[int]):
+    """Replace this process's cached credentials"""
+    with _cache_lock:
+        _cache['creds'] = creds
+        _cache['version'] = version
+        _cache['checked_at'] = time.monotonic()
+
+
+def _import_legacy_token():
+    """Move a token.pickle left by older versions into the token store"""
+    global _legacy_checked
+    _legacy_checked = True
+    if not os.path.exists(TOKEN_FILE):
+        return
     
-    if os.path.exists(TOKEN_FILE):
-        with open(TOKEN_FILE, 'rb') as token:
-            creds = pickle.load(token)
+    with open(TOKEN_FILE, 'rb') as token:
+        creds = pickle.load(token)
+    with get_db_cursor() as cursor:
+        cursor.execute(
+            "SELECT 1 FROM oauth_tokens WHERE provider = %s",
+            (TOKEN_PROVIDER,)
+        )
+        if cursor.fetchone() is None:
+            _save_token(cursor, creds)
+
+
+def _revalidate_cache():
+    """Reload cached credentials if the stored token has changed"""
+    if not _legacy_checked:
+        _import_legacy_token()
     
-    # Refresh credentials if expired
-    if creds and creds.expired and creds.refresh_token:
+    with get_db_cursor() as cursor:
+        cursor.execute(
+            "SELECT version FROM oauth_tokens WHERE provider = %s",
+            (TOKEN_PROVIDER,)
+        )
+        row = cursor.fetchone()
+        version = row['version'] if row else None
+        if version == _cache['version']:
+            with _cache_lock:
+                _cache['checked_at'] = time.monotonic()
+            return
+        
+        creds = None
+        if version is not None:
+            cursor.execute(
+                "SELECT token, version, is_valid FROM oauth_tokens WHERE provider = %s",
+                (TOKEN_PROVIDER,)
+            )
+            row = cursor.fetchone()
+            if row['is_valid']:
+                creds = _credentials_from_row(row)
+            version = row['version']
+    
+    _set_cached_credentials(creds, version)
+
+
+def _refresh_credentials(stale_version: int) -> Optional['Credentials']:
+    """
+    Refresh expired credentials, at most once across threads and workers
+    The token row stays locked while refreshing, so a worker that waited on
+    it picks up the refreshed token instead of refreshing again
+    """
+    with _refresh_lock:
+        # Another thread may have refreshed while we waited
+        if _cache['version'] != stale_version and _cache['creds'] and _cache['creds'].valid:
+            return _cache['creds']
+        
         try:
-            creds.refresh(Request())
-            # Save refreshed credentials
-            with open(TOKEN_FILE, 'wb') as token:
-                pickle.dump(creds, token)
+            with get_db_cursor() as cursor:
+                cursor.execute(
+                    "SELECT token, version, is_valid FROM oauth_tokens WHERE provider = %s FOR UPDATE",
+                    (TOKEN_PROVIDER,)
+                )
+                row = cursor.fetchone()
+                if row is None or not row['is_valid']:
+                    _set_cached_credentials(None, row['version'] if row else None)
+                    return None
+                
+                creds = _credentials_from_row(row)
+                version = row['version']
+                if creds.expired and creds.refresh_token:
+                    from google.auth.exceptions import RefreshError
+                    from google.auth.transport.requests import Request
+                    try:
+                        with google_call():
+                            creds.refresh(Request())
+                    except RefreshError as e:
+                        # Revoked or expired for good: only a new OAuth flow helps
+                        print(f"Gmail refresh token rejected, reconnect needed: {e}")
+                        version = _invalidate_token(cursor)
+                        creds = None
+                    else:
+                        version = _save_token(cursor, creds)
         except Exception as e:
             print(f"Error refreshing credentials: {e}")
             return None
+        
+        _set_cached_credentials(creds, version)
+        return creds
+
+
+def get_credentials() -> Optional['Credentials']:
+    """
+    Get stored credentials if they exist and are valid
+    Served from an in-process cache that is checked against the token store's
+    version at most every TOKEN_RECHECK_SECONDS once credentials are loaded
+    """
+    # Without cached credentials, always look: another worker may have just
+    # finished the OAuth flow
+    checked_at = _cache['checked_at']
+    if _cache['creds'] is None or time.monotonic() - checked_at > TOKEN_RECHECK_SECONDS:
+        try:
+            _revalidate_cache()
+        except Exception as e:
+            print(f"Error loading credentials: {e}")
+            return None
+    
+    creds = _cache['creds']
+    
+    # Refresh credentials if expired
+    if creds and creds.expired and creds.refresh_token:
+        creds = _refresh_credentials(_cache['version'])
     
     return creds if creds and creds.valid else None
 
 
-def sync_gmail_messages(user_id: str, days_back: int = 20) -> Dict[str, Any]:
+def get_gmail_service():
     """
-    Sync Gmail messages from the last N days
-    Returns summary of synced messages
+    Get a Gmail API client for the stored credentials, or None if not authenticated
+    Clients are built once per thread (they aren't thread-safe) and rebuilt
+    only when the stored token changes
     """
     creds = get_credentials()
     if not creds:
-        return {'success': False, 'error': 'Not authenticated'}
+        return None
+    
+    cached = getattr(_local, 'gmail', None)
+    if cached and cached[0] is creds:
+        return cached[1]
     
+    from googleapiclient.discovery import build
+    from googleapiclient.http import build_http
+    from google_auth_httplib2 import AuthorizedHttp
+    
+    # The transport build() would make, timed for the request profile
+    # (batch requests go through it too)
+    http = build_http()
+    send = http.request
+    
+    def timed_request(*args, **kwargs):
+        with google_call():
+            return send(*args, **kwargs)
+    
+    http.request = timed_request
+    service = build('gmail', 'v1', http=AuthorizedHttp(creds, http=http), cache_discovery=False)
+    _local.gmail = (creds, service)
+    return service
+
+
+def _fetch_message_metadata(service, message_ids: List[str]) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    Fetch message metadata using batched HTTP requests
+    Returns the fetched messages and the number of per-message failures
+    """
+    messages = []
+    failed = 0
+
+    def on_response(request_id, response, exception):
+        nonlocal failed
+        if exception is not None:
+            print(f"Error fetching message {request_id}: {exception}")
+            failed += 1
+        else:
+            messages.append(response)
+
+    for start in range(0, len(message_ids), BATCH_SIZE):
+        batch = service.new_batch_http_request(callback=on_response)
+        for message_id in message_ids[start:start + BATCH_SIZE]:
+            batch.add(
+                service.users().messages().get(
+                    userId='me',
+                    id=message_id,
+                    format='metadata',
+                    metadataHeaders=METADATA_HEADERS
+                ),
+                request_id=message_id
+            )
+        batch.execute()
+
+    return messages, failed
+
+
+def _parse_message(message: Dict[str, Any]) -> Dict[str, Any]:
+    """Extract the email_cache columns from a metadata-format message"""
+    headers = {h['name']: h['value'] for h in message['payload']['headers']}
+    labels = message.get('labelIds', [])
+
+    # Parse date
+    date_str = headers.get('Date', '')
     try:
-        # Build Gmail service
-        service = build('gmail', 'v1', credentials=creds)
+        received_at = datetime.strptime(date_str.split(' (')[0], '%a, %d %b %Y %H:%M:%S %z')
+    except:
+        received_at = datetime.now()
+
+    return {
+        'gmail_id': message['id'],
+        'thread_id': message['threadId'],
+        'subject': headers.get('Subject', '(No Subject)'),
+        'sender': headers.get('From', ''),
+        'recipient': headers.get('To', ''),
+        'snippet': message.get('snippet', ''),
+        'is_unread': 'UNREAD' in labels,
+        'received_at': received_at,
+        'labels': labels,
+    }
+
+
+def _upsert_emails(cursor, user_id: str, emails: List[Dict[str, Any]]) -> int:
+    """
+    Insert or update parsed emails in a single multi-row statement
+    Returns the number of newly inserted rows
+    """
+    # ON CONFLICT can't touch the same row twice in one statement
+    emails = list({email['gmail_id']: email for email in emails}.values())
+    if not emails:
+        return 0
+
+    values = ', '.join(['(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s::text[])'] * len(emails))
+    params = []
+    for email in emails:
+        params.extend((
+            user_id, email['gmail_id'], email['thread_id'], email['subject'],
+            email['sender'], email['recipient'], email['snippet'],
+            email['is_unread'], email['received_at'], email['labels']
+        ))
+
+    cursor.execute(
+        f"""
+        INSERT INTO email_cache 
+        (user_id, gmail_id, thread_id, subject, sender, recipient, snippet, is_unread, received_at, labels)
+        VALUES {values}
+        ON CONFLICT (gmail_id) DO UPDATE SET
+            is_unread = EXCLUDED.is_unread,
+            labels = EXCLUDED.labels,
+            synced_at = CURRENT_TIMESTAMP
+        RETURNING (xmax = 0) AS inserted
+        """,
+        params
+    )
+    return sum(1 for row in cursor.fetchall() if row['inserted'])
+
+
+def _update_labels(cursor, user_id: str, labels_by_id: Dict[str, List[str]]) -> int:
+    """Apply label changes to cached emails without refetching headers"""
+    if not labels_by_id:
+        return 0
+
+    values = ', '.join(['(%s, %s::text[])'] * len(labels_by_id))
+    params = []
+    for gmail_id, labels in labels_by_id.items():
+        params.extend((gmail_id, labels))
+    params.append(user_id)
+
+    cursor.execute(
+        f"""
+        UPDATE email_cache e
+        SET labels = v.labels,
+            is_unread = 'UNREAD' = ANY(v.labels),
+            synced_at = CURRENT_TIMESTAMP
+        FROM (VALUES {values}) AS v(gmail_id, labels)
+        WHERE e.gmail_id = v.gmail_id AND e.user_id = %s
+        """,
+        params
+    )
+    return cursor.rowcount
+
+
+def _get_sync_state(user_id: str) -> Optional[Dict[str, Any]]:
+    """Get the stored Gmail sync watermark and scan checkpoint for a user"""
+    with get_db_cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT history_id, scan_query, scan_page_token, scan_history_id
+            FROM gmail_sync_state WHERE user_id = %s
+            """,
+            (user_id,)
+        )
+        result = cursor.fetchone()
+        return dict(result) if result else None
+
+
+def _save_history_id(cursor, user_id: str, history_id: int):
+    """Advance the Gmail historyId watermark for a user"""
+    cursor.execute(
+        """
+        INSERT INTO gmail_sync_state (user_id, history_id)
+        VALUES (%s, %s)
+        ON CONFLICT (user_id) DO UPDATE SET history_id = EXCLUDED.history_id
+        """,
+        (user_id, history_id)
+    )
+
+
+def _start_scan(user_id: str, query: str, history_id: int):
+    """Record a new full scan so it can be resumed if interrupted"""
+    with get_db_cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO gmail_sync_state (user_id, scan_query, scan_history_id)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (user_id) DO UPDATE SET
+                scan_query = EXCLUDED.scan_query,
+                scan_page_token = NULL,
+                scan_history_id = EXCLUDED.scan_history_id
+            """,
+            (user_id, query, history_id)
+        )
+
+
+def _clear_scan(user_id: str):
+    """Drop the checkpoint of a scan that can't be resumed"""
+    with get_db_cursor() as cursor:
+        cursor.execute(
+            """
+            UPDATE gmail_sync_state SET
+                scan_query = NULL,
+                scan_page_token = NULL,
+                scan_history_id = NULL
+            WHERE user_id = %s
+            """,
+            (user_id,)
+        )
+
+
+def _checkpoint_scan(cursor, user_id: str, next_page_token: Optional[str]):
+    """
+    Save the page token the scan should continue from
+    The last page promotes the scan's historyId to the sync watermark
+    """
+    if next_page_token:
+        cursor.execute(
+            "UPDATE gmail_sync_state SET scan_page_token = %s WHERE user_id = %s",
+            (next_page_token, user_id)
+        )
+    else:
+        cursor.execute(
+            """
+            UPDATE gmail_sync_state SET
+                history_id = scan_history_id,
+                last_full_sync_at = CURRENT_TIMESTAMP,
+                scan_query = NULL,
+                scan_page_token = NULL,
+                scan_history_id = NULL
+            WHERE user_id = %s
+            """,
+            (user_id,)
+        )
+
+
+def _iter_message_pages(service, query: str, page_token: Optional[str] = None) -> Iterator[Tuple[List[str], Optional[str]]]:
+    """Yield (message ids, next page token) for each page of a messages.list query"""
+    while True:
+        results = service.users().messages().list(
+            userId='me',
+            q=query,
+            maxResults=PAGE_SIZE,
+            pageToken=page_token
+        ).execute()
+        page_token = results.get('nextPageToken')
+        yield [msg['id'] for msg in results.get('messages', [])], page_token
+        if not page_token:
+            return
+
+
+def _iter_email_pages(service, pages: Iterator[Tuple[List[str], Optional[str]]]) -> Iterator[Tuple[List[Dict[str, Any]], int, int, Optional[str]]]:
+    """Yield (parsed emails, failed count, listed count, next page token) for each page of ids"""
+    for message_ids, next_page_token in pages:
+        fetched, failed = _fetch_message_metadata(service, message_ids)
+        yield [_parse_message(message) for message in fetched], failed, len(message_ids), next_page_token
+
+
+def _full_sync(
+    service,
+    user_id: str,
+    days_back: int,
+    resume_from: Optional[Dict[str, Any]] = None,
+    on_progress: Optional[Callable[[Dict[str, Any]], None]] = None
+) -> Dict[str, Any]:
+    """
+    Scan the unread messages from the last N days one page at a time
+    Each page is upserted together with a checkpoint of the next page token,
+    so an interrupted scan picks up where it stopped
+    """
+    if resume_from:
+        query = resume_from['scan_query']
+        page_token = resume_from['scan_page_token']
+    else:
+        # Read the mailbox position before listing, so anything that changes
+        # during the scan is replayed by the next incremental sync
+        history_id = int(service.users().getProfile(userId='me').execute()['historyId'])
         
         # Calculate date filter
         after_date = datetime.now() - timedelta(days=days_back)
         query = f'is:unread after:{after_date.strftime("%Y/%m/%d")}'
+        page_token = None
+        _start_scan(user_id, query, history_id)
+    
+    progress = {'pages': 0, 'listed': 0, 'synced': 0, 'new': 0, 'failed': 0}
+    
+    # Only one page of messages is held in memory at a time
+    pages = _iter_email_pages(service, _iter_message_pages(service, query, page_token))
+    for emails, failed, listed, next_page_token in pages:
+        with get_db_cursor() as cursor:
+            new_count = _upsert_emails(cursor, user_id, emails)
+            _checkpoint_scan(cursor, user_id, next_page_token)
         
-        # Fetch messages
-        results = service.users().messages().list(
+        progress['pages'] += 1
+        progress['listed'] += listed
+        progress['synced'] += len(emails)
+        progress['new'] += new_count
+        progress['failed'] += failed
+        if on_progress:
+            on_progress(dict(progress))
+    
+    return {
+        'success': True,
+        'mode': 'resumed' if resume_from else 'full',
+        'synced': progress['synced'],
+        'new': progress['new'],
+        'failed': progress['failed'],
+        'pages': progress['pages'],
+        'total_messages': progress['listed']
+    }
+
+
+def _incremental_sync(service, user_id: str, start_history_id: int) -> Dict[str, Any]:
+    """
+    Apply mailbox changes since the stored historyId
+    Raises HttpError 404 if the watermark is too old for Gmail to replay
+    """
+    added = {}
+    deleted = set()
+    labels_by_id = {}
+    page_token = None
+    
+    while True:
+        results = service.users().history().list(
             userId='me',
-            q=query,
-            maxResults=100
+            startHistoryId=start_history_id,
+            historyTypes=HISTORY_TYPES,
+            pageToken=page_token
         ).execute()
         
-        messages = results.get('messages', [])
-        synced_count = 0
-        new_count = 0
+        # Records are in chronological order, so later changes win
+        for record in results.get('history', []):
+            for change in record.get('messagesAdded', []):
+                message = change['message']
+                added[message['id']] = message.get('labelIds', [])
+                deleted.discard(message['id'])
+            for change in record.get('messagesDeleted', []):
+                message_id = change['message']['id']
+                added.pop(message_id, None)
+                labels_by_id.pop(message_id, None)
+                deleted.add(message_id)
+            for key in ('labelsAdded', 'labelsRemoved'):
+                for change in record.get(key, []):
+                    message = change['message']
+                    if message['id'] in added:
+                        added[message['id']] = message.get('labelIds', [])
+                    elif message['id'] not in deleted:
+                        labels_by_id[message['id']] = message.get('labelIds', [])
+        
+        page_token = results.get('nextPageToken')
+        if not page_token:
+            break
+    
+    history_id = int(results['historyId'])
+    
+    # Only new unread mail is cached, matching the full scan's query
+    new_ids = [
+        message_id for message_id, labels in added.items()
+        if 'UNREAD' in labels and not SKIPPED_LABELS.intersection(labels)
+    ]
+    fetched, failed = _fetch_message_metadata(service, new_ids)
+    emails = [_parse_message(message) for message in fetched]
+    
+    with get_db_cursor() as cursor:
+        new_count = _upsert_emails(cursor, user_id, emails)
+        updated_count = _update_labels(cursor, user_id, labels_by_id)
+        deleted_count = 0
+        if deleted:
+            cursor.execute(
+                "DELETE FROM email_cache WHERE user_id = %s AND gmail_id = ANY(%s)",
+                (user_id, list(deleted))
+            )
+            deleted_count = cursor.rowcount
+        _save_history_id(cursor, user_id, history_id)
+    
+    return {
+        'success': True,
+        'mode': 'incremental',
+        'synced': len(emails) + updated_count,
+        'new': new_count,
+        'updated': updated_count,
+        'deleted': deleted_count,
+        'failed': failed,
+        'total_messages': len(added) + len(labels_by_id) + len(deleted)
+    }
+
+
+def sync_gmail_messages(
+    user_id: str,
+    days_back: int = 20,
+    full: bool = False,
+    on_progress: Optional[Callable[[Dict[str, Any]], None]] = None
+) -> Dict[str, Any]:
+    """
+    Sync Gmail messages
+    Resumes an interrupted full scan, otherwise replays changes since the last
+    sync when a historyId watermark is stored, otherwise (or when full=True)
+    scans the unread messages from the last N days
+    on_progress is called with running counters after each page of a scan
+    Returns summary of synced messages
+    """
+    service = get_gmail_service()
+    if not service:
+        return {'success': False, 'error': 'Not authenticated'}
+    from googleapiclient.errors import HttpError
+    
+    try:
+        state = None if full else _get_sync_state(user_id)
+        if state and state['scan_query']:
+            try:
+                return _full_sync(service, user_id, days_back, resume_from=state, on_progress=on_progress)
+            except HttpError as e:
+                # Page tokens don't last forever; a rejected one would fail
+                # every later sync, so start the scan over instead
+                if e.resp.status not in (400, 404):
+                    raise
+                print(f"Gmail rejected the saved scan page token ({e.resp.status}); restarting the full scan")
+                _clear_scan(user_id)
+                return _full_sync(service, user_id, days_back, on_progress=on_progress)
         
-        for msg in messages:
-            # Get full message details
-            message = service.users().messages().get(
-                userId='me',
-                id=msg['id'],
-                format='metadata',
-                metadataHeaders=['From', 'To', 'Subject', 'Date']
-            ).execute()
-            
-            # Extract metadata
-            headers = {h['name']: h['value'] for h in message['payload']['headers']}
-            
-            gmail_id = message['id']
-            thread_id = message['threadId']
-            subject = headers.get('Subject', '(No Subject)')
-            sender = headers.get('From', '')
-            recipient = headers.get('To', '')
-            snippet = message.get('snippet', '')
-            labels = message.get('labelIds', [])
-            
-            # Parse date
-            date_str = headers.get('Date', '')
+        if state and state['history_id'] is not None:
             try:
-                received_at = datetime.strptime(date_str.split(' (')[0], '%a, %d %b %Y %H:%M:%S %z')
-            except:
-                received_at = datetime.now()
-            
-            is_unread = 'UNREAD' in labels
-            
-            # Insert or update in database
-            with get_db_cursor() as cursor:
-                cursor.execute(
-                    """
-                    INSERT INTO email_cache 
-                    (user_id, gmail_id, thread_id, subject, sender, recipient, snippet, is_unread, received_at, labels)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (gmail_id) DO UPDATE SET
-                        is_unread = EXCLUDED.is_unread,
-                        labels = EXCLUDED.labels,
-                        synced_at = CURRENT_TIMESTAMP
-                    RETURNING (xmax = 0) AS inserted
-                    """,
-                    (user_id, gmail_id, thread_id, subject, sender, recipient, 
-                     snippet, is_unread, received_at, labels)
-                )
-                result = cursor.fetchone()
-                if result['inserted']:
-                    new_count += 1
-                synced_count += 1
+                return _incremental_sync(service, user_id, state['history_id'])
+            except HttpError as e:
+                # Gmail only keeps about a week of history; an expired
+                # watermark returns 404 and needs a full re-scan
+                if e.resp.status != 404:
+                    raise
         
-        return {
-            'success': True,
-            'synced': synced_count,
-            'new': new_count,
-            'total_messages': len(messages)
-        }
+        return _full_sync(service, user_id, days_back, on_progress=on_progress)
         
     except Exception as e:
         return {
@@ -194,34 +745,158 @@ def get_cached_emails(user_id: str, days_back: int = 20, unread_only: bool = Tru
     """
     Get cached email messages from database
     """
-    with get_db_cursor() as cursor:
-        after_date = datetime.now() - timedelta(days=days_back)
-        
-        if unread_only:
-            cursor.execute(
-                """
-                SELECT * FROM email_cache
-                WHERE user_id = %s 
-                AND received_at >= %s
-                AND is_unread = TRUE
-                ORDER BY received_at DESC
-                LIMIT 50
-                """,
-                (user_id, after_date)
-            )
-        else:
-            cursor.execute(
-                """
-                SELECT * FROM email_cache
-                WHERE user_id = %s 
-                AND received_at >= %s
-                ORDER BY received_at DESC
-                LIMIT 50
-                """,
-                (user_id, after_date)
-            )
-        
-        return [dict(row) for row in cursor.fetchall()]
+    return get_cached_email_page(user_id, days_back=days_back, unread_only=unread_only, limit=50)['items']
+
+
+def get_cached_email_page(
+    user_id: str,
+    days_back: int = 20,
+    unread_only: bool = True,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    as_json: bool = False
+) -> Dict[str, Any]:
+    """
+    Get a page of cached email messages, newest first
+    Returns {'items': [...], 'next_cursor': str or None}, or with as_json
+    {'items_json': str, 'count': int, 'next_cursor': str or None}
+    Raises ValueError for a malformed cursor
+    """
+    limit = clamp_page_size(limit, default=50)
+    query, params = email_page_query(user_id, days_back, unread_only, limit, cursor)
+    with get_db_cursor() as db_cursor:
+        return (fetch_json_page if as_json else fetch_page)(db_cursor, query, params, limit, EMAIL_PAGE_KEYS)
+
+
+async def get_cached_email_page_async(
+    user_id: str,
+    days_back: int = 20,
+    unread_only: bool = True,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    as_json: bool = False
+) -> Dict[str, Any]:
+    """get_cached_email_page on the async pool (see database_async.py)"""
+    limit = clamp_page_size(limit, default=50)
+    query, params = email_page_query(user_id, days_back, unread_only, limit, cursor)
+    async with database_async.get_db_cursor() as db_cursor:
+        fetch = database_async.fetch_json_page if as_json else database_async.fetch_page
+        return await fetch(db_cursor, query, params, limit, EMAIL_PAGE_KEYS)
+
+
+def email_page_query(
+    user_id: str,
+    days_back: int,
+    unread_only: bool,
+    limit: int,
+    cursor: Optional[str]
+) -> Tuple[str, List[Any]]:
+    """Keyset page query over email_cache (limit + 1 rows) and its params"""
+    after_date = datetime.now() - timedelta(days=days_back)
+    
+    conditions = ['user_id = %s', 'received_at >= %s']
+    params: List[Any] = [user_id, after_date]
+    if unread_only:
+        conditions.append('is_unread = TRUE')
+    if cursor:
+        conditions.append('(received_at, id) < (%s::timestamptz, %s::uuid)')
+        params.extend(decode_cursor(cursor, 2))
+    params.append(limit + 1)
+    return f"""
+        SELECT {EMAIL_CACHE_COLUMNS} FROM email_cache
+        WHERE {' AND '.join(conditions)}
+        ORDER BY received_at DESC, id DESC
+        LIMIT %s
+    """, params
+
+
+def search_cached_emails(
+    user_id: str,
+    query: Optional[str] = None,
+    labels: Optional[List[str]] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    as_json: bool = False
+) -> Dict[str, Any]:
+    """
+    Search cached email by subject, sender and snippet words (web search
+    syntax: "quoted phrases", OR, -excluded) and/or labels, best match first
+    Each item carries its rank and a highlighted snippet
+    Returns the same page shapes as get_cached_email_page
+    Raises ValueError for a malformed cursor or a search with no terms
+    """
+    limit = clamp_page_size(limit, default=50)
+    sql, params = email_search_query(user_id, query, labels, limit, cursor)
+    with get_db_cursor() as db_cursor:
+        return (fetch_json_page if as_json else fetch_page)(db_cursor, sql, params, limit, EMAIL_SEARCH_KEYS)
+
+
+async def search_cached_emails_async(
+    user_id: str,
+    query: Optional[str] = None,
+    labels: Optional[List[str]] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    as_json: bool = False
+) -> Dict[str, Any]:
+    """search_cached_emails on the async pool (see database_async.py)"""
+    limit = clamp_page_size(limit, default=50)
+    sql, params = email_search_query(user_id, query, labels, limit, cursor)
+    async with database_async.get_db_cursor() as db_cursor:
+        fetch = database_async.fetch_json_page if as_json else database_async.fetch_page
+        return await fetch(db_cursor, sql, params, limit, EMAIL_SEARCH_KEYS)
+
+
+def email_search_query(
+    user_id: str,
+    query: Optional[str],
+    labels: Optional[List[str]],
+    limit: int,
+    cursor: Optional[str]
+) -> Tuple[str, List[Any]]:
+    """
+    Ranked keyset page query over email_cache (limit + 1 rows) and its params
+    Matching rows come from the GIN indexes; only they are ranked, and only
+    the page is highlighted
+    """
+    query = (query or '').strip()
+    labels = [label for label in (labels or []) if label]
+    if not query and not labels:
+        raise ValueError('Search needs a query or a label')
+    
+    conditions = ['user_id = %s']
+    params: List[Any] = [query, user_id]
+    if query:
+        conditions.append('search_vector @@ terms.tsquery')
+    if labels:
+        conditions.append('labels @> %s::text[]')
+        params.append(labels)
+    keyset = ''
+    if cursor:
+        keyset = 'WHERE (rank, received_at, id) < (%s::real, %s::timestamptz, %s::uuid)'
+        params.extend(decode_cursor(cursor, 3))
+    params.append(limit + 1)
+    # A label-only search ranks everything equally, so it pages newest first
+    rank = 'ts_rank(search_vector, terms.tsquery)' if query else '0::real'
+    return f"""
+        WITH terms AS (
+            SELECT websearch_to_tsquery('{SEARCH_CONFIG}', %s) AS tsquery
+        ),
+        hits AS (
+            SELECT * FROM (
+                SELECT {EMAIL_CACHE_COLUMNS}, {rank} AS rank
+                FROM email_cache, terms
+                WHERE {' AND '.join(conditions)}
+            ) matches
+            {keyset}
+            ORDER BY rank DESC, received_at DESC, id DESC
+            LIMIT %s
+        )
+        SELECT hits.*,
+               ts_headline('{SEARCH_CONFIG}', coalesce(snippet, ''), terms.tsquery, '{HEADLINE_OPTIONS}') AS highlight
+        FROM hits, terms
+        ORDER BY rank DESC, received_at DESC, id DESC
+    """, params
 
 
 def is_authenticated() -> bool:
@@ -0,0 +1,34 @@
+"""
+Gunicorn settings for Daily Discover
+    gunicorn -c gunicorn.conf.py asgi:application
+The app is imported once in the master (preload_app), so workers boot without
+re-importing and share its code pages copy-on-write. Nothing opens a
+connection at import; each worker starts its own pool, listener and writer
+in post_fork (the ASGI lifespan does the same for uvicorn workers)
+"""
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8080')
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'uvicorn.workers.UvicornWorker')
+# Only used by -k gthread (gunicorn app:app)
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+preload_app = True
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-')
+errorlog = os.environ.get('GUNICORN_ERROR_LOG', '-')
+
+
+def when_ready(server):
+    # Load (or build) the dashboard assets once, before workers fork
+    from assets import get_dashboard_assets
+    get_dashboard_assets()
+
+
+def post_fork(server, worker):
+    from app import init_services
+    init_services()
+
+
+def worker_exit(server, worker):
+    from app import close_services
+    close_services()
@@ -0,0 +1,308 @@
+"""
+Per-request profiling for Daily Discover
+Each request gets a RequestProfile (held in a context variable, so it follows
+the request through threads' own contexts and asyncio tasks) that the pool
+checkout, the database cursors and the Gmail HTTP client add to. Finished
+profiles go out as a Server-Timing header, feed per-route histograms served
+by /api/metrics, and slow requests are logged with their statements
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+import psycopg
+
+# Requests slower than this are logged with their statements
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', 500))
+
+# Distinct statements kept per request for the slow log
+MAX_STATEMENTS = 50
+
+# Histogram bucket bounds: seconds, and queries per request
+TIME_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class RequestProfile:
+    """Where one request's time went"""
+    
+    def __init__(self, method: str, route: str):
+        self.method = method
+        self.route = route
+        self.start = time.perf_counter()
+        self.total_ms = 0.0
+        self.pool_wait_ms = 0.0
+        self.sql_ms = 0.0
+        self.queries = 0
+        self.google_ms = 0.0
+        self.google_calls = 0
+        # statement text -> [executions, total ms]
+        self.statements: Dict[str, List[float]] = {}
+    
+    def add_query(self, query: Any, elapsed_ms: float):
+        self.queries += 1
+        self.sql_ms += elapsed_ms
+        text = _statement_text(query)
+        entry = self.statements.get(text)
+        if entry is not None:
+            entry[0] += 1
+            entry[1] += elapsed_ms
+        elif len(self.statements) < MAX_STATEMENTS:
+            self.statements[text] = [1, elapsed_ms]
+    
+    def finish(self):
+        self.total_ms = (time.perf_counter() - self.start) * 1000
+    
+    def server_timing(self) -> str:
+        """Server-Timing header value, e.g. 'pool;dur=0.4, db;dur=3.1;desc="2 queries", total;dur=5.2'"""
+        parts = [
+            f'pool;dur={self.pool_wait_ms:.1f}',
+            f'db;dur={self.sql_ms:.1f};desc="{self.queries} queries"',
+        ]
+        if self.google_calls:
+            parts.append(f'google;dur={self.google_ms:.1f};desc="{self.google_calls} calls"')
+        parts.append(f'total;dur={self.total_ms:.1f}')
+        return ', '.join(parts)
+
+
+def _statement_text(query: Any) -> str:
+    if isinstance(query, bytes):
+        query = query.decode(errors='replace')
+    elif not isinstance(query, str):
+        try:
+            query = query.as_string(None)
+        except Exception:
+            query = str(query)
+    return re.sub(r'\s+', ' ', query).strip()
+
+
+_current: ContextVar[Optional[RequestProfile]] = ContextVar('request_profile', default=None)
+
+def current_profile() -> Optional[RequestProfile]:
+    return _current.get()
+
+def start_request(method: str, route: str) -> RequestProfile:
+    profile = RequestProfile(method, route)
+    _current.set(profile)
+    return profile
+
+def finish_request(status: int) -> Optional[RequestProfile]:
+    """Close the current profile, record it and log it if slow"""
+    profile = _current.get()
+    if profile is None:
+        return None
+    _current.set(None)
+    profile.finish()
+    metrics.observe(profile, status)
+    if profile.total_ms >= SLOW_REQUEST_MS:
+        _log_slow_request(profile, status)
+    return profile
+
+def _log_slow_request(profile: RequestProfile, status: int):
+    lines = [
+        f"Slow request: {profile.method} {profile.route} -> {status} in {profile.total_ms:.1f}ms "
+        f"(pool {profile.pool_wait_ms:.1f}ms, sql {profile.sql_ms:.1f}ms over {profile.queries} queries, "
+        f"google {profile.google_ms:.1f}ms over {profile.google_calls} calls)"
+    ]
+    by_time = sorted(profile.statements.items(), key=lambda item: item[1][1], reverse=True)
+    for text, (count, elapsed_ms) in by_time[:10]:
+        lines.append(f"    {elapsed_ms:8.1f}ms x{int(count)}  {text[:300]}")
+    print('\n'.join(lines))
+
+
+def record_pool_wait(elapsed_ms: float):
+    profile = _current.get()
+    if profile is not None:
+        profile.pool_wait_ms += elapsed_ms
+
+@contextmanager
+def google_call():
+    """Time an outbound Google API call (HTTP request or token refresh)"""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.google_calls += 1
+        profile.google_ms += (time.perf_counter() - start) * 1000
+
+
+class ProfiledCursor(psycopg.Cursor):
+    """
+    Cursor that adds its statements to the current request's profile; set as
+    the pool's cursor_factory. In a pipelined session execute() only queues
+    the statement, so the time lands on the statement that syncs
+    """
+    
+    def execute(self, query, params=None, **kwargs):
+        profile = _current.get()
+        if profile is None:
+            return super().execute(query, params, **kwargs)
+        start = time.perf_counter()
+        try:
+            return super().execute(query, params, **kwargs)
+        finally:
+            profile.add_query(query, (time.perf_counter() - start) * 1000)
+    
+    def executemany(self, query, params_seq, **kwargs):
+        profile = _current.get()
+        if profile is None:
+            return super().executemany(query, params_seq, **kwargs)
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, params_seq, **kwargs)
+        finally:
+            profile.add_query(query, (time.perf_counter() - start) * 1000)
+    
+    @contextmanager
+    def copy(self, statement, params=None, **kwargs):
+        profile = _current.get()
+        start = time.perf_counter()
+        try:
+            with super().copy(statement, params, **kwargs) as copy:
+                yield copy
+        finally:
+            if profile is not None:
+                profile.add_query(statement, (time.perf_counter() - start) * 1000)
+
+
+class ProfiledAsyncCursor(psycopg.AsyncCursor):
+    """ProfiledCursor for the async pool (database_async)"""
+    
+    async def execute(self, query, params=None, **kwargs):
+        profile = _current.get()
+        if profile is None:
+            return await super().execute(query, params, **kwargs)
+        start = time.perf_counter()
+        try:
+            return await super().execute(query, params, **kwargs)
+        finally:
+            profile.add_query(query, (time.perf_counter() - start) * 1000)
+    
+    async def executemany(self, query, params_seq, **kwargs):
+        profile = _current.get()
+        if profile is None:
+            return await super().executemany(query, params_seq, **kwargs)
+        start = time.perf_counter()
+        try:
+            return await super().executemany(query, params_seq, **kwargs)
+        finally:
+            profile.add_query(query, (time.perf_counter() - start) * 1000)
+
+
+class ProfiledSQLiteCursor(sqlite3.Cursor):
+    """ProfiledCursor for the embedded SQLite backend (database_sqlite)"""
+    
+    def execute(self, query, params=()):
+        profile = _current.get()
+        if profile is None:
+            return super().execute(query, params)
+        start = time.perf_counter()
+        try:
+            return super().execute(query, params)
+        finally:
+            profile.add_query(query, (time.perf_counter() - start) * 1000)
+    
+    def executemany(self, query, params_seq):
+        profile = _current.get()
+        if profile is None:
+            return super().executemany(query, params_seq)
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, params_seq)
+        finally:
+            profile.add_query(query, (time.perf_counter() - start) * 1000)
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense"""
+    
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+    
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += value
+        self.count += 1
+
+
+class RequestMetrics:
+    """Per-route histograms of the profiles of finished requests (per process)"""
+    
+    # name -> (help, buckets, value from a profile)
+    HISTOGRAMS = {
+        'daily_discover_request_duration_seconds': (
+            'Request latency', TIME_BUCKETS, lambda p: p.total_ms / 1000),
+        'daily_discover_pool_wait_seconds': (
+            'Time waiting for a pooled database connection', TIME_BUCKETS, lambda p: p.pool_wait_ms / 1000),
+        'daily_discover_sql_seconds': (
+            'Time executing SQL', TIME_BUCKETS, lambda p: p.sql_ms / 1000),
+        'daily_discover_sql_queries': (
+            'Statements executed per request', COUNT_BUCKETS, lambda p: p.queries),
+        'daily_discover_google_api_seconds': (
+            'Time in outbound Google API calls', TIME_BUCKETS, lambda p: p.google_ms / 1000),
+    }
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, str, str], Histogram] = {}
+        self._responses: Dict[Tuple[str, str, str], int] = {}
+    
+    def observe(self, profile: RequestProfile, status: int):
+        with self._lock:
+            for name, (_, buckets, value) in self.HISTOGRAMS.items():
+                key = (name, profile.method, profile.route)
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = Histogram(buckets)
+                histogram.observe(value(profile))
+            status_key = (profile.method, profile.route, str(status))
+            self._responses[status_key] = self._responses.get(status_key, 0) + 1
+    
+    def render(self, extra: Optional[Dict[str, Tuple[str, str, float]]] = None) -> str:
+        """Prometheus text exposition, plus other metrics given as name -> (type, help, value)"""
+        lines = [
+            '# HELP daily_discover_responses_total Responses by route and status',
+            '# TYPE daily_discover_responses_total counter',
+        ]
+        with self._lock:
+            for (method, route, status), count in sorted(self._responses.items()):
+                lines.append(
+                    f'daily_discover_responses_total{{method="{method}",route="{_label(route)}",status="{status}"}} {count}'
+                )
+            for name, (help_text, _, _) in self.HISTOGRAMS.items():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for (metric, method, route), histogram in sorted(self._histograms.items()):
+                    if metric != name:
+                        continue
+                    labels = f'method="{method}",route="{_label(route)}"'
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        lines.append(f'{name}_bucket{{{labels},le="{bound:g}"}} {count}')
+                    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+                    lines.append(f'{name}_sum{{{labels}}} {histogram.total:.6f}')
+                    lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+        for name, (metric_type, help_text, value) in (extra or {}).items():
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            lines.append(f'{name} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def _label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"')
+
+
+metrics = RequestMetrics()
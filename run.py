@@ -1,14 +1,20 @@
 #!/usr/bin/env python
 """
 Simple startup script for Daily Discover
-Runs Flask without debugger to avoid pool issues
+Runs the Flask development server; FLASK_DEBUG=1 enables the debugger and reloader
 """
 import os
-from app import app
+from app import app, create_app
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8080))
     host = os.environ.get('HOST', '0.0.0.0')
+    debug = os.environ.get('FLASK_DEBUG', '0').lower() in ('1', 'true')
+    
+    # With the reloader, only the child process serves requests; the watching
+    # parent doesn't need a pool
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        create_app()
     
     print(f"Starting Daily Discover server on http://{host}:{port}")
     print("Gmail integration enabled")
@@ -17,6 +23,6 @@ if __name__ == '__main__':
     app.run(
         host=host,
         port=port,
-        debug=False,  # Disable debug to avoid pool restart issues
-        use_reloader=False
+        debug=debug,
+        use_reloader=debug
     )
@@ -48,6 +48,20 @@ CREATE TABLE shopping_events (
     notes TEXT
 );
 
+-- Per-item purchase history, folded in at checkout (see GroceryItem._archive)
+-- so suggestions never scan archived grocery_items
+CREATE TABLE grocery_purchase_stats (
+    user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+    item_key VARCHAR(255) NOT NULL,  -- lower(btrim(item_name))
+    item_name VARCHAR(255) NOT NULL,
+    purchase_count INTEGER NOT NULL DEFAULT 1,
+    interval_seconds_total DOUBLE PRECISION NOT NULL DEFAULT 0,
+    first_bought_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    last_bought_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    next_due_at TIMESTAMP WITH TIME ZONE,  -- NULL until bought twice
+    PRIMARY KEY (user_id, item_key)
+);
+
 -- Add foreign key to grocery_items after shopping_events is created
 ALTER TABLE grocery_items 
     ADD CONSTRAINT fk_shopping_event 
@@ -60,13 +74,19 @@ CREATE TABLE calendar_events (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
     user_id UUID REFERENCES users(id) ON DELETE CASCADE,
     external_id VARCHAR(255) UNIQUE NOT NULL,
-    calendar_source VARCHAR(50) NOT NULL, -- 'google', 'icloud'
+    calendar_source VARCHAR(50) NOT NULL, -- Feed name from CALENDAR_FEEDS ('google', 'icloud', ...)
     title VARCHAR(500) NOT NULL,
     description TEXT,
     start_time TIMESTAMP WITH TIME ZONE NOT NULL,
     end_time TIMESTAMP WITH TIME ZONE NOT NULL,
     location VARCHAR(500),
     is_all_day BOOLEAN DEFAULT FALSE,
+    content_hash VARCHAR(64), -- SHA-256 of the synced fields; unchanged events aren't rewritten
+    -- The time the event occupies, for overlap (&&) queries; a zero-length
+    -- event still occupies its instant
+    during TSTZRANGE GENERATED ALWAYS AS (
+        tstzrange(start_time, end_time, CASE WHEN end_time > start_time THEN '[)' ELSE '[]' END)
+    ) STORED,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     synced_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
@@ -86,7 +106,46 @@ CREATE TABLE email_cache (
     received_at TIMESTAMP WITH TIME ZONE NOT NULL,
     labels TEXT[], -- Array of label names
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-    synced_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    synced_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    -- Full-text search document, kept current by Postgres on every write.
+    -- Weights rank subject matches above sender above snippet; queries must
+    -- use the same 'english' configuration (see gmail_service.py)
+    search_vector TSVECTOR GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(subject, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(sender, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(snippet, '')), 'C')
+    ) STORED
+);
+
+-- Gmail sync watermarks (one row per user)
+CREATE TABLE gmail_sync_state (
+    user_id UUID PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    history_id BIGINT, -- Mailbox historyId the cache is current as of
+    last_full_sync_at TIMESTAMP WITH TIME ZONE,
+    scan_query TEXT, -- Full scan in progress, NULL when none
+    scan_page_token TEXT, -- Next page of the scan in progress
+    scan_history_id BIGINT, -- Watermark to adopt once the scan finishes
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- OAuth tokens shared by all web and worker processes
+CREATE TABLE oauth_tokens (
+    provider VARCHAR(50) PRIMARY KEY, -- 'gmail'
+    token JSONB NOT NULL, -- Serialized google.oauth2 credentials
+    version INTEGER NOT NULL DEFAULT 1, -- Bumped on every write
+    is_valid BOOLEAN NOT NULL DEFAULT TRUE, -- FALSE once Google rejects the refresh token
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Per-user, per-scope counters bumped on every change to the scope's table
+-- (see notify_cache_invalidate); the dashboard ETag is built from them
+CREATE TABLE change_versions (
+    user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+    scope VARCHAR(50) NOT NULL, -- 'todos', 'groceries', 'emails'
+    version BIGINT NOT NULL DEFAULT 1,
+    PRIMARY KEY (user_id, scope)
 );
 
 -- Blog posts metadata (content stored as markdown files)
@@ -96,44 +155,199 @@ CREATE TABLE blog_posts (
     slug VARCHAR(255) UNIQUE NOT NULL, -- URL-friendly identifier
     title VARCHAR(500) NOT NULL,
     excerpt TEXT, -- Short summary/preview
-    file_path VARCHAR(500) NOT NULL, -- Path to markdown file relative to posts/
+    file_path VARCHAR(500) UNIQUE NOT NULL, -- Path to markdown file relative to blog/src/content/blog/; one row per file
     published_at TIMESTAMP WITH TIME ZONE,
     is_draft BOOLEAN DEFAULT TRUE,
     tags TEXT[], -- Array of tag names
+    content_hash VARCHAR(64), -- SHA-256 of the file as last indexed (see blog_service.py)
+    file_mtime_ns BIGINT, -- File mtime as last indexed; unchanged files aren't reread
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
--- Activity log for observability
+-- Activity log for observability, partitioned by month so retention drops
+-- whole partitions (see drop_activity_log_partitions) instead of deleting rows
 CREATE TABLE activity_log (
-    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    id UUID NOT NULL DEFAULT uuid_generate_v4(),
     user_id UUID REFERENCES users(id) ON DELETE CASCADE,
     action VARCHAR(100) NOT NULL, -- 'grocery_added', 'todo_completed', etc.
     entity_type VARCHAR(50), -- 'grocery', 'todo', 'email', etc.
     entity_id UUID,
     details JSONB, -- Flexible JSON for additional context
     ip_address INET,
-    user_agent TEblog_posts_user_id ON blog_posts(user_id);
-CREATE INDEX idx_blog_posts_slug ON blog_posts(slug);
-CREATE INDEX idx_blog_posts_published_at ON blog_posts(published_at);
-CREATE INDEX idx_blog_posts_is_draft ON blog_posts(is_draft);
-CREATE INDEX idx_XT,
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    user_agent TEXT,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+-- Catches rows outside the monthly partitions; stays empty as long as the
+-- worker's activity_maintenance job keeps partitions created ahead. Rows that
+-- land here anyway move to their month's partition once it is created, and
+-- expired ones are deleted by ActivityLog.maintain
+CREATE TABLE activity_log_default PARTITION OF activity_log DEFAULT;
+
+-- Create monthly partitions (activity_log_YYYY_MM) for this month and the
+-- next months_ahead months; returns how many were created
+-- Postgres refuses a partition whose range has rows in the default
+-- partition, so those are moved out of it with the default detached
+CREATE OR REPLACE FUNCTION create_activity_log_partitions(months_ahead INTEGER DEFAULT 2)
+RETURNS INTEGER AS $$
+DECLARE
+    month_start DATE;
+    month_end DATE;
+    partition_name TEXT;
+    created INTEGER := 0;
+BEGIN
+    FOR i IN 0..months_ahead LOOP
+        month_start := (date_trunc('month', CURRENT_DATE) + make_interval(months => i))::date;
+        month_end := (month_start + interval '1 month')::date;
+        partition_name := 'activity_log_' || to_char(month_start, 'YYYY_MM');
+        IF to_regclass(partition_name) IS NULL THEN
+            IF EXISTS (
+                SELECT 1 FROM activity_log_default
+                WHERE created_at >= month_start AND created_at < month_end
+            ) THEN
+                ALTER TABLE activity_log DETACH PARTITION activity_log_default;
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF activity_log FOR VALUES FROM (%L) TO (%L)',
+                    partition_name, month_start, month_end
+                );
+                EXECUTE format(
+                    'WITH moved AS (
+                        DELETE FROM activity_log_default
+                        WHERE created_at >= %L AND created_at < %L
+                        RETURNING *
+                    )
+                    INSERT INTO %I SELECT * FROM moved',
+                    month_start, month_end, partition_name
+                );
+                ALTER TABLE activity_log ATTACH PARTITION activity_log_default DEFAULT;
+            ELSE
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF activity_log FOR VALUES FROM (%L) TO (%L)',
+                    partition_name, month_start, month_end
+                );
+            END IF;
+            created := created + 1;
+        END IF;
+    END LOOP;
+    RETURN created;
+END;
+$$ language 'plpgsql';
+
+-- Drop monthly partitions that end before now() - retain; returns how many
+CREATE OR REPLACE FUNCTION drop_activity_log_partitions(retain INTERVAL)
+RETURNS INTEGER AS $$
+DECLARE
+    partition_name TEXT;
+    dropped INTEGER := 0;
+BEGIN
+    FOR partition_name IN
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE pg_inherits.inhparent = 'activity_log'::regclass
+          AND child.relname ~ '^activity_log_\d{4}_\d{2}$'
+    LOOP
+        IF to_date(right(partition_name, 7), 'YYYY_MM') + interval '1 month'
+                <= CURRENT_TIMESTAMP - retain THEN
+            EXECUTE format('DROP TABLE %I', partition_name);
+            dropped := dropped + 1;
+        END IF;
+    END LOOP;
+    RETURN dropped;
+END;
+$$ language 'plpgsql';
+
+SELECT create_activity_log_partitions(2);
+
+-- Activity counts per hour and per day, maintained from activity_log by the
+-- worker (ActivityLog.roll_up) and kept after the raw rows are dropped
+CREATE TABLE activity_rollups (
+    granularity VARCHAR(10) NOT NULL, -- 'hour' or 'day'
+    bucket_start TIMESTAMP WITH TIME ZONE NOT NULL,
+    action VARCHAR(100) NOT NULL,
+    entity_type VARCHAR(50) NOT NULL DEFAULT '', -- '' when the entry had none
+    event_count INTEGER NOT NULL,
+    PRIMARY KEY (granularity, bucket_start, action, entity_type)
+);
+
+-- activity_log rows before rolled_through are reflected in activity_rollups
+CREATE TABLE activity_rollup_state (
+    id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+    rolled_through TIMESTAMP WITH TIME ZONE
+);
+INSERT INTO activity_rollup_state (id) VALUES (TRUE);
+
+-- Background job queue (consumed by worker.py)
+CREATE TABLE jobs (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+    kind VARCHAR(100) NOT NULL, -- 'gmail_sync', etc.
+    payload JSONB NOT NULL DEFAULT '{}',
+    dedupe_key VARCHAR(255), -- Jobs sharing a key never run concurrently
+    status VARCHAR(20) NOT NULL DEFAULT 'queued', -- 'queued', 'running', 'succeeded', 'failed'
+    progress JSONB,
+    result JSONB,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    run_after TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    locked_by VARCHAR(255),
+    locked_at TIMESTAMP WITH TIME ZONE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP WITH TIME ZONE
+);
+
+-- Next run of each periodic job
+CREATE TABLE job_schedules (
+    name VARCHAR(100) PRIMARY KEY,
+    next_run_at TIMESTAMP WITH TIME ZONE NOT NULL
 );
 
 -- Create indexes for better query performance
-CREATE INDEX idx_todos_user_id ON todos(user_id);
-CREATE INDEX idx_todos_completed ON todos(completed);
 CREATE INDEX idx_grocery_items_user_id ON grocery_items(user_id);
-CREATE INDEX idx_grocery_items_active ON grocery_items(is_active);
 CREATE INDEX idx_grocery_items_shopping_event ON grocery_items(shopping_event_id);
 CREATE INDEX idx_calendar_events_user_id ON calendar_events(user_id);
 CREATE INDEX idx_calendar_events_start_time ON calendar_events(start_time);
-CREATE INDEX idx_email_cache_user_id ON email_cache(user_id);
-CREATE INDEX idx_email_cache_received_at ON email_cache(received_at);
-CREATE INDEX idx_email_cache_unread ON email_cache(is_unread);
-CREATE INDEX idx_activity_log_user_id ON activity_log(user_id);
-CREATE INDEX idx_activity_log_created_at ON activity_log(created_at);
+CREATE INDEX idx_calendar_events_during ON calendar_events USING GIST (during);
+CREATE INDEX idx_activity_log_user_created ON activity_log(user_id, created_at DESC);
+CREATE INDEX idx_activity_log_created_at ON activity_log USING BRIN (created_at);
+CREATE INDEX idx_blog_posts_user_id ON blog_posts(user_id);
+CREATE INDEX idx_blog_posts_slug ON blog_posts(slug);
+CREATE INDEX idx_blog_posts_published_at ON blog_posts(published_at);
+CREATE INDEX idx_blog_posts_is_draft ON blog_posts(is_draft);
+CREATE INDEX idx_blog_posts_tags ON blog_posts USING GIN (tags);
+CREATE INDEX idx_jobs_runnable ON jobs(run_after) WHERE status = 'queued';
+CREATE INDEX idx_jobs_running ON jobs(locked_at) WHERE status = 'running';
+
+-- List endpoints page by keyset, so each index leads with user_id followed by
+-- the endpoint's exact sort order (id breaks ties). The todo and grocery
+-- indexes INCLUDE the remaining columns so pages come from index-only scans
+CREATE INDEX idx_todos_open ON todos(user_id, priority DESC, created_at DESC, id DESC)
+    INCLUDE (text, completed, updated_at, completed_at)
+    WHERE completed = FALSE;
+CREATE INDEX idx_todos_user_order ON todos(user_id, priority DESC, created_at DESC, id DESC);
+CREATE INDEX idx_grocery_items_active ON grocery_items(user_id, created_at DESC, id DESC)
+    INCLUDE (item_name, quantity, notes, is_active, shopping_event_id, updated_at, archived_at)
+    WHERE is_active = TRUE;
+CREATE INDEX idx_blog_posts_published ON blog_posts(user_id, published_at DESC, id DESC)
+    WHERE is_draft = FALSE;
+CREATE INDEX idx_grocery_purchase_stats_due ON grocery_purchase_stats(user_id, next_due_at)
+    WHERE next_due_at IS NOT NULL;
+CREATE INDEX idx_email_cache_unread ON email_cache(user_id, received_at DESC, id DESC)
+    WHERE is_unread = TRUE;
+CREATE INDEX idx_email_cache_user_received ON email_cache(user_id, received_at DESC, id DESC);
+
+-- Email search: text matches and label containment (labels @> ARRAY[...])
+-- each come from a GIN index instead of a scan of the user's mail
+CREATE INDEX idx_email_cache_search ON email_cache USING GIN (search_vector);
+CREATE INDEX idx_email_cache_labels ON email_cache USING GIN (labels);
+
+-- At most one queued and one running job per dedupe key
+CREATE UNIQUE INDEX idx_jobs_dedupe_queued ON jobs(dedupe_key) WHERE status = 'queued';
+CREATE UNIQUE INDEX idx_jobs_dedupe_running ON jobs(dedupe_key) WHERE status = 'running';
 
 -- Create updated_at trigger function
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -154,11 +368,84 @@ CREATE TRIGGER update_todos_updated_at BEFORE UPDATE ON todos
 CREATE TRIGGER update_grocery_items_updated_at BEFORE UPDATE ON grocery_items
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
-CREATE TRIGGER update_calendar_events_updated_at BEFORE UPDAT
+CREATE TRIGGER update_calendar_events_updated_at BEFORE UPDATE ON calendar_events
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
 CREATE TRIGGER update_blog_posts_updated_at BEFORE UPDATE ON blog_posts
-    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();E ON calendar_events
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
-CREATE TRIGGER update_email_cache_updated_at BEFORE UPDATE ON email_cache
+CREATE TRIGGER update_gmail_sync_state_updated_at BEFORE UPDATE ON gmail_sync_state
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+CREATE TRIGGER update_oauth_tokens_updated_at BEFORE UPDATE ON oauth_tokens
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+CREATE TRIGGER update_jobs_updated_at BEFORE UPDATE ON jobs
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+-- Bump the change version of each user a statement touched, for the scope
+-- (the dashboard ETag is built from these), and notify listening web workers
+-- that their cached reads are stale (see cache.py); the notify fires on
+-- commit, once per distinct payload. The triggers run once per statement
+-- over its transition tables, so a bulk write bumps each (user, scope) once
+-- instead of rewriting (and holding the lock on) the same row per row
+CREATE OR REPLACE FUNCTION notify_cache_invalidate()
+RETURNS TRIGGER AS $$
+DECLARE
+    changed_user_ids UUID[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        SELECT array_agg(DISTINCT user_id ORDER BY user_id) INTO changed_user_ids
+        FROM new_rows WHERE user_id IS NOT NULL;
+    ELSIF TG_OP = 'DELETE' THEN
+        SELECT array_agg(DISTINCT user_id ORDER BY user_id) INTO changed_user_ids
+        FROM old_rows WHERE user_id IS NOT NULL;
+    ELSE
+        SELECT array_agg(DISTINCT user_id ORDER BY user_id) INTO changed_user_ids
+        FROM (SELECT user_id FROM new_rows UNION ALL SELECT user_id FROM old_rows) changed
+        WHERE user_id IS NOT NULL;
+    END IF;
+    IF changed_user_ids IS NULL THEN
+        RETURN NULL;
+    END IF;
+    -- In user_id order, so concurrent bulk writes lock the rows in the same order
+    INSERT INTO change_versions (user_id, scope, version)
+    SELECT changed_user_id, TG_ARGV[0], 1 FROM unnest(changed_user_ids) AS changed_user_id
+    ON CONFLICT (user_id, scope) DO UPDATE SET version = change_versions.version + 1;
+    PERFORM pg_notify('cache_invalidate', TG_ARGV[0] || ':' || changed_user_id::text)
+    FROM unnest(changed_user_ids) AS changed_user_id;
+    RETURN NULL;
+END;
+$$ language 'plpgsql';
+
+-- Postgres allows transition tables only on single-event triggers, hence
+-- three per table
+CREATE TRIGGER todos_cache_invalidate_insert AFTER INSERT ON todos
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_cache_invalidate('todos');
+CREATE TRIGGER todos_cache_invalidate_update AFTER UPDATE ON todos
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_cache_invalidate('todos');
+CREATE TRIGGER todos_cache_invalidate_delete AFTER DELETE ON todos
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_cache_invalidate('todos');
+
+CREATE TRIGGER grocery_items_cache_invalidate_insert AFTER INSERT ON grocery_items
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_cache_invalidate('groceries');
+CREATE TRIGGER grocery_items_cache_invalidate_update AFTER UPDATE ON grocery_items
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_cache_invalidate('groceries');
+CREATE TRIGGER grocery_items_cache_invalidate_delete AFTER DELETE ON grocery_items
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_cache_invalidate('groceries');
+
+CREATE TRIGGER email_cache_cache_invalidate_insert AFTER INSERT ON email_cache
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_cache_invalidate('emails');
+CREATE TRIGGER email_cache_cache_invalidate_update AFTER UPDATE ON email_cache
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_cache_invalidate('emails');
+CREATE TRIGGER email_cache_cache_invalidate_delete AFTER DELETE ON email_cache
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_cache_invalidate('emails');
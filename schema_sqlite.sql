@@ -0,0 +1,357 @@
+-- Daily Discover Database Schema, SQLite translation of schema.sql
+-- Loaded by database_sqlite.init_db when DATABASE_URL is sqlite:///...
+--
+-- Type mapping: UUID, INET and VARCHAR(n) become TEXT; JSONB and TEXT[] become
+-- JSON text; TIMESTAMP WITH TIME ZONE becomes TIMESTAMPTZ, stored as UTC
+-- ISO 8601 text with millisecond precision ('2026-02-19T08:30:00.000+00:00')
+-- so text order is time order; BOOLEAN is stored as 0/1. TIMESTAMPTZ, BOOLEAN
+-- and JSON columns are converted back to Python values by declared type.
+-- activity_log isn't partitioned (retention deletes rows instead) and the
+-- indexes have no INCLUDE columns; the plpgsql functions become triggers
+
+-- ids default to a random version 4 UUID, like uuid_generate_v4(); the
+-- expression is spelled out per table because a default can only call
+-- built-in functions (other sqlite3 clients write these tables too)
+
+-- Users table for authentication
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY DEFAULT (lower(hex(randomblob(4))) || '-' || lower(hex(randomblob(2))) || '-4' || substr(lower(hex(randomblob(2))), 2) || '-' || substr('89ab', 1 + (abs(random()) % 4), 1) || substr(lower(hex(randomblob(2))), 2) || '-' || lower(hex(randomblob(6)))),
+    username TEXT UNIQUE NOT NULL,
+    email TEXT UNIQUE NOT NULL,
+    password_hash TEXT NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+    updated_at TIMESTAMPTZ DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+
+-- TODO items table
+CREATE TABLE IF NOT EXISTS todos (
+    id TEXT PRIMARY KEY DEFAULT (lower(hex(randomblob(4))) || '-' || lower(hex(randomblob(2))) || '-4' || substr(lower(hex(randomblob(2))), 2) || '-' || substr('89ab', 1 + (abs(random()) % 4), 1) || substr(lower(hex(randomblob(2))), 2) || '-' || lower(hex(randomblob(6)))),
+    user_id TEXT REFERENCES users(id) ON DELETE CASCADE,
+    text TEXT NOT NULL,
+    completed BOOLEAN DEFAULT 0,
+    priority INTEGER DEFAULT 0,
+    created_at TIMESTAMPTZ DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+    updated_at TIMESTAMPTZ DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+    completed_at TIMESTAMPTZ
+);
+
+-- Shopping events table (for grouping archived groceries)
+CREATE TABLE IF NOT EXISTS shopping_events (
+    id TEXT PRIMARY KEY DEFAULT (lower(hex(randomblob(4))) || '-' || lower(hex(randomblob(2))) || '-4' || substr(lower(hex(randomblob(2))), 2) || '-' || substr('89ab', 1 + (abs(random()) % 4), 1) || substr(lower(hex(randomblob(2))), 2) || '-' || lower(hex(randomblob(6)))),
+    user_id TEXT REFERENCES users(id) ON DELETE CASCADE,
+    completed_at TIMESTAMPTZ DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+    notes TEXT
+);
+
+-- Grocery items table with active/archived status
+CREATE TABLE IF NOT EXISTS grocery_items (
+    id TEXT PRIMARY KEY DEFAULT (lower(hex(randomblob(4))) || '-' || lower(hex(randomblob(2))) || '-4' || substr(lower(hex(randomblob(2))), 2) || '-' || substr('89ab', 1 + (abs(random()) % 4), 1) || substr(lower(hex(randomblob(2))), 2) || '-' || lower(hex(randomblob(6)))),
+    user_id TEXT REFERENCES users(id) ON DELETE CASCADE,
+    item_name TEXT NOT NULL,
+    quantity INTEGER DEFAULT 1,
+    notes TEXT,
+    is_active BOOLEAN DEFAULT 1,
+    shopping_event_id TEXT REFERENCES shopping_events(id) ON DELETE SET NULL,
+    created_at TIMESTAMPTZ DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+    updated_at TIMESTAMPTZ DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+    archived_at TIMESTAMPTZ
+);
+
+-- Per-item purchase history, folded in at checkout (see GroceryItem._archive)
+-- so suggestions never scan archived grocery_items
+CREATE TABLE IF NOT EXISTS grocery_purchase_stats (
+    user_id TEXT REFERENCES users(id) ON DELETE CASCADE,
+    item_key TEXT NOT NULL,  -- lower(trim(item_name))
+    item_name TEXT NOT NULL,
+    purchase_count INTEGER NOT NULL DEFAULT 1,
+    interval_seconds_total REAL NOT NULL DEFAULT 0,
+    first_bought_at TIMESTAMPTZ NOT NULL,
+    last_bought_at TIMESTAMPTZ NOT NULL,
+    next_due_at TIMESTAMPTZ,  -- NULL until bought twice
+    PRIMARY KEY (user_id, item_key)
+);
+
+-- Calendar events cache (synced from Google/iCloud)
+CREATE TABLE IF NOT EXISTS calendar_events (
+    id TEXT PRIMARY KEY DEFAULT (lower(hex(randomblob(4))) || '-' || lower(hex(randomblob(2))) || '-4' || substr(lower(hex(randomblob(2))), 2) || '-' || substr('89ab', 1 + (abs(random()) % 4), 1) || substr(lower(hex(randomblob(2))), 2) || '-' || lower(hex(randomblob(6)))),
+    user_id TEXT REFERENCES users(id) ON DELETE CASCADE,
+    external_id TEXT UNIQUE NOT NULL,
+    calendar_source TEXT NOT NULL, -- 'google', 'icloud'
+    title TEXT NOT NULL,
+    description TEXT,
+    start_time TIMESTAMPTZ NOT NULL,
+    end_time TIMESTAMPTZ NOT NULL,
+    location TEXT,
+    is_all_day BOOLEAN DEFAULT 0,
+    created_at TIMESTAMPTZ DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+    updated_at TIMESTAMPTZ DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+    synced_at TIMESTAMPTZ DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+
+-- Email cache (from Gmail API) - DEPRECATED, see DECISIONS.md
+CREATE TABLE IF NOT EXISTS email_cache (
+    id TEXT PRIMARY KEY DEFAULT (lower(hex(randomblob(4))) || '-' || lower(hex(randomblob(2))) || '-4' || substr(lower(hex(randomblob(2))), 2) || '-' || substr('89ab', 1 + (abs(random()) % 4), 1) || substr(lower(hex(randomblob(2))), 2) || '-' || lower(hex(randomblob(6)))),
+    user_id TEXT REFERENCES users(id) ON DELETE CASCADE,
+    gmail_id TEXT UNIQUE NOT NULL,
+    thread_id TEXT,
+    subject TEXT,
+    sender TEXT,
+    recipient TEXT,
+    snippet TEXT,
+    is_unread BOOLEAN DEFAULT 1,
+    received_at TIMESTAMPTZ NOT NULL,
+    labels JSON, -- Array of label names
+    created_at TIMESTAMPTZ DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+    synced_at TIMESTAMPTZ DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+
+-- Gmail sync watermarks (one row per user)
+CREATE TABLE IF NOT EXISTS gmail_sync_state (
+    user_id TEXT PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    history_id INTEGER, -- Mailbox historyId the cache is current as of
+    last_full_sync_at TIMESTAMPTZ,
+    scan_query TEXT, -- Full scan in progress, NULL when none
+    scan_page_token TEXT, -- Next page of the scan in progress
+    scan_history_id INTEGER, -- Watermark to adopt once the scan finishes
+    created_at TIMESTAMPTZ DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+    updated_at TIMESTAMPTZ DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+
+-- OAuth tokens shared by all web and worker processes
+CREATE TABLE IF NOT EXISTS oauth_tokens (
+    provider TEXT PRIMARY KEY, -- 'gmail'
+    token JSON NOT NULL, -- Serialized google.oauth2 credentials
+    version INTEGER NOT NULL DEFAULT 1, -- Bumped on every write
+    is_valid BOOLEAN NOT NULL DEFAULT 1, -- 0 once Google rejects the refresh token
+    created_at TIMESTAMPTZ DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+    updated_at TIMESTAMPTZ DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+
+-- Per-user, per-scope counters bumped on every change to the scope's table
+-- (see the *_change_version triggers); the dashboard ETag is built from them
+CREATE TABLE IF NOT EXISTS change_versions (
+    user_id TEXT REFERENCES users(id) ON DELETE CASCADE,
+    scope TEXT NOT NULL, -- 'todos', 'groceries', 'emails'
+    version INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (user_id, scope)
+);
+
+-- Blog posts metadata (content stored as markdown files)
+CREATE TABLE IF NOT EXISTS blog_posts (
+    id TEXT PRIMARY KEY DEFAULT (lower(hex(randomblob(4))) || '-' || lower(hex(randomblob(2))) || '-4' || substr(lower(hex(randomblob(2))), 2) || '-' || substr('89ab', 1 + (abs(random()) % 4), 1) || substr(lower(hex(randomblob(2))), 2) || '-' || lower(hex(randomblob(6)))),
+    user_id TEXT REFERENCES users(id) ON DELETE CASCADE,
+    slug TEXT UNIQUE NOT NULL, -- URL-friendly identifier
+    title TEXT NOT NULL,
+    excerpt TEXT, -- Short summary/preview
+    file_path TEXT NOT NULL, -- Path to markdown file relative to posts/
+    published_at TIMESTAMPTZ,
+    is_draft BOOLEAN DEFAULT 1,
+    tags JSON, -- Array of tag names
+    created_at TIMESTAMPTZ DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+    updated_at TIMESTAMPTZ DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+
+-- Activity log for observability (ActivityLog.maintain deletes rows past
+-- retention; there are no partitions to drop)
+CREATE TABLE IF NOT EXISTS activity_log (
+    id TEXT PRIMARY KEY DEFAULT (lower(hex(randomblob(4))) || '-' || lower(hex(randomblob(2))) || '-4' || substr(lower(hex(randomblob(2))), 2) || '-' || substr('89ab', 1 + (abs(random()) % 4), 1) || substr(lower(hex(randomblob(2))), 2) || '-' || lower(hex(randomblob(6)))),
+    user_id TEXT REFERENCES users(id) ON DELETE CASCADE,
+    action TEXT NOT NULL, -- 'grocery_added', 'todo_completed', etc.
+    entity_type TEXT, -- 'grocery', 'todo', 'email', etc.
+    entity_id TEXT,
+    details JSON, -- Flexible JSON for additional context
+    ip_address TEXT,
+    user_agent TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now'))
+);
+
+-- Activity counts per hour and per day, maintained from activity_log by
+-- ActivityLog.roll_up and kept after the raw rows are deleted
+CREATE TABLE IF NOT EXISTS activity_rollups (
+    granularity TEXT NOT NULL, -- 'hour' or 'day'
+    bucket_start TIMESTAMPTZ NOT NULL,
+    action TEXT NOT NULL,
+    entity_type TEXT NOT NULL DEFAULT '', -- '' when the entry had none
+    event_count INTEGER NOT NULL,
+    PRIMARY KEY (granularity, bucket_start, action, entity_type)
+);
+
+-- activity_log rows before rolled_through are reflected in activity_rollups
+CREATE TABLE IF NOT EXISTS activity_rollup_state (
+    id BOOLEAN PRIMARY KEY DEFAULT 1 CHECK (id),
+    rolled_through TIMESTAMPTZ
+);
+INSERT OR IGNORE INTO activity_rollup_state (id) VALUES (1);
+
+-- Background job queue (consumed by worker.py, which needs PostgreSQL)
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY DEFAULT (lower(hex(randomblob(4))) || '-' || lower(hex(randomblob(2))) || '-4' || substr(lower(hex(randomblob(2))), 2) || '-' || substr('89ab', 1 + (abs(random()) % 4), 1) || substr(lower(hex(randomblob(2))), 2) || '-' || lower(hex(randomblob(6)))),
+    user_id TEXT REFERENCES users(id) ON DELETE CASCADE,
+    kind TEXT NOT NULL, -- 'gmail_sync', etc.
+    payload JSON NOT NULL DEFAULT '{}',
+    dedupe_key TEXT, -- Jobs sharing a key never run concurrently
+    status TEXT NOT NULL DEFAULT 'queued', -- 'queued', 'running', 'succeeded', 'failed'
+    progress JSON,
+    result JSON,
+    error TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    run_after TIMESTAMPTZ NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+    locked_by TEXT,
+    locked_at TIMESTAMPTZ,
+    created_at TIMESTAMPTZ DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+    updated_at TIMESTAMPTZ DEFAULT (strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')),
+    finished_at TIMESTAMPTZ
+);
+
+-- Next run of each periodic job
+CREATE TABLE IF NOT EXISTS job_schedules (
+    name TEXT PRIMARY KEY,
+    next_run_at TIMESTAMPTZ NOT NULL
+);
+
+-- Create indexes for better query performance
+CREATE INDEX IF NOT EXISTS idx_grocery_items_user_id ON grocery_items(user_id);
+CREATE INDEX IF NOT EXISTS idx_grocery_items_shopping_event ON grocery_items(shopping_event_id);
+CREATE INDEX IF NOT EXISTS idx_calendar_events_user_id ON calendar_events(user_id);
+CREATE INDEX IF NOT EXISTS idx_calendar_events_start_time ON calendar_events(start_time);
+CREATE INDEX IF NOT EXISTS idx_activity_log_user_created ON activity_log(user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_activity_log_created_at ON activity_log(created_at);
+CREATE INDEX IF NOT EXISTS idx_blog_posts_user_id ON blog_posts(user_id);
+CREATE INDEX IF NOT EXISTS idx_blog_posts_published_at ON blog_posts(published_at);
+CREATE INDEX IF NOT EXISTS idx_blog_posts_is_draft ON blog_posts(is_draft);
+CREATE INDEX IF NOT EXISTS idx_jobs_runnable ON jobs(run_after) WHERE status = 'queued';
+CREATE INDEX IF NOT EXISTS idx_jobs_running ON jobs(locked_at) WHERE status = 'running';
+
+-- List endpoints page by keyset, so each index leads with user_id followed by
+-- the endpoint's exact sort order (id breaks ties)
+CREATE INDEX IF NOT EXISTS idx_todos_open ON todos(user_id, priority DESC, created_at DESC, id DESC)
+    WHERE completed = 0;
+CREATE INDEX IF NOT EXISTS idx_todos_user_order ON todos(user_id, priority DESC, created_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_grocery_items_active ON grocery_items(user_id, created_at DESC, id DESC)
+    WHERE is_active = 1;
+CREATE INDEX IF NOT EXISTS idx_grocery_purchase_stats_due ON grocery_purchase_stats(user_id, next_due_at)
+    WHERE next_due_at IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_email_cache_unread ON email_cache(user_id, received_at DESC, id DESC)
+    WHERE is_unread = 1;
+CREATE INDEX IF NOT EXISTS idx_email_cache_user_received ON email_cache(user_id, received_at DESC, id DESC);
+
+-- At most one queued and one running job per dedupe key
+CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_dedupe_queued ON jobs(dedupe_key) WHERE status = 'queued';
+CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_dedupe_running ON jobs(dedupe_key) WHERE status = 'running';
+
+-- updated_at triggers, for writes that don't set updated_at themselves (the
+-- models do, so their UPDATEs aren't run twice)
+CREATE TRIGGER IF NOT EXISTS update_users_updated_at AFTER UPDATE ON users FOR EACH ROW
+WHEN NEW.updated_at IS OLD.updated_at
+BEGIN
+    UPDATE users SET updated_at = strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now') WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS update_todos_updated_at AFTER UPDATE ON todos FOR EACH ROW
+WHEN NEW.updated_at IS OLD.updated_at
+BEGIN
+    UPDATE todos SET updated_at = strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now') WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS update_grocery_items_updated_at AFTER UPDATE ON grocery_items FOR EACH ROW
+WHEN NEW.updated_at IS OLD.updated_at
+BEGIN
+    UPDATE grocery_items SET updated_at = strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now') WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS update_calendar_events_updated_at AFTER UPDATE ON calendar_events FOR EACH ROW
+WHEN NEW.updated_at IS OLD.updated_at
+BEGIN
+    UPDATE calendar_events SET updated_at = strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now') WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS update_blog_posts_updated_at AFTER UPDATE ON blog_posts FOR EACH ROW
+WHEN NEW.updated_at IS OLD.updated_at
+BEGIN
+    UPDATE blog_posts SET updated_at = strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now') WHERE id = NEW.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS update_gmail_sync_state_updated_at AFTER UPDATE ON gmail_sync_state FOR EACH ROW
+WHEN NEW.updated_at IS OLD.updated_at
+BEGIN
+    UPDATE gmail_sync_state SET updated_at = strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now') WHERE user_id = NEW.user_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS update_oauth_tokens_updated_at AFTER UPDATE ON oauth_tokens FOR EACH ROW
+WHEN NEW.updated_at IS OLD.updated_at
+BEGIN
+    UPDATE oauth_tokens SET updated_at = strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now') WHERE provider = NEW.provider;
+END;
+
+CREATE TRIGGER IF NOT EXISTS update_jobs_updated_at AFTER UPDATE ON jobs FOR EACH ROW
+WHEN NEW.updated_at IS OLD.updated_at
+BEGIN
+    UPDATE jobs SET updated_at = strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now') WHERE id = NEW.id;
+END;
+
+-- Bump the user's change version for the scope on every change (the
+-- dashboard ETag is built from these). There is no NOTIFY: the read cache and
+-- /api/events need PostgreSQL's LISTEN and stay off with this backend
+CREATE TRIGGER IF NOT EXISTS todos_change_version_insert AFTER INSERT ON todos FOR EACH ROW
+WHEN NEW.user_id IS NOT NULL
+BEGIN
+    INSERT INTO change_versions (user_id, scope) VALUES (NEW.user_id, 'todos')
+    ON CONFLICT (user_id, scope) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS todos_change_version_update AFTER UPDATE ON todos FOR EACH ROW
+WHEN NEW.user_id IS NOT NULL
+BEGIN
+    INSERT INTO change_versions (user_id, scope) VALUES (NEW.user_id, 'todos')
+    ON CONFLICT (user_id, scope) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS todos_change_version_delete AFTER DELETE ON todos FOR EACH ROW
+WHEN OLD.user_id IS NOT NULL
+BEGIN
+    INSERT INTO change_versions (user_id, scope) VALUES (OLD.user_id, 'todos')
+    ON CONFLICT (user_id, scope) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS grocery_items_change_version_insert AFTER INSERT ON grocery_items FOR EACH ROW
+WHEN NEW.user_id IS NOT NULL
+BEGIN
+    INSERT INTO change_versions (user_id, scope) VALUES (NEW.user_id, 'groceries')
+    ON CONFLICT (user_id, scope) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS grocery_items_change_version_update AFTER UPDATE ON grocery_items FOR EACH ROW
+WHEN NEW.user_id IS NOT NULL
+BEGIN
+    INSERT INTO change_versions (user_id, scope) VALUES (NEW.user_id, 'groceries')
+    ON CONFLICT (user_id, scope) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS grocery_items_change_version_delete AFTER DELETE ON grocery_items FOR EACH ROW
+WHEN OLD.user_id IS NOT NULL
+BEGIN
+    INSERT INTO change_versions (user_id, scope) VALUES (OLD.user_id, 'groceries')
+    ON CONFLICT (user_id, scope) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS email_cache_change_version_insert AFTER INSERT ON email_cache FOR EACH ROW
+WHEN NEW.user_id IS NOT NULL
+BEGIN
+    INSERT INTO change_versions (user_id, scope) VALUES (NEW.user_id, 'emails')
+    ON CONFLICT (user_id, scope) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS email_cache_change_version_update AFTER UPDATE ON email_cache FOR EACH ROW
+WHEN NEW.user_id IS NOT NULL
+BEGIN
+    INSERT INTO change_versions (user_id, scope) VALUES (NEW.user_id, 'emails')
+    ON CONFLICT (user_id, scope) DO UPDATE SET version = version + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS email_cache_change_version_delete AFTER DELETE ON email_cache FOR EACH ROW
+WHEN OLD.user_id IS NOT NULL
+BEGIN
+    INSERT INTO change_versions (user_id, scope) VALUES (OLD.user_id, 'emails')
+    ON CONFLICT (user_id, scope) DO UPDATE SET version = version + 1;
+END;
@@ -0,0 +1,56 @@
+"""
+Fixtures for the API tests, which run once per database backend
+The SQLite run uses a fresh file per test. The PostgreSQL run needs
+TEST_DATABASE_URL, a scratch database loaded with schema.sql whose tables
+are emptied before each test; it is skipped when that isn't set
+"""
+import os
+import pytest
+
+# Read by app at import: keep every write synchronous and every read
+# uncached, so a request sees the ones before it
+os.environ.setdefault('DATABASE_URL', 'sqlite:///daily_discover_test.db')
+os.environ['READ_CACHE'] = 'false'
+os.environ['LIVE_EVENTS'] = 'false'
+os.environ['ACTIVITY_LOG_ASYNC'] = 'false'
+
+import app as app_module
+from database import db_session, is_sqlite_url
+
+DEFAULT_USER_SQL = """
+    INSERT INTO users (id, username, email, password_hash)
+    VALUES ('00000000-0000-0000-0000-000000000001', 'test', 'test@example.com', '')
+"""
+
+# Emptying users cascades to everything owned by a user
+RESET_POSTGRES_SQL = [
+    "TRUNCATE users, oauth_tokens, activity_log, activity_rollups, job_schedules CASCADE",
+    "UPDATE activity_rollup_state SET rolled_through = NULL",
+]
+
+
+@pytest.fixture(params=['sqlite', 'postgresql'])
+def database_url(request, tmp_path):
+    if request.param == 'sqlite':
+        return f'sqlite:///{tmp_path}/daily_discover.db'
+    url = os.environ.get('TEST_DATABASE_URL')
+    if not url:
+        pytest.skip('TEST_DATABASE_URL is not set')
+    return url
+
+@pytest.fixture
+def client(database_url, monkeypatch):
+    """A Flask test client on an empty database holding just the default user"""
+    monkeypatch.setattr(app_module, 'DATABASE_URL', database_url)
+    app_module.close_services()
+    flask_app = app_module.create_app()
+    with db_session() as db:
+        cursor = db.cursor()
+        if not is_sqlite_url(database_url):
+            for statement in RESET_POSTGRES_SQL:
+                cursor.execute(statement)
+        cursor.execute(DEFAULT_USER_SQL)
+    try:
+        yield flask_app.test_client()
+    finally:
+        app_module.close_services()
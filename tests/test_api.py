@@ -0,0 +1,167 @@
+"""
+The JSON API against each database backend (see conftest.py)
+"""
+from database import ActivityLog, db_session
+
+MISSING_ID = '00000000-0000-0000-0000-00000000ffff'
+
+
+def _all_pages(client, path, limit):
+    """Items of every page of a keyset-paginated list, and the number of pages"""
+    items, pages, cursor = [], 0, None
+    while True:
+        query = f'?limit={limit}' + (f'&cursor={cursor}' if cursor else '')
+        response = client.get(path + query)
+        assert response.status_code == 200
+        body = response.get_json()
+        assert body['success'] is True
+        assert len(body['items']) <= limit
+        items.extend(body['items'])
+        pages += 1
+        cursor = body['next_cursor']
+        if cursor is None:
+            return items, pages
+
+def _rollup_counts(client, granularity):
+    response = client.get(f'/api/activity/rollups?granularity={granularity}')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['granularity'] == granularity
+    counts = {}
+    for rollup in body['rollups']:
+        key = (rollup['action'], rollup['entity_type'])
+        counts[key] = counts.get(key, 0) + rollup['event_count']
+    return counts
+
+
+def test_todos(client):
+    response = client.post('/api/todos', json={'text': 'Water plants', 'priority': 1})
+    assert response.status_code == 201
+    todo = response.get_json()['data']
+    assert todo['text'] == 'Water plants'
+    assert todo['priority'] == 1
+    assert todo['completed'] is False
+
+    response = client.post('/api/todos', json=['Pay rent', {'text': 'Call mum', 'priority': 5}, 'Fix bike'])
+    assert response.status_code == 201
+    assert [todo['text'] for todo in response.get_json()['data']] == ['Pay rent', 'Call mum', 'Fix bike']
+
+    assert client.post('/api/todos', json={'priority': 1}).status_code == 400
+    assert client.post('/api/todos', json={'items': ['Ok', {'priority': 2}]}).status_code == 400
+
+    items, pages = _all_pages(client, '/api/todos', limit=3)
+    assert pages == 2
+    assert len({item['id'] for item in items}) == 4
+    assert [item['text'] for item in items[:2]] == ['Call mum', 'Water plants']
+
+    response = client.post(f"/api/todos/{todo['id']}/complete")
+    assert response.status_code == 200
+    assert client.post(f'/api/todos/{MISSING_ID}/complete').status_code == 404
+    items, _ = _all_pages(client, '/api/todos', limit=10)
+    assert todo['id'] not in [item['id'] for item in items]
+    assert len(items) == 3
+
+    assert client.get('/api/todos?cursor=not-a-cursor').status_code == 400
+
+def test_groceries_and_checkout(client):
+    response = client.post('/api/groceries', json={'item_name': 'Eggs', 'quantity': 12, 'notes': 'free range'})
+    assert response.status_code == 201
+    item = response.get_json()['data']
+    assert (item['item_name'], item['quantity'], item['notes']) == ('Eggs', 12, 'free range')
+
+    response = client.post('/api/groceries', json={'items': ['Bread', {'item_name': 'Milk', 'quantity': 2}]})
+    assert response.status_code == 201
+    assert len(response.get_json()['data']) == 2
+    assert client.post('/api/groceries', json={'quantity': 2}).status_code == 400
+
+    items, pages = _all_pages(client, '/api/groceries', limit=2)
+    assert pages == 2
+    assert sorted(item['item_name'] for item in items) == ['Bread', 'Eggs', 'Milk']
+
+    response = client.post('/api/groceries/checkout', json={'notes': 'Saturday shop'})
+    assert response.status_code == 201
+    trip = response.get_json()['data']
+    assert trip['archived'] == 3
+    assert trip['event_id']
+
+    items, _ = _all_pages(client, '/api/groceries', limit=10)
+    assert items == []
+    assert client.post('/api/groceries/checkout').status_code == 400
+
+def test_suggestions(client):
+    # Bought on two trips, so it has a typical interval and is due again
+    for _ in range(2):
+        assert client.post('/api/groceries', json={'item_name': 'Milk'}).status_code == 201
+        assert client.post('/api/groceries', json={'item_name': 'Bread'}).status_code == 201
+        assert client.post('/api/groceries/checkout').status_code == 201
+    assert client.post('/api/groceries', json={'item_name': 'Coffee'}).status_code == 201
+    assert client.post('/api/groceries/checkout').status_code == 201
+
+    response = client.get('/api/groceries/suggestions')
+    assert response.status_code == 200
+    items = response.get_json()['items']
+    assert sorted(item['item_name'] for item in items) == ['Bread', 'Milk']
+    assert all(item['purchase_count'] == 2 for item in items)
+
+    # Nothing already on the list is suggested
+    assert client.post('/api/groceries', json={'item_name': ' milk '}).status_code == 201
+    items = client.get('/api/groceries/suggestions').get_json()['items']
+    assert [item['item_name'] for item in items] == ['Bread']
+
+def test_dashboard_revalidation(client):
+    response = client.get('/api/dashboard')
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+    dashboard = response.get_json()['dashboard']
+    assert dashboard['todos'] == []
+    assert dashboard['groceries'] == []
+    assert dashboard['gmail'] == {'authenticated': False}
+
+    response = client.get('/api/dashboard', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.headers['ETag'] == etag
+
+    assert client.post('/api/todos', json={'text': 'Water plants'}).status_code == 201
+    response = client.get('/api/dashboard', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert [todo['text'] for todo in response.get_json()['dashboard']['todos']] == ['Water plants']
+
+    etag = response.headers['ETag']
+    assert client.post('/api/groceries', json={'item_name': 'Eggs'}).status_code == 201
+    response = client.get('/api/dashboard', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert [item['item_name'] for item in response.get_json()['dashboard']['groceries']] == ['Eggs']
+
+def test_dashboard_gmail_status(client):
+    with db_session() as db:
+        db.cursor().execute("INSERT INTO oauth_tokens (provider, token) VALUES ('gmail', '{}')")
+    response = client.get('/api/dashboard')
+    assert response.get_json()['dashboard']['gmail'] == {'authenticated': True}
+    etag = response.headers['ETag']
+
+    # A token Google rejected stays stored, but no longer counts as connected
+    with db_session() as db:
+        db.cursor().execute("UPDATE oauth_tokens SET is_valid = FALSE, version = version + 1")
+    response = client.get('/api/dashboard', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.get_json()['dashboard']['gmail'] == {'authenticated': False}
+
+def test_rollups(client):
+    assert client.post('/api/todos', json=['Pay rent', 'Fix bike']).status_code == 201
+    assert client.post('/api/todos', json={'text': 'Water plants'}).status_code == 201
+    assert client.post('/api/groceries', json={'item_name': 'Eggs'}).status_code == 201
+
+    # Roll up through the end of the current hour
+    ActivityLog.roll_up(settle_seconds=-3600)
+
+    expected = {
+        ('todos_added', 'todo'): 1,
+        ('todo_added', 'todo'): 1,
+        ('grocery_added', 'grocery'): 1,
+    }
+    assert _rollup_counts(client, 'hour') == expected
+    assert _rollup_counts(client, 'day') == expected
+    assert client.get('/api/activity/rollups?granularity=week').status_code == 400
+    assert client.get('/api/activity/rollups?since=yesterday').status_code == 400
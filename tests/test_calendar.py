@@ -0,0 +1,121 @@
+"""
+Recurring event expansion (calendar_service.expand_events and _rule_near),
+checked against dateutil expanding the same rule from its real DTSTART
+"""
+from datetime import datetime, timedelta
+from dateutil import tz
+from dateutil.rrule import rrulestr
+from calendar_service import _normalize_until, _rule_near, expand_events, iter_events
+
+ZONE = tz.gettz('America/New_York')
+WINDOW_START = datetime(2026, 10, 17, tzinfo=ZONE)
+WINDOW_END = WINDOW_START + timedelta(days=40)
+DURATION = timedelta(hours=1)
+
+
+def _feed(*events):
+    lines = ['BEGIN:VCALENDAR']
+    for properties in events:
+        lines += ['BEGIN:VEVENT', *properties, 'END:VEVENT']
+    lines.append('END:VCALENDAR')
+    return iter_events(line + '\r\n' for line in lines)
+
+def _event(uid, start, rule, *extra):
+    return [
+        f'UID:{uid}',
+        'SUMMARY:Standup',
+        f'DTSTART;TZID=America/New_York:{start:%Y%m%dT%H%M%S}',
+        'DURATION:PT1H',
+        f'RRULE:{rule}',
+        *extra,
+    ]
+
+def _unshifted(rule, start, window_end=WINDOW_END):
+    """Occurrences overlapping the window, walked from the real DTSTART"""
+    recurrence = rrulestr(_normalize_until(rule, start), dtstart=start)
+    return recurrence.between(WINDOW_START - DURATION, window_end)
+
+def _expanded(rule, start, window_end=WINDOW_END):
+    rows = expand_events(_feed(_event('uid', start, rule)), 'test', WINDOW_START, window_end)
+    return sorted(row['start_time'] for row in rows)
+
+def _check(rule, start, window_end=WINDOW_END):
+    expected = _unshifted(rule, start, window_end)
+    assert expected
+    moved = _rule_near(rule, start, WINDOW_START - DURATION)
+    assert moved.between(WINDOW_START - DURATION, window_end) == expected
+    # COUNT rules are walked from DTSTART; the rest start within a year or so of the window
+    first = next(iter(moved))
+    if 'COUNT=' in rule:
+        assert first == start
+    else:
+        assert first > WINDOW_START - timedelta(days=3 * 366)
+    assert _expanded(rule, start, window_end) == expected
+
+
+def test_biweekly_by_day():
+    _check('FREQ=WEEKLY;INTERVAL=2;BYDAY=TU,TH', datetime(2019, 3, 7, 9, 30, tzinfo=ZONE))
+
+def test_biweekly_by_day_with_week_start():
+    _check('FREQ=WEEKLY;INTERVAL=2;BYDAY=SU,MO;WKST=SU', datetime(2021, 1, 4, 9, 30, tzinfo=ZONE))
+
+def test_monthly_from_the_31st():
+    # Only months with a 31st; moving DTSTART must not clamp it to the 30th
+    start = datetime(2016, 1, 31, 18, 0, tzinfo=ZONE)
+    _check('FREQ=MONTHLY', start)
+    assert all(moment.day == 31 for moment in _unshifted('FREQ=MONTHLY', start))
+
+def test_yearly_from_leap_day():
+    _check('FREQ=YEARLY', datetime(2012, 2, 29, 8, 0, tzinfo=ZONE), window_end=datetime(2029, 3, 1, tzinfo=ZONE))
+
+def test_daily_keeps_wall_clock_time_across_dst():
+    # The window spans the end of daylight saving time (Nov 1 2026)
+    start = datetime(2015, 6, 1, 7, 0, tzinfo=ZONE)
+    assert {moment.hour for moment in _unshifted('FREQ=DAILY;INTERVAL=3', start)} == {7}
+    _check('FREQ=DAILY;INTERVAL=3', start)
+
+def test_hourly():
+    _check('FREQ=HOURLY;INTERVAL=7', datetime(2024, 2, 1, 0, 15, tzinfo=ZONE))
+
+def test_count_rule_counts_from_real_start():
+    start = datetime(2026, 9, 1, 12, 0, tzinfo=ZONE)
+    rule = 'FREQ=DAILY;INTERVAL=2;COUNT=40'
+    expected = _unshifted(rule, start)
+    # Runs out partway through the window
+    assert expected[-1] < WINDOW_END - timedelta(days=2)
+    _check(rule, start)
+
+def test_until_before_window():
+    start = datetime(2020, 1, 1, 9, 0, tzinfo=ZONE)
+    assert _expanded('FREQ=WEEKLY;UNTIL=20260901', start) == []
+
+def test_exdate_and_overrides_inside_window():
+    start = datetime(2020, 1, 6, 9, 0, tzinfo=ZONE)
+    rule = 'FREQ=WEEKLY;BYDAY=MO'
+    occurrences = _unshifted(rule, start)
+    skipped, moved, cancelled = occurrences[1], occurrences[2], occurrences[3]
+    new_time = moved + timedelta(hours=2)
+
+    feed = _feed(
+        _event('uid', start, rule, f'EXDATE;TZID=America/New_York:{skipped:%Y%m%dT%H%M%S}'),
+        [
+            'UID:uid',
+            'SUMMARY:Standup (moved)',
+            f'RECURRENCE-ID;TZID=America/New_York:{moved:%Y%m%dT%H%M%S}',
+            f'DTSTART;TZID=America/New_York:{new_time:%Y%m%dT%H%M%S}',
+            'DURATION:PT1H',
+        ],
+        [
+            'UID:uid',
+            'STATUS:CANCELLED',
+            f'RECURRENCE-ID;TZID=America/New_York:{cancelled:%Y%m%dT%H%M%S}',
+            f'DTSTART;TZID=America/New_York:{cancelled:%Y%m%dT%H%M%S}',
+        ],
+    )
+    rows = expand_events(feed, 'test', WINDOW_START, WINDOW_END)
+
+    expected = [moment for moment in occurrences if moment not in (skipped, moved, cancelled)] + [new_time]
+    assert sorted(row['start_time'] for row in rows) == sorted(expected)
+    titles = {row['start_time']: row['title'] for row in rows}
+    assert titles[new_time] == 'Standup (moved)'
+    assert titles[occurrences[0]] == 'Standup'
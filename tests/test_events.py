@@ -0,0 +1,31 @@
+"""
+EventBroker client slots, without a database
+"""
+import gc
+import pytest
+from events import EventBroker
+
+
+def _broker(max_clients=2):
+    return EventBroker(lambda user_id: {'todos': 1}, heartbeat=0.01, max_clients=max_clients)
+
+
+def test_slots_are_taken_before_streams_start():
+    broker = _broker()
+    streams = [broker.stream('user'), broker.stream('user')]
+    assert broker.client_count() == 2
+    with pytest.raises(OverflowError):
+        broker.stream('user')
+
+    next(streams[0])
+    streams[0].close()
+    assert broker.client_count() == 1
+    assert broker.stream('other') is not None
+
+def test_unstarted_stream_releases_its_slot():
+    broker = _broker(max_clients=1)
+    stream = broker.stream('user')
+    stream.close()
+    del stream
+    gc.collect()
+    assert broker.client_count() == 0
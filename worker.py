@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+"""
+Background worker for Daily Discover
+Runs queued jobs (Gmail syncs, etc.) outside the web workers and enqueues
+periodic jobs on their schedule
+"""
+import os
+import signal
+import socket
+import time
+import traceback
+from typing import Any, Callable, Dict, List, NamedTuple
+from dotenv import load_dotenv
+from database import init_db_pool, close_db_pool, is_sqlite_url, Job, ActivityLog
+from gmail_service import sync_gmail_messages, is_authenticated, gmail_sync_key
+from calendar_service import sync_calendars, configured_feeds
+from blog_service import index_posts
+
+# Load environment variables
+load_dotenv()
+
+DATABASE_URL = os.environ.get('DATABASE_URL', 'postgresql://matt@localhost:5432/daily_discover')
+
+# For demo purposes, use a default user ID (matches app.py)
+DEFAULT_USER_ID = '00000000-0000-0000-0000-000000000001'
+
+# Seconds to sleep when there is nothing to run
+POLL_INTERVAL = float(os.environ.get('WORKER_POLL_INTERVAL', 2))
+
+# Raw activity_log rows are kept this long; hourly rollups for
+# ACTIVITY_ROLLUP_RETENTION_DAYS, daily rollups indefinitely
+ACTIVITY_LOG_RETENTION_DAYS = int(os.environ.get('ACTIVITY_LOG_RETENTION_DAYS', 90))
+ACTIVITY_ROLLUP_RETENTION_DAYS = int(os.environ.get('ACTIVITY_ROLLUP_RETENTION_DAYS', 400))
+
+# Minutes between calendar feed syncs
+CALENDAR_SYNC_INTERVAL = int(os.environ.get('CALENDAR_SYNC_INTERVAL', 15))
+
+# Minutes between blog post reindexes (cheap when nothing changed: one stat per post)
+BLOG_INDEX_INTERVAL = int(os.environ.get('BLOG_INDEX_INTERVAL', 5))
+
+
+def run_gmail_sync(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Sync a user's Gmail, reporting progress on the job"""
+    payload = job['payload']
+    result = sync_gmail_messages(
+        job['user_id'],
+        days_back=payload.get('days_back', 20),
+        full=payload.get('full', False),
+        on_progress=lambda progress: Job.update_progress(job['id'], progress)
+    )
+    if not result['success']:
+        raise RuntimeError(result['error'])
+    
+    ActivityLog.log(
+        job['user_id'],
+        'gmail_synced',
+        'email',
+        None,
+        {'synced': result['synced'], 'new': result['new'], 'mode': result['mode'], 'job_id': str(job['id'])}
+    )
+    return result
+
+
+def run_calendar_sync(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Sync the configured calendar feeds"""
+    result = sync_calendars(job['user_id'])
+    if not result['feeds'] and result['errors']:
+        raise RuntimeError(result['error'])
+    
+    ActivityLog.log(
+        job['user_id'],
+        'calendar_synced',
+        'calendar',
+        None,
+        {'feeds': result['feeds'], 'errors': result['errors'], 'job_id': str(job['id'])}
+    )
+    return result
+
+
+def run_blog_index(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Reindex blog posts whose files changed"""
+    result = index_posts(job['user_id'])
+    if result['new'] or result['updated'] or result['deleted']:
+        ActivityLog.log(
+            job['user_id'],
+            'blog_indexed',
+            'blog',
+            None,
+            {'new': result['new'], 'updated': result['updated'], 'deleted': result['deleted'], 'job_id': str(job['id'])}
+        )
+    return result
+
+
+def run_activity_maintenance(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Roll up activity_log and manage its partitions"""
+    return ActivityLog.maintain(ACTIVITY_LOG_RETENTION_DAYS, ACTIVITY_ROLLUP_RETENTION_DAYS)
+
+
+# Job kind -> handler; a handler's return value is stored as the job result
+HANDLERS: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {
+    'gmail_sync': run_gmail_sync,
+    'activity_maintenance': run_activity_maintenance,
+    'calendar_sync': run_calendar_sync,
+    'blog_index': run_blog_index,
+}
+
+
+class PeriodicJob(NamedTuple):
+    name: str
+    interval_seconds: int
+    enqueue: Callable[[], None]
+
+
+def enqueue_email_fetch():
+    """Periodic email fetch (skipped until Gmail is connected)"""
+    if is_authenticated():
+        Job.enqueue('gmail_sync', DEFAULT_USER_ID, {}, dedupe_key=gmail_sync_key(DEFAULT_USER_ID))
+
+
+def enqueue_activity_maintenance():
+    """Periodic activity_log rollup, partition creation and retention"""
+    Job.enqueue('activity_maintenance', dedupe_key='activity_maintenance')
+
+
+def enqueue_calendar_sync():
+    """Periodic calendar feed sync (skipped when no feeds are configured)"""
+    if configured_feeds():
+        Job.enqueue('calendar_sync', DEFAULT_USER_ID, {}, dedupe_key=f'calendar_sync:{DEFAULT_USER_ID}')
+
+
+def enqueue_blog_index():
+    """Periodic blog post reindex"""
+    Job.enqueue('blog_index', DEFAULT_USER_ID, {}, dedupe_key='blog_index')
+
+
+SCHEDULE: List[PeriodicJob] = [
+    PeriodicJob('email_fetch', 10 * 60, enqueue_email_fetch),
+    PeriodicJob('activity_maintenance', 60 * 60, enqueue_activity_maintenance),
+    PeriodicJob('calendar_sync', CALENDAR_SYNC_INTERVAL * 60, enqueue_calendar_sync),
+    PeriodicJob('blog_index', BLOG_INDEX_INTERVAL * 60, enqueue_blog_index),
+]
+
+
+def run_scheduler():
+    """Enqueue any periodic jobs that are due"""
+    for periodic in SCHEDULE:
+        try:
+            if Job.claim_schedule(periodic.name, periodic.interval_seconds):
+                periodic.enqueue()
+        except Exception as e:
+            print(f"Error scheduling {periodic.name}: {e}")
+
+
+def run_job(job: Dict[str, Any]):
+    """Run a claimed job and record the outcome"""
+    print(f"Running job {job['id']} ({job['kind']}, attempt {job['attempts']})")
+    try:
+        result = HANDLERS[job['kind']](job)
+        Job.complete(job['id'], result)
+    except Exception as e:
+        traceback.print_exc()
+        Job.fail(job['id'], str(e))
+
+
+def run_worker():
+    """Claim and run jobs until SIGTERM/SIGINT"""
+    worker_id = f'{socket.gethostname()}:{os.getpid()}'
+    stopping = False
+    
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+    
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    
+    print(f"Worker {worker_id} started")
+    while not stopping:
+        run_scheduler()
+        job = Job.claim(worker_id, list(HANDLERS))
+        if job:
+            run_job(job)
+        else:
+            time.sleep(POLL_INTERVAL)
+    print(f"Worker {worker_id} stopped")
+
+
+if __name__ == '__main__':
+    if is_sqlite_url(DATABASE_URL):
+        raise SystemExit("The job queue needs PostgreSQL; DATABASE_URL selects the SQLite backend")
+    init_db_pool(DATABASE_URL, min_size=1, max_size=2)
+    try:
+        run_worker()
+    finally:
+        close_db_pool()